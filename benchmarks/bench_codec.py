@@ -0,0 +1,72 @@
+import ast
+import pickle
+import timeit
+import uuid
+
+from transport.BinaryCodec import BinaryCodec
+from transport.JsonCodec import JsonCodec
+
+# Run from the repository root: python -m benchmarks.bench_codec
+
+ITERATIONS = 20000
+
+
+def _base_header(method):
+    return {
+        'id': str(uuid.uuid1()),
+        't': "server",
+        'a': "192.168.0.12",
+        'p': 50123,
+        'm': method,
+    }
+
+
+def _messages():
+    ack = _base_header("ACK")
+    ack['seq'] = 1234
+
+    proposal = _base_header("SEQ/PROP")
+    proposal['seq'] = 1235
+
+    members = {str(uuid.uuid1()): i for i in range(5)}
+    multicast = _base_header("SEQ/ANNOUNCEMENT")
+    multicast.update({'m_id': str(uuid.uuid1()), 'g_ident': "MAIN_GROUP", 'rel_seq': 88, 'rel_delivered_seq': members})
+
+    game = _base_header("GS/OV")
+    game.update({'m_id': str(uuid.uuid1()), 'g_ident': "MAIN_GROUP", 'rel_seq': 89, 'rel_delivered_seq': members})
+
+    return [
+        ("ACK", ack, 1234),
+        ("SEQ/PROP", proposal, '{"m_id": "%s", "s_seq": 12, "g_id": "MAIN_GROUP"}' % uuid.uuid1()),
+        ("SEQ/ANNOUNCEMENT", multicast, '{"m_id": "x", "max_suggested_seq": 12}'),
+        ("GS/OV", game, pickle.dumps([[0] * 5 for _ in range(5)] * 20)),
+    ]
+
+
+def _restore_payload(payload):
+    # What Game.from_pickle has to do with the decoded payload
+    return pickle.loads(payload) if isinstance(payload, bytes) else pickle.loads(ast.literal_eval(payload))
+
+
+def _measure(function):
+    return min(timeit.repeat(function, number=ITERATIONS, repeat=7)) / ITERATIONS * 1e6
+
+
+def run():
+    codecs = [JsonCodec(), BinaryCodec()]
+    print("{:<18} {:<8} {:>10} {:>10} {:>8}".format('message', 'codec', 'enc [us]', 'dec [us]', 'bytes'))
+    print("(GS/OV decode includes restoring the pickled game from the payload)")
+    for name, header, payload in _messages():
+        for codec in codecs:
+            encoded = codec.encode(header, payload)
+            encode_time = _measure(lambda: codec.encode(header, payload))
+            if isinstance(payload, bytes):
+                decode_time = _measure(lambda: _restore_payload(codec.decode(encoded)[1]))
+            else:
+                decode_time = _measure(lambda: codec.decode(encoded))
+            print("{:<18} {:<8} {:>10.2f} {:>10.2f} {:>8}".format(
+                name, codec.name, encode_time, decode_time, len(encoded)))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,163 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import time
+
+import config
+
+# Debug output would dominate the measurement, switch it off before the services read it
+config.DEBUG = False
+
+from election.election_factory import create_election
+from models.Group import Group
+from models.Host import Host, HostType
+from models.Ring import Ring
+from services.SocketService import SocketService
+from transport.SimulatedNetwork import SimulatedNetwork
+
+# Run from the repository root: python -m benchmarks.bench_election [--quick] [--output results.json]
+#
+# Leader election between SocketServices on a SimulatedNetwork, every algorithm of election_factory at every
+# size. "start": all servers start an election at the same time, like after the discovery. "failover": the
+# leader of a finished election crashes and every other server starts an election, like on the view change
+# that removes it. Messages are the unicasts of the algorithm plus the announcement of the winner, datagrams
+# everything on the network (acknowledgements, ISIS rounds of the announcement). Time to leader is simulated
+# time until every server knows the largest living id as leader.
+
+ALGORITHMS = ["lcr", "hs", "bully"]
+SIZES = [10, 50, 200]
+QUICK_SIZES = [10, 50]
+SCENARIOS = ["start", "failover"]
+
+LATENCY = 0.0005
+JITTER = 0.0005
+TIMEOUT = 60
+SEED = 1
+
+ELECTION_METHODS = ("LCR/", "HS/", "BULLY/")
+
+
+class _Member:
+    def __init__(self, network, algorithm, counter):
+        self.host = Host(network.new_id(), network.get_local_address(), network.get_unicast_port(), HostType.SERVER)
+        self.socket_service = SocketService(self.host, None, transport=network)
+        self.group = Group("MAIN_GROUP", self.socket_service)
+        self.socket_service.add_group(self.group)
+        self.ring = Ring(self.host)
+        self.election = create_election(self.socket_service, self.host, self.ring, self.group, algorithm)
+        self.socket_service.set_on_unicast_delivered(self.election.on_message_received)
+        self.socket_service.set_on_multicast_delivered(
+            lambda host, method, message, header: self.election.on_message_received(host, method, message))
+
+        send_unicast = self.socket_service.send_unicast
+
+        def counting_send_unicast(host, method, message):
+            if method.startswith(ELECTION_METHODS):
+                counter['messages'] = counter['messages'] + 1
+            send_unicast(host, method, message)
+
+        self.socket_service.send_unicast = counting_send_unicast
+        announce_leader = self.election.announce_leader
+
+        def counting_announce_leader():
+            counter['messages'] = counter['messages'] + 1
+            announce_leader()
+
+        self.election.announce_leader = counting_announce_leader
+
+    def set_members(self, members):
+        self.group.participants = [member.host for member in members]
+        self.ring.set_nodes([member.host for member in members])
+
+    def knows_leader(self, leader_id):
+        return self.election.current_leader is not None and self.election.current_leader.id == leader_id
+
+
+def _elect(network, members, counter):
+    leader_id = max(member.host.id for member in members)
+    counter['messages'] = 0
+    datagrams = network.datagrams_sent
+    start = network.now
+    wall_start = time.perf_counter()
+    for member in members:
+        member.election.start_election()
+    elected = network.run_until(start + TIMEOUT, lambda: all(member.knows_leader(leader_id) for member in members))
+    return {
+        'elected': elected,
+        'messages': counter['messages'],
+        'datagrams': network.datagrams_sent - datagrams,
+        'time_to_leader_ms': (network.now - start) * 1000,
+        'wall_s': time.perf_counter() - wall_start,
+    }
+
+
+def _measure(algorithm, size, scenario):
+    network = SimulatedNetwork(seed=SEED, latency=LATENCY, jitter=JITTER)
+    counter = {'messages': 0}
+    members = [_Member(network, algorithm, counter) for _ in range(size)]
+    for member in members:
+        member.set_members(members)
+    for member in members:
+        member.socket_service.start()
+
+    result = _elect(network, members, counter)
+    if scenario == "failover":
+        # Announcements still on the way when the leader crashes would hold back the next ones forever
+        network.run(1)
+        leader = max(members, key=lambda member: member.host.id)
+        others = [member for member in members if member is not leader]
+        network.partition([leader.host.address], [member.host.address for member in others])
+        for member in others:
+            member.set_members(others)
+            member.election.clear_leader()
+        # Let the unicasts to the crashed leader give up before measuring
+        network.run(config.ELECTION_TIMEOUT)
+        result = _elect(network, others, counter)
+    return dict(result, algorithm=algorithm, size=size, scenario=scenario)
+
+
+def _revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quick=False, output=None):
+    print("{:<9} {:<6} {:>6} {:>8} {:>10} {:>10} {:>10} {:>8}".format(
+        'scenario', 'algo', 'size', 'elected', 'messages', 'datagrams', 'time [ms]', 'wall [s]'))
+    results = []
+    for scenario in SCENARIOS:
+        for size in QUICK_SIZES if quick else SIZES:
+            for algorithm in ALGORITHMS:
+                # The elections print every step regardless of DEBUG
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = _measure(algorithm, size, scenario)
+                results.append(result)
+                print("{:<9} {:<6} {:>6} {:>8} {:>10} {:>10} {:>10.1f} {:>8.2f}".format(
+                    scenario, algorithm, size, "ok" if result['elected'] else "NO", result['messages'],
+                    result['datagrams'], result['time_to_leader_ms'], result['wall_s']))
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({
+                'benchmark': "election",
+                'revision': _revision(),
+                'python': platform.python_version(),
+                'settings': {'latency': LATENCY, 'jitter': JITTER, 'seed': SEED,
+                             'bully_answer_timeout': config.BULLY_ANSWER_TIMEOUT},
+                'results': results,
+            }, f, indent=2)
+        print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Leader election benchmark")
+    parser.add_argument("--quick", action="store_true", help="10 and 50 servers only")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    arguments = parser.parse_args()
+    run(arguments.quick, arguments.output)
@@ -0,0 +1,113 @@
+import pickle
+import random
+import time
+import tracemalloc
+
+from game.models.Cell import Cell, FieldTypes
+from game.models.Game import Game, Movement
+from game.models.Player import Player
+
+# Run from the repository root: python -m benchmarks.bench_grid
+#
+# Compares the array backed Grid with the former list of Cell objects at 1000x1000. The former layout is
+# rebuilt here (cells, scan for a player, rendering) so both can be measured side by side.
+
+SIZE = 1000
+ITEMS = 1000
+PLAYERS = 50
+MOVES = 20000
+
+
+class _ListGrid:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.cells = [[Cell() for _ in range(width)] for _ in range(height)]
+        for _ in range(int(width * height * 0.3) // 2):
+            self.cells[random.randint(1, height - 2)][random.randint(1, width - 2)].field_type = FieldTypes.ROCK
+        for _ in range(ITEMS):
+            self.cells[random.randint(0, height - 1)][random.randint(0, width - 1)].item = 1
+
+    def find_player(self, player):
+        for index_y, row in enumerate(self.cells):
+            for index_x, cell in enumerate(row):
+                if cell.player and cell.player.id == player.id:
+                    return index_x, index_y
+
+    def to_string(self):
+        display_string = ''
+        for row in self.cells:
+            for cell in row:
+                if cell.field_type == FieldTypes.ROCK:
+                    display_string += ' #  '
+                elif cell.player:
+                    display_string += ' [] '
+                elif cell.item:
+                    display_string += ' X  '
+                else:
+                    display_string += ' .  '
+            display_string += '\n'
+        return display_string
+
+
+def _timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def _allocated(function):
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def _measure_list():
+    random.seed(1)
+    _, build = _timed(lambda: _ListGrid(SIZE, SIZE))
+    grid, memory = _allocated(lambda: _ListGrid(SIZE, SIZE))
+    players = [Player(id=str(i), name=f"p{i}") for i in range(PLAYERS)]
+    for i, player in enumerate(players):
+        grid.cells[i * (SIZE // PLAYERS)][i].player = player
+    _, lookup = _timed(lambda: [grid.find_player(player) for player in players[-5:]])
+    _, render = _timed(grid.to_string)
+    pickled, dump = _timed(lambda: pickle.dumps(grid))
+    return {
+        'build': build, 'memory': memory, 'pickle': len(pickled), 'dump': dump,
+        'render': render, 'lookup': lookup / 5, 'move': None,
+    }
+
+
+def _measure_arrays():
+    random.seed(1)
+    _, build = _timed(lambda: Game("bench", SIZE, SIZE, ITEMS))
+    game, memory = _allocated(lambda: Game("bench", SIZE, SIZE, ITEMS))
+    players = [Player(id=str(i), name=f"p{i}") for i in range(PLAYERS)]
+    for player in players:
+        game.add_player(player)
+    _, lookup = _timed(lambda: [game.get_player_position(player) for player in players[-5:]])
+    _, render = _timed(game.to_string)
+    pickled, dump = _timed(game.to_pickle)
+    moves = [random.choice([Movement.UP, Movement.DOWN, Movement.LEFT, Movement.RIGHT]) for _ in range(MOVES)]
+    _, move = _timed(lambda: [game.move_player(players[i % PLAYERS], movement) for i, movement in enumerate(moves)])
+    return {
+        'build': build, 'memory': memory, 'pickle': len(pickled), 'dump': dump,
+        'render': render, 'lookup': lookup / 5, 'move': move / MOVES,
+    }
+
+
+def run():
+    print(f"Grid {SIZE}x{SIZE}, {PLAYERS} players")
+    print("{:<8} {:>10} {:>12} {:>12} {:>10} {:>11} {:>12} {:>10}".format(
+        'layout', 'build [s]', 'memory [MB]', 'pickle [MB]', 'dump [s]', 'render [s]', 'lookup [us]', 'move [us]'))
+    for name, measure in [("lists", _measure_list), ("arrays", _measure_arrays)]:
+        result = measure()
+        print("{:<8} {:>10.2f} {:>12.1f} {:>12.1f} {:>10.2f} {:>11.2f} {:>12.1f} {:>10}".format(
+            name, result['build'], result['memory'] / 1e6, result['pickle'] / 1e6, result['dump'], result['render'],
+            result['lookup'] * 1e6, "-" if result['move'] is None else f"{result['move'] * 1e6:.1f}"))
+
+
+if __name__ == "__main__":
+    run()
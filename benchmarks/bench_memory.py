@@ -0,0 +1,112 @@
+import time
+import tracemalloc
+import uuid
+
+from game.models.Player import Player
+from models.HoldBackQueue import HoldBackEntry, RelHoldBackEntry, DeliveryState
+from models.Host import Host, HostType
+from transport.BinaryCodec import BinaryCodec
+
+# Run from the repository root: python -m benchmarks.bench_memory
+#
+# Memory of 10k in-flight totally ordered messages from 10 senders: each one held back by the reliable layer and
+# by ISIS, both sharing its decoded header. The former layout (dict entries, full headers, hosts and players with
+# a __dict__) is rebuilt here so both can be measured side by side. The current one drops the acknowledgement
+# vector from the header like SocketService does before holding a message back.
+
+MESSAGES = 10000
+SENDERS = 10
+PLAYERS = 10000
+READS = 1000000
+
+
+class _DictHost(object):
+    def __init__(self, id, address, unicast_port, host_type=HostType.SERVER):
+        self.id = id
+        self.address = address
+        self.unicast_port = unicast_port
+        self.host_type = host_type
+
+
+class _DictPlayer(object):
+    id = None
+    name = None
+    command_seq = 0
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.items = []
+
+
+def _headers(compact):
+    codec = BinaryCodec()
+    senders = [str(uuid.uuid1()) for _ in range(SENDERS)]
+    headers = []
+    for i in range(MESSAGES):
+        header = {'id': senders[i % SENDERS], 't': HostType.SERVER, 'a': "192.168.0.10", 'p': 5000 + i % SENDERS,
+                  'm': "GS/CMD", 'm_id': str(uuid.uuid1()), 'g_ident': "MAIN_GROUP", 'rel_seq': i // SENDERS,
+                  'rel_delivered_seq': {sender: i // SENDERS for sender in senders}}
+        header = codec.decode(codec.encode(header, "up"))[0]
+        if compact:
+            header.pop('rel_delivered_seq')
+        headers.append(header)
+    return headers
+
+
+def _dict_entries():
+    headers = _headers(False)
+    hosts = {}
+    rel, isis = [], []
+    for seq, header in enumerate(headers):
+        host = hosts.setdefault(header['id'], _DictHost(header['id'], header['a'], header['p'], header['t']))
+        rel.append({"seq": header['rel_seq'], "host": host, "header": header, "message": "up"})
+        isis.append({"host": host, "header": header, "method": header['m'], "message": "up", 'resent': False,
+                     "max_suggested_seq": seq, "max_suggested_process_id": host.id,
+                     "state": DeliveryState.UNDELIVERABLE})
+    return rel, isis
+
+
+def _record_entries():
+    headers = _headers(True)
+    hosts = {}
+    rel, isis = [], []
+    for seq, header in enumerate(headers):
+        host = hosts.setdefault(header['id'], Host(header['id'], header['a'], header['p'], header['t']))
+        rel.append(RelHoldBackEntry(header['rel_seq'], host, header, "up"))
+        isis.append(HoldBackEntry(host, header, header['m'], "up", seq, host.id, DeliveryState.UNDELIVERABLE))
+    return rel, isis
+
+
+def _allocated(function):
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def _read_time(read, entry):
+    start = time.perf_counter()
+    for _ in range(READS):
+        read(entry)
+    return (time.perf_counter() - start) / READS
+
+
+def run():
+    print(f"{MESSAGES} in-flight messages from {SENDERS} senders, {PLAYERS} players")
+    print("{:<8} {:>13} {:>11} {:>14} {:>11}".format(
+        'layout', 'memory [MB]', 'bytes/msg', 'players [MB]', 'read [ns]'))
+    layouts = [
+        ("dicts", _dict_entries, _DictPlayer, lambda e: e['max_suggested_seq']),
+        ("slots", _record_entries, Player, lambda e: e.max_suggested_seq),
+    ]
+    for name, build, player_class, read in layouts:
+        (_, isis), memory = _allocated(build)
+        _, players = _allocated(lambda: [player_class(str(i), f"p{i}") for i in range(PLAYERS)])
+        print("{:<8} {:>13.2f} {:>11.0f} {:>14.2f} {:>11.1f}".format(
+            name, memory / 1e6, memory / MESSAGES, players / 1e6, _read_time(read, isis[0]) * 1e9))
+
+
+if __name__ == "__main__":
+    run()
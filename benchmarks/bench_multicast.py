@@ -0,0 +1,185 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+
+import config
+
+# Debug output would dominate the measurement, switch it off before the services read it
+config.DEBUG = False
+
+from models.Group import Group
+from models.Host import Host, HostType
+from services.SocketService import SocketService
+from transport.SimulatedNetwork import SimulatedNetwork
+
+# Run from the repository root: python -m benchmarks.bench_multicast [--quick] [--output results.json]
+#
+# Totally ordered group multicast (send_group_multicast: data over multicast, ISIS proposals over unicast,
+# announcement over multicast) between SocketServices on a SimulatedNetwork, with ISIS and with the fixed
+# sequencer order (the last member numbers the messages, one announcement each). One parameter is varied at a
+# time starting from BASE, every configuration runs with both orderings. Latencies are in simulated time (network latency plus protocol rounds), msg/s is
+# the wall clock rate at which this process pushes messages through every member of the group.
+
+BASE = {'group_size': 5, 'payload': 64, 'senders': 1, 'loss': 0.0}
+SWEEP = {
+    'group_size': [3, 5, 10, 20],
+    'payload': [16, 256, 1024, 4096],
+    'senders': [1, 2, 5],
+    'loss': [0.0, 0.01, 0.05],
+}
+ORDERINGS = ["isis", "sequencer"]
+QUICK_SWEEP = {
+    'group_size': [3, 10],
+    'payload': [64, 4096],
+    'senders': [1, 3],
+    'loss': [0.0, 0.01],
+}
+
+MESSAGES_PER_SENDER = 200
+SEND_INTERVAL = 0.005
+# Time before the first message, the sequencer collects the state of the members meanwhile
+SETUP_TIME = 1
+LATENCY = 0.0005
+JITTER = 0.0005
+DRAIN_TIME = 30
+SEED = 1
+
+
+class _Member:
+    def __init__(self, network, recorder, ordering):
+        self.host = Host(network.new_id(), network.get_local_address(), network.get_unicast_port(), HostType.SERVER)
+        self.socket_service = SocketService(self.host, None, transport=network)
+        self.group = Group("MAIN_GROUP", self.socket_service, ordering=ordering)
+        self.socket_service.add_group(self.group)
+        self.socket_service.set_on_unicast_delivered(lambda *args: None)
+        self.socket_service.set_on_multicast_delivered(
+            lambda host, method, message, header: recorder.on_delivered(self, method, message))
+        self.delivered = []
+
+
+class _Recorder:
+    def __init__(self, network):
+        self.network = network
+        self.sent_at = {}
+        self.latencies = []
+
+    def send(self, member, key, payload):
+        self.sent_at[key] = self.network.now
+        member.socket_service.send_group_multicast(member.group, "BENCH", key + ":" + payload)
+
+    def on_delivered(self, member, method, message):
+        if method != "BENCH":
+            return
+        key = message.split(":", 1)[0]
+        member.delivered.append(key)
+        self.latencies.append(self.network.now - self.sent_at[key])
+
+
+def _percentile(values, percentile):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+def _measure(group_size, payload, senders, loss, ordering):
+    network = SimulatedNetwork(seed=SEED, latency=LATENCY, jitter=JITTER, loss=loss)
+    recorder = _Recorder(network)
+    members = [_Member(network, recorder, ordering) for _ in range(group_size)]
+    for member in members:
+        member.group.participants = [m.host for m in members]
+    for member in members:
+        member.socket_service.start()
+    for member in members:
+        member.socket_service.set_sequencer(member.group, members[-1].host.id)
+
+    padding = "x" * payload
+    senders = min(senders, group_size)
+    for index in range(MESSAGES_PER_SENDER):
+        for sender in range(senders):
+            member = members[sender]
+            member.socket_service.timers.schedule(
+                SETUP_TIME + index * SEND_INTERVAL, recorder.send, member, f"{sender}-{index}", padding)
+
+    messages = MESSAGES_PER_SENDER * senders
+    expected = messages * group_size
+    start = time.perf_counter()
+    network.run_until(SETUP_TIME + MESSAGES_PER_SENDER * SEND_INTERVAL + DRAIN_TIME,
+                      lambda: len(recorder.latencies) >= expected)
+    wall = time.perf_counter() - start
+
+    orders = [member.delivered for member in members]
+    shortest = min(len(order) for order in orders)
+    latencies = recorder.latencies or [0.0]
+    return {
+        'ordering': ordering,
+        'group_size': group_size,
+        'payload': payload,
+        'senders': senders,
+        'loss': loss,
+        'messages': messages,
+        'delivered': len(recorder.latencies) / expected,
+        'total_order': all(order[:shortest] == orders[0][:shortest] for order in orders),
+        'latency_p50_ms': _percentile(latencies, 0.5) * 1000,
+        'latency_p99_ms': _percentile(latencies, 0.99) * 1000,
+        'latency_max_ms': max(latencies) * 1000,
+        'msg_per_s': messages / wall,
+        'packets_per_msg': network.datagrams_sent / messages,
+        'bytes_per_msg': network.bytes_sent / messages,
+        'wall_s': wall,
+    }
+
+
+def _configurations(sweep):
+    seen = set()
+    for parameter, values in sweep.items():
+        for value in values:
+            configuration = dict(BASE, **{parameter: value})
+            key = tuple(sorted(configuration.items()))
+            if key not in seen:
+                seen.add(key)
+                for ordering in ORDERINGS:
+                    yield dict(configuration, ordering=ordering)
+
+
+def _revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quick=False, output=None):
+    print("{:<9} {:>5} {:>7} {:>7} {:>6} {:>9} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+        'ordering', 'group', 'payload', 'senders', 'loss', 'delivered', 'order', 'p50 [ms]', 'p99 [ms]', 'max [ms]',
+        'msg/s', 'pkts/msg'))
+    results = []
+    for configuration in _configurations(QUICK_SWEEP if quick else SWEEP):
+        result = _measure(**configuration)
+        results.append(result)
+        print("{:<9} {:>5} {:>7} {:>7} {:>6.2f} {:>9.1%} {:>6} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.0f} {:>9.1f}".format(
+            result['ordering'], result['group_size'], result['payload'], result['senders'], result['loss'], result['delivered'],
+            "ok" if result['total_order'] else "BROKEN", result['latency_p50_ms'], result['latency_p99_ms'],
+            result['latency_max_ms'], result['msg_per_s'], result['packets_per_msg']))
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({
+                'benchmark': "multicast",
+                'revision': _revision(),
+                'python': platform.python_version(),
+                'codec': config.WIRE_CODEC,
+                'settings': {'messages_per_sender': MESSAGES_PER_SENDER, 'send_interval': SEND_INTERVAL,
+                             'latency': LATENCY, 'jitter': JITTER, 'seed': SEED},
+                'results': results,
+            }, f, indent=2)
+        print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Totally ordered multicast benchmark")
+    parser.add_argument("--quick", action="store_true", help="smaller sweep")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    arguments = parser.parse_args()
+    run(arguments.quick, arguments.output)
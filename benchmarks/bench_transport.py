@@ -0,0 +1,137 @@
+import statistics
+import threading
+import time
+import uuid
+
+import config
+
+# Debug output would dominate the measurement, switch it off before the services read it
+config.DEBUG = False
+
+from models.Host import Host, HostType
+from services.socket_service_helper import create_socket_service
+from util.address_helper import get_local_address, get_random_unicast_port
+
+# Run from the repository root: python -m benchmarks.bench_transport
+
+ROUND_TRIPS = 500
+MESSAGES = 2000
+TIMEOUT = 30
+# A handler that blocks for BLOCK_TIME seconds, followed by BLOCKED_MESSAGES more messages
+BLOCK_TIME = 0.5
+BLOCKED_MESSAGES = 100
+
+
+class _Peer:
+    def __init__(self, engine, batching):
+        self.host = Host(str(uuid.uuid1()), get_local_address(), get_random_unicast_port(), HostType.SERVER)
+        self.socket_service = create_socket_service(self.host, None, engine)
+        if not batching:
+            self.socket_service.batcher.max_bytes = 0
+        self.socket_service.set_on_unicast_delivered(self.on_unicast_received)
+        self.socket_service.daemon = True
+        self.condition = threading.Condition()
+        self.received = 0
+        self.echo_to = None
+
+    def on_unicast_received(self, host, method, message):
+        if method == "BLOCK":
+            time.sleep(BLOCK_TIME)
+        if method == "PING" and self.echo_to:
+            self.socket_service.send_unicast(self.echo_to, "PONG", message)
+        with self.condition:
+            self.received = self.received + 1
+            self.condition.notify_all()
+
+    def wait_for(self, count):
+        with self.condition:
+            return self.condition.wait_for(lambda: self.received >= count, TIMEOUT)
+
+
+def _percentile(values, percentile):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+def _datagrams(*peers):
+    return sum(peer.socket_service.batcher.datagrams_sent for peer in peers)
+
+
+def _measure(engine, batching):
+    sender = _Peer(engine, batching)
+    receiver = _Peer(engine, batching)
+    receiver.echo_to = sender.host
+    sender.socket_service.start()
+    receiver.socket_service.start()
+    time.sleep(0.5)
+
+    round_trips = []
+    for i in range(ROUND_TRIPS):
+        start = time.perf_counter()
+        sender.socket_service.send_unicast(receiver.host, "PING", str(i))
+        if not sender.wait_for(i + 1):
+            raise RuntimeError(f"{engine}: no answer for ping {i}")
+        round_trips.append((time.perf_counter() - start) * 1e6)
+
+    receiver.echo_to = None
+    received = receiver.received
+    datagrams = _datagrams(sender, receiver)
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        sender.socket_service.send_unicast(receiver.host, "DATA", str(i))
+    if not receiver.wait_for(received + MESSAGES):
+        raise RuntimeError(f"{engine}: only {receiver.received - received} of {MESSAGES} messages delivered")
+    throughput = MESSAGES / (time.perf_counter() - start)
+    # Acknowledgements may still be on their way, give them a moment to be counted
+    time.sleep(0.2)
+    datagrams_per_message = (_datagrams(sender, receiver) - datagrams) / MESSAGES
+
+    return statistics.median(round_trips), _percentile(round_trips, 0.99), throughput, datagrams_per_message
+
+
+def _measure_blocked(engine):
+    # Until when the sender sees its messages acknowledged while the handler of the receiver blocks
+    sender = _Peer(engine, True)
+    receiver = _Peer(engine, True)
+    sender.socket_service.start()
+    receiver.socket_service.start()
+    time.sleep(0.5)
+
+    start = time.perf_counter()
+    sender.socket_service.send_unicast(receiver.host, "BLOCK", "")
+    for i in range(BLOCKED_MESSAGES):
+        sender.socket_service.send_unicast(receiver.host, "DATA", str(i))
+    deadline = start + TIMEOUT
+    while time.perf_counter() < deadline:
+        stats = sender.socket_service.hosts.get_stats(receiver.host.id)
+        if not stats['unacked'] and not stats['backlog']:
+            break
+        time.sleep(0.001)
+    acknowledged = time.perf_counter() - start
+    if not receiver.wait_for(BLOCKED_MESSAGES + 1):
+        raise RuntimeError(f"{engine}: only {receiver.received} of {BLOCKED_MESSAGES + 1} messages delivered")
+    retransmitted = sender.socket_service.hosts.get_stats(receiver.host.id)['retransmitted']
+    # The messages wait behind the blocked handler in the application queue of the pipeline
+    backlog = receiver.socket_service.get_pipeline_stats()['application']['max_depth'] if engine == "pipeline" else '-'
+    return acknowledged * 1000, retransmitted, backlog
+
+
+def run():
+    print("{:<8} {:<6} {:>14} {:>14} {:>12} {:>10}".format(
+        'engine', 'batch', 'rtt p50 [us]', 'rtt p99 [us]', 'msg/s', 'pkts/msg'))
+    print("(pkts/msg counts the datagrams of both hosts during the burst, data plus acknowledgements)")
+    for engine in ["thread", "asyncio", "pipeline"]:
+        for batching in [False, True]:
+            p50, p99, throughput, datagrams_per_message = _measure(engine, batching)
+            print("{:<8} {:<6} {:>14.0f} {:>14.0f} {:>12.0f} {:>10.2f}".format(
+                engine, "on" if batching else "off", p50, p99, throughput, datagrams_per_message))
+    print()
+    print(f"A handler blocks for {BLOCK_TIME * 1000:.0f} ms, {BLOCKED_MESSAGES} messages follow")
+    print("{:<8} {:>14} {:>14} {:>14}".format('engine', 'acked [ms]', 'retransmitted', 'max queued'))
+    for engine in ["thread", "asyncio", "pipeline"]:
+        acknowledged, retransmitted, backlog = _measure_blocked(engine)
+        print("{:<8} {:>14.1f} {:>14} {:>14}".format(engine, acknowledged, retransmitted, backlog))
+
+
+if __name__ == "__main__":
+    run()
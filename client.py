@@ -1,14 +1,18 @@
 import json
 import uuid
 
-from config import BUFFER_SIZE, UNICAST_PORT, PAYLOAD_DELIMITER, DEBUG
-from game.models.Game import Game
+from config import BUFFER_SIZE, UNICAST_PORT, PAYLOAD_DELIMITER, DEBUG, MEMBERSHIP
+from game.models.Game import Game, Movement
+from models.GameGroup import GameGroup
 from models.Host import Host, HostType
 from models.Ring import Ring
 from models.SeverGroup import KnownHostGroup
+from services.CommandService import CommandService
 from services.DiscoveryService import DiscoveryService
 from services.HeartbeatService import HeartbeatService
-from services.SocketService import SocketService
+from services.MembershipService import MembershipService
+from services.socket_service_helper import create_socket_service
+from transport.UdpTransport import UdpTransport
 from util.KeyboardInput import KeyboardThread
 from util.address_helper import get_local_address, get_random_unicast_port
 from util.terminal_helper import cls
@@ -23,15 +27,20 @@ client_id = uuid.uuid1()
 
 class Client:
 
-    def __init__(self):
+    def __init__(self, transport=None, membership: str = MEMBERSHIP):
+        self.transport = transport or UdpTransport()
         self.own_host = Host(
-            str(uuid.uuid1()),
-            get_local_address(),
-            get_random_unicast_port(),
+            self.transport.new_id(),
+            self.transport.get_local_address(),
+            self.transport.get_unicast_port(),
             HostType.CLIENT
         )
 
         self.current_game = None
+        # current_game with our moves the server did not process yet, shown until the server catches up
+        self.predicted_game = None
+        self.predicted_moves = []
+        self.game_group = None
         self.currently_initializing = []
         self.leader = None
 
@@ -44,7 +53,7 @@ class Client:
         self.ring = Ring(self.own_host)
         self.server_ring = Ring(self.own_host)
 
-        self.socket_service = SocketService(self.own_host, self.on_host_failed)
+        self.socket_service = create_socket_service(self.own_host, self.on_host_failed, transport=self.transport)
         self.socket_service.sockets.remove(self.socket_service.broadcast_socket)
         self.all_host_group = KnownHostGroup(self.own_host, self.ring, self.server_ring, self.socket_service)
         self.all_host_group.add_participant(self.own_host)
@@ -52,24 +61,38 @@ class Client:
         self.socket_service.set_on_broadcast_delivered(self.on_broadcast_received)
         self.socket_service.set_on_multicast_delivered(self.on_server_multicast_received)
         self.socket_service.set_on_unicast_delivered(self.on_unicast_received)
+        self.socket_service.set_on_state_transfer_required(self.on_state_transfer_required)
 
         self.discovery_service = DiscoveryService(self.own_host, self.socket_service, None)
+        self.command_service = CommandService(self.socket_service, self.get_server_for_command)
 
         self.heartbeat_service = HeartbeatService(self.own_host, self.ring, self.socket_service)
         self.heartbeat_service.set_on_heartbeat_missing(self.on_host_missing)
+        self.membership_service = None
+        if membership == "swim":
+            self.membership_service = MembershipService(self.own_host, self.socket_service)
+            self.membership_service.set_on_member_joined(self.on_member_joined)
+            self.membership_service.set_on_member_failed(self.on_host_missing)
         self.keybord = KeyboardThread(self.take_input)
 
         self.discovery_service.daemon = True
         self.keybord.daemon = True
         self.socket_service.daemon = True
 
+    def start(self, with_keyboard=True):
+        # Without keyboard, commands are given via take_input (e.g. in a simulation)
         self.discovery_service.start_broadcasting()
-        self.heartbeat_service.start_heartbeat()
+        if self.membership_service:
+            self.membership_service.start()
+        else:
+            self.heartbeat_service.start_heartbeat()
 
         self.socket_service.start()
         self.discovery_service.start()
-        self.keybord.start()
+        if with_keyboard:
+            self.keybord.start()
 
+    def join(self):
         self.keybord.join()
         self.socket_service.join()
         self.discovery_service.join()
@@ -83,13 +106,22 @@ class Client:
             self.discovery_service.stop_broadcasting()
             data = json.loads(message)
             hosts = json.loads(data.get("hosts"))
-            list_of_hosts = [Host.from_json(h) for h in hosts]
+            list_of_hosts = [self.socket_service.hosts.intern_host(Host.from_json(h)) for h in hosts]
+            if self.membership_service:
+                # Only the contact hears from us, it spreads our join
+                contact_host = self.socket_service.hosts.intern_host(Host.from_json(data.get("host")))
+                for new_host in list_of_hosts:
+                    if new_host.id != contact_host.id:
+                        self.membership_service.add_member(new_host)
+                list_of_hosts = [contact_host]
             for new_host in list_of_hosts:
                 self.currently_initializing.append(new_host.id)
                 self.socket_service.send_unicast(new_host, "SERVER/JOIN", "")
         elif method == "SERVER/JOINED":
             print("Got answer from host!")
-            self.all_host_group.add_participant(host)
+            self.on_member_joined(host)
+            if self.membership_service:
+                self.membership_service.add_member(host)
             self.currently_initializing.remove(host.id)
             if message == "True":
                 print("Got leader")
@@ -97,10 +129,16 @@ class Client:
             if len(self.currently_initializing) == 0:
                 print("Announce new group")
                 self.socket_service.add_group(self.all_host_group)
-                self.all_host_group.announce_participants()
+                if not self.membership_service:
+                    self.all_host_group.sync_view(host)
+                    # Hosts that only answered our broadcast may not know the others yet
+                    self.all_host_group.announce_changes(joined=self.all_host_group.view.get_hosts())
                 self.run_game()
         if method == "SERVER/JOIN":
-            self.all_host_group.add_participant(host)
+            self.on_member_joined(host)
+            if self.membership_service:
+                self.membership_service.add_member(host)
+                self.membership_service.sync(host)
             print("ANSWERED HOST!")
             current_leader = False
             self.socket_service.send_unicast(host, "SERVER/JOINED", str(current_leader))
@@ -112,12 +150,64 @@ class Client:
         elif method == "GS/LS":
             self.run_game()
             print(message)
+        elif method == "GS/SYNC":
+            self.on_game_received(Game.from_pickle(message))
+        elif method == "GS/CMD_ACK":
+            self.command_service.on_ack_received(message)
         elif method == "HB":
             self.heartbeat_service.on_heartbeat_received(host, message)
+        elif self.membership_service:
+            self.membership_service.on_unicast_received(host, method, message)
+        self.all_host_group.on_unicast_received(host, method, message)
+
+    def on_game_received(self, game: Game):
+        if game.get_player(self.own_host.id):
+            print("SET GAME")
+            self.current_game = game
+            self.join_game_group(game)
+        elif self.current_game and game.id == self.current_game.id:
+            self.current_game = None
+            self.leave_game_group()
+        self.predict_game()
+        self.run_game()
+
+    def predict_game(self):
+        # Replays the moves the server has not processed yet on a copy of the received game
+        with self.command_service.lock:
+            player = self.current_game.get_player(self.own_host.id) if self.current_game else None
+            if not player:
+                self.predicted_moves = []
+            else:
+                self.predicted_moves = [(seq, move) for seq, move in self.predicted_moves if seq > player.command_seq]
+            if not self.predicted_moves:
+                self.predicted_game = None
+                return
+            game = Game.from_pickle(self.current_game.to_pickle())
+            predicted_player = game.get_player(self.own_host.id)
+            for _, move in self.predicted_moves:
+                game.move_player(predicted_player, move)
+            self.predicted_game = game
+
+    def join_game_group(self, game: Game):
+        # We only receive the updates of the game we play
+        if self.game_group and self.game_group.game_id != str(game.id):
+            self.leave_game_group()
+        if not self.game_group:
+            self.game_group = GameGroup(game.id, self.socket_service)
+            self.socket_service.add_group(self.game_group)
+        self.game_group.set_members(game, self.all_host_group)
+
+    def leave_game_group(self):
+        if self.game_group:
+            self.socket_service.remove_group(self.game_group)
+            self.game_group = None
+
+    def on_state_transfer_required(self, group):
+        if self.current_game and isinstance(group, GameGroup) and group.game_id == str(self.current_game.id):
+            self.socket_service.send_unicast(self.get_server_for_command(""), "GS/SYNC_GAME", group.game_id)
 
     def on_host_failed(self):
-        self.all_host_group.remove_participant(self.all_host_group.ring.get_right_neighbour())
-        self.all_host_group.announce_participants()
+        self.on_host_missing(self.all_host_group.ring.get_right_neighbour())
 
     def on_server_multicast_received(self, host: Host, method: str, message, header):
         self.all_host_group.on_multicast_received(host, method, message, header)
@@ -131,39 +221,73 @@ class Client:
             self.leader = new_leader
             self.run_game()
         if method == "GS/OV":
-            game = Game.from_pickle(message)
-            if game.get_player(self.own_host.id):
-                print("SET GAME")
-                self.current_game = game
-            elif self.current_game and game.id == self.current_game.id:
-                self.current_game = None
-            self.run_game()
+            self.on_game_received(Game.from_pickle(message))
+        elif method == "GS/DELTA":
+            delta = json.loads(message)
+            if self.current_game and str(self.current_game.id) == delta.get('g'):
+                if self.current_game.seq >= delta.get('seq'):
+                    return
+                if not self.current_game.apply_delta(delta):
+                    print("Missed game update, request snapshot")
+                    self.socket_service.send_unicast(host, "GS/SYNC_GAME", delta.get('g'))
+                    return
+                self.on_game_received(self.current_game)
+            elif self.own_host.id in delta.get('roster', []):
+                # We just joined this game and have nothing to apply the delta to
+                self.socket_service.send_unicast(host, "GS/SYNC_GAME", delta.get('g'))
         elif method == "GS/WIN":
             base_message = json.loads(message)
             game_id = base_message.get('game_id')
-            if self.current_game and game_id == self.current_game.id:
+            if self.current_game and game_id == str(self.current_game.id):
                 print(base_message.get('message'))
             self.run_game()
 
     def take_input(self, input):
-        self.socket_service.send_unicast(self.leader, "GS", input)
+        with self.command_service.lock:
+            seq = self.command_service.send(input)
+            if input in [Movement.UP, Movement.DOWN, Movement.LEFT, Movement.RIGHT] and self.current_game:
+                # Show the move right away, the server's answer replaces it
+                self.predicted_moves.append((seq, input))
+                self.predict_game()
+                self.run_game()
+
+    def get_server_for_command(self, command):
+        # Commands go to the owner server of the game, display (or no known owner) to the leader
+        chunks = command.split(PAYLOAD_DELIMITER)
+        mode = chunks[0].lower()
+        game_name = None
+        if mode in ["create", "join"] and len(chunks) > 1:
+            game_name = chunks[1]
+        elif mode != "display" and self.current_game:
+            game_name = self.current_game.name
+        owner = self.all_host_group.get_game_owner(game_name) if game_name else None
+        return owner or self.leader
 
     def run_game(self):
         # if not DEBUG:
         #    cls()
-        if self.current_game:
-            self.current_game.draw()
+        game = self.predicted_game or self.current_game
+        if game:
+            game.draw()
         print("Type in direction (create:game_name ,display, join:gamename:name, leave, up, down, left, right) :")
 
+    def on_member_joined(self, host: Host):
+        self.all_host_group.add_participant(host)
+
     def on_host_missing(self, host: Host):
         print(f"HOST {host.id} NOT ANSWERING!")
+        if not self.all_host_group.get_host(host.id):
+            return
         self.all_host_group.remove_participant(host)
-        self.all_host_group.announce_participants()
+        if not self.membership_service:
+            self.all_host_group.announce_changes(left=[host])
 
 
 if __name__ == "__main__":
     client = None
-try:
-    client = Client()
-except KeyboardInterrupt:
-    print("Shut down because keyboard interrupted")
+    try:
+        client = Client()
+        client.start()
+        client.join()
+    except KeyboardInterrupt:
+        print("Shut down because keyboard interrupted")
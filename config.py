@@ -7,18 +7,100 @@ UNICAST_PORT = 5001
 BROADCAST_ADDRESS = "192.168.0.255"
 BROADCAST_PORT = 5000
 BROADCAST_INTERVAL = 3
+MAX_BROADCAST_RETRIES = 1
 
 SERVER_GROUP_BASE_MULTICAST_ADDRESS = "224.1.1.1"
 SERVER_GROUP_MULTICAST_PORT = 5002
+# Every game has its own group on one of the addresses following SERVER_GROUP_BASE_MULTICAST_ADDRESS
+GAME_GROUP_MULTICAST_ADDRESSES = 4096
 
 BUFFER_SIZE = 4096 * 2
 
+# Reliable unicast: datagrams in flight per peer and retransmission timeouts in seconds
+UNICAST_WINDOW = 32
+UNICAST_INITIAL_RTO = 0.5
+UNICAST_MIN_RTO = 0.05
+UNICAST_MAX_RTO = 4
+UNICAST_MAX_RETRANSMITS = 8
+UNICAST_DUP_ACK_THRESHOLD = 2
+
+# Control messages per destination are coalesced into one datagram (0 disables it), flushed after the delay
+BATCH_MAX_BYTES = 1400
+BATCH_FLUSH_DELAY = 0.002
+# Datagrams read from a socket per wakeup of the receive loop
+RECEIVE_BURST = 32
+
+# Frames larger than FRAGMENT_SIZE are fragmented, missing fragments are requested after FRAGMENT_NACK_DELAY
+FRAGMENT_SIZE = 1400
+FRAGMENT_NACK_DELAY = 0.05
+FRAGMENT_TIMEOUT = 5
+FRAGMENT_BUFFER_MAX_BYTES = 8 * 1024 * 1024
+FRAGMENT_SEND_CACHE_BYTES = 4 * 1024 * 1024
+
+# Memory cap of a multicast history, evicted messages are recovered via state transfer
+HISTORY_MAX_BYTES = 4 * 1024 * 1024
+HISTORY_PRUNE_INTERVAL = 16
+# Gaps still open after this many seconds are requested with a REL_NACK, most are only reordering
+REL_NACK_DELAY = 0.01
+# Total order of group multicasts: "isis" (proposals of all members) or "sequencer" (the leader numbers them)
+TOTAL_ORDER = "isis"
+SEQUENCER_HANDOVER_TIMEOUT = 0.5
+# An ISIS sender sends its message again to the members whose proposal is missing after this many seconds
+ISIS_PROPOSAL_TIMEOUT = 0.2
+
+# HB after HEARTBEAT_INTERVAL seconds of silence, the neighbour is suspected from a phi of HEARTBEAT_PHI_THRESHOLD
 HEARTBEAT_INTERVAL = 2
-HEARTBEAT_MAX = 6
+HEARTBEAT_CHECK_INTERVAL = 0.5
+HEARTBEAT_PHI_THRESHOLD = 8
+HEARTBEAT_PHI_WINDOW = 100
+HEARTBEAT_MIN_STD = 0.2
+HEARTBEAT_ACCEPTABLE_PAUSE = 0.5
+
+# Membership of the hosts: "group" (view deltas in MAIN_GROUP and heartbeats) or "swim" (services/MembershipService.py)
+MEMBERSHIP = "group"
+# A member that missed view deltas gets the whole view with the ids of the last VIEW_SYNC_DELTAS deltas in it
+VIEW_SYNC_DELTAS = 64
+SWIM_PROTOCOL_PERIOD = 1
+SWIM_PING_TIMEOUT = 0.3
+SWIM_INDIRECT_PROBES = 3
+SWIM_SUSPECT_TIMEOUT = 3
+SWIM_MAX_PIGGYBACK = 8
+SWIM_RETRANSMIT_MULTIPLIER = 3
 
 HEADER_DELIMITER = "|"
 PAYLOAD_DELIMITER = ":"
-MAX_BROADCAST_RETRIES = 1
+
+# Framing used for sent datagrams: "binary" or the legacy "json", both are accepted on receive
+WIRE_CODEC = "binary"
+
+# Socket handling: "thread" (select), "asyncio" (one event loop) or "pipeline" (services/PipelinedSocketService.py)
+TRANSPORT_ENGINE = "thread"
+# "pipeline" queue sizes and application threads, more than 1 worker only for thread safe handlers
+PIPELINE_QUEUE_SIZE = 1024
+PIPELINE_APPLICATION_QUEUE_SIZE = 1024
+PIPELINE_WORKERS = 1
+
+# Seconds after which an election without result is started again
+ELECTION_TIMEOUT = 3
+# Leader election of the servers: "lcr", "hs" or "bully" (election/election_factory.py)
+ELECTION_ALGORITHM = "lcr"
+BULLY_ANSWER_TIMEOUT = 0.5
+
+# Game updates are multicast as deltas (GS/DELTA), every GAME_SNAPSHOT_INTERVAL-th update is a full snapshot (GS/OV)
+GAME_SNAPSHOT_INTERVAL = 20
+
+# Updates per second of a game, 0 sends an update for every command
+GAME_TICK_RATE = 0
+
+# Games are spread over the servers by consistent hashing of the game name, points per server on the hash ring
+GAME_HASH_VIRTUAL_NODES = 64
+# Cap of the reliable multicast history per game group, older updates are recovered with a snapshot
+GAME_GROUP_HISTORY_MAX_BYTES = 256 * 1024
+
+# Client commands in flight, seconds until one is sent again and how long servers collect their acknowledgements
+CLIENT_COMMAND_WINDOW = 16
+CLIENT_COMMAND_TIMEOUT = 2
+COMMAND_ACK_DELAY = 0.01
 
 DEBUG = True
 HEARTBEAT = False
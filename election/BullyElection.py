@@ -0,0 +1,54 @@
+from config import BULLY_ANSWER_TIMEOUT
+from election.Election import Election
+from models.Host import Host
+
+
+class BullyElection(Election):
+    # Bully (Garcia-Molina): a host asks every server with a larger id (BULLY/ELECTION), each of them answers
+    # (BULLY/ANSWER) and starts its own election. A host without answer after BULLY_ANSWER_TIMEOUT is the leader.
+    # Needs every server in the ring and O(n^2) messages when the smallest id starts, but only two message
+    # delays plus the timeout when the largest one does, independent of the number of servers
+    def __init__(self, socket_service, own_node: Host, ring, all_host_group):
+        super().__init__(socket_service, own_node, ring, all_host_group)
+        self.answered = False
+
+    def start_election(self):
+        if self.in_election():
+            return
+        print("[Election] Start election")
+        self.participate()
+        self.answered = False
+        larger = [node for node in self.ring.nodes if node.id > self.own_host.id]
+        if not larger:
+            self.become_leader()
+            return
+        for node in larger:
+            self.socket_service.send_unicast(node, "BULLY/ELECTION", '')
+        self.socket_service.timers.schedule(BULLY_ANSWER_TIMEOUT, self._on_answer_timeout, self.election_started)
+
+    def on_message_received(self, host: Host, method, message: str):
+        super().on_message_received(host, method, message)
+        if method == "BULLY/ELECTION" and host.id < self.own_host.id:
+            self.socket_service.send_unicast(host, "BULLY/ANSWER", '')
+            if self.current_leader and self.current_leader.id == self.own_host.id:
+                # Already won, only the asking server missed it
+                self.socket_service.send_unicast(host, "LCR/LEADER_CHANGED", self.own_host.id)
+            else:
+                self.start_election()
+        elif method == "BULLY/ANSWER" and self.in_election():
+            # A larger server takes over, its announcement follows
+            self.answered = True
+
+    def on_leader_announced(self, new_leader_id: str):
+        if new_leader_id < self.own_host.id:
+            # A smaller server claims to lead, we bully it out
+            self.start_election()
+            return
+        if self.current_leader and self.current_leader.id > new_leader_id and self.current_leader.id in self.ring.by_id:
+            # Late claim of a server that won before it knew the larger ones
+            return
+        super().on_leader_announced(new_leader_id)
+
+    def _on_answer_timeout(self, election_started):
+        if self.in_election() and self.election_started == election_started and not self.answered:
+            self.become_leader()
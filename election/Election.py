@@ -0,0 +1,94 @@
+import abc
+
+from config import PAYLOAD_DELIMITER, ELECTION_TIMEOUT
+from services.SocketService import SocketService
+from models.Ring import Ring
+from models.Host import Host
+
+
+class Election(abc.ABC):
+    # Common part of the election algorithms: the leader, the participation in an election and the announcement
+    # of the winner to the whole group (LCR/LEADER_CHANGED, also read by clients and the monitor).
+    # Subclasses implement start_election and handle their own messages in on_message_received
+    def __init__(self, socket_service: SocketService, own_node: Host, ring, all_host_group):
+        self.socket_service: SocketService = socket_service
+        self.all_host_group = all_host_group
+        self.current_leader: Host = None
+        self.on_leader_changed = None
+        self.ring: Ring = ring
+        self.own_host: Host = own_node
+        self.is_participant: bool = False
+        self.election_started = 0
+        self.ring.on_left_neighbour_changed.subscribe("election", self.on_left_neighbour_changed)
+        self.ring.on_right_neighbour_changed.subscribe("election", self.on_right_neighbour_changed)
+
+    @abc.abstractmethod
+    def start_election(self):
+        pass
+
+    def on_message_received(self, host: Host, method, message: str):
+        if method == "LCR/LEADER_CHANGED":
+            self.on_leader_announced(message.split(PAYLOAD_DELIMITER)[0])
+
+    def on_leader_announced(self, new_leader_id: str):
+        # The winner announced itself, taken as is
+        self.is_participant = False
+        if new_leader_id not in self.ring.by_id:
+            # Not in our ring yet, elected again until it is (see Server.start_election_if_no_leader)
+            self.clear_leader()
+        elif not self.current_leader or self.current_leader.id != new_leader_id:
+            self.set_leader(new_leader_id)
+
+    def on_left_neighbour_changed(self, neighbour: Host):
+        pass
+
+    def on_right_neighbour_changed(self, neighbour: Host):
+        pass
+
+    def in_election(self):
+        # An election without result after ELECTION_TIMEOUT lost its message, e.g. on a ring that changed meanwhile
+        return self.is_participant and self.socket_service.timers.clock() - self.election_started < ELECTION_TIMEOUT
+
+    def participate(self):
+        if not self.in_election():
+            self.election_started = self.socket_service.timers.clock()
+        self.is_participant = True
+
+    def set_on_leader_changed(self, func):
+        self.on_leader_changed = func
+
+    def set_leader(self, leader_id: str):
+        leader = self.ring.get_node(leader_id)
+        if leader:
+            print(f"[Election] Set {leader_id} as leader")
+            changed = leader is not self.current_leader
+            self.current_leader = leader
+            if changed and self.on_leader_changed:
+                self.on_leader_changed(leader)
+        else:
+            print(f"[Election] ERROR! Could not find leader!")
+
+    def clear_leader(self):
+        changed = self.current_leader is not None
+        self.current_leader = None
+        if changed and self.on_leader_changed:
+            self.on_leader_changed(None)
+
+    def become_leader(self):
+        print("######## Im the leader now! #######")
+        self.is_participant = False
+        self.set_leader(self.own_host.id)
+        self.announce_leader()
+
+    def announce_leader(self):
+        self.socket_service.send_group_multicast(
+            self.all_host_group,
+            f"LCR/LEADER_CHANGED",
+            self.current_leader.id
+        )
+
+    def leader_elected(self):
+        return not not self.current_leader
+
+    def get_leader(self):
+        return self.current_leader
@@ -0,0 +1,77 @@
+import json
+
+from election.Election import Election
+from models.Host import Host
+
+LEFT = "l"
+RIGHT = "r"
+
+
+class HSElection(Election):
+    # Hirschberg-Sinclair: in phase k a candidate sends its id 2^k hops in both directions of the ring (HS/PROBE),
+    # a larger id on the way swallows it, otherwise the last host sends it back (HS/REPLY). A candidate with both
+    # replies goes to the next phase, the one whose probe comes around the whole ring is the leader.
+    # O(n log n) messages: at most n / 2^(k-1) candidates survive into phase k, each sends 4 * 2^k messages
+    def __init__(self, socket_service, own_node: Host, ring, all_host_group):
+        super().__init__(socket_service, own_node, ring, all_host_group)
+        self.phase = 0
+        self.replies = set()
+
+    def start_election(self):
+        if not self.in_election():
+            print("[Election] Start election")
+            self.participate()
+            self._start_phase(0)
+
+    def on_message_received(self, host: Host, method, message: str):
+        super().on_message_received(host, method, message)
+        if method == "HS/PROBE":
+            probe = json.loads(message)
+            if probe['i'] == self.own_host.id:
+                # Our probe went around the whole ring, the one of the other direction is ignored
+                if self.in_election():
+                    self.become_leader()
+            elif probe['i'] > self.own_host.id:
+                self.participate()
+                if probe['h'] < 2 ** probe['k']:
+                    probe['h'] = probe['h'] + 1
+                    self._send(probe['d'], "HS/PROBE", probe)
+                else:
+                    self._send(_opposite(probe['d']), "HS/REPLY", {'i': probe['i'], 'k': probe['k'],
+                                                                   'd': _opposite(probe['d'])})
+            elif not self.in_election():
+                # Swallowed, a larger id has to start its own
+                self.start_election()
+        elif method == "HS/REPLY":
+            reply = json.loads(message)
+            if reply['i'] != self.own_host.id:
+                self._send(reply['d'], "HS/REPLY", reply)
+            elif self.in_election() and reply['k'] == self.phase:
+                self.replies.add(reply['d'])
+                if len(self.replies) == 2:
+                    self._start_phase(self.phase + 1)
+
+    def on_left_neighbour_changed(self, neighbour: Host):
+        # A probe of the running phase may have gone to a host that left
+        if self.in_election():
+            self._start_phase(self.phase)
+
+    def on_right_neighbour_changed(self, neighbour: Host):
+        self.on_left_neighbour_changed(neighbour)
+
+    def _start_phase(self, phase):
+        self.phase = phase
+        self.replies = set()
+        for direction in (LEFT, RIGHT):
+            self._send(direction, "HS/PROBE", {'i': self.own_host.id, 'k': phase, 'h': 1, 'd': direction})
+
+    def _send(self, direction, method, payload):
+        if direction == LEFT:
+            neighbour = self.ring.get_left_neighbour()
+        else:
+            neighbour = self.ring.get_right_neighbour()
+        self.socket_service.send_unicast(neighbour, method, json.dumps(payload))
+
+
+def _opposite(direction):
+    return RIGHT if direction == LEFT else LEFT
@@ -10,4 +10,4 @@ def from_election_message(election_message: ElectionMessage):
 
 def to_election_message(data: str):
     chunks = data.split(PAYLOAD_DELIMITER)
-    return ElectionMessage(participant_id=chunks[0], is_leader=chunks[1])
+    return ElectionMessage(participant_id=chunks[0], is_leader=chunks[1] == str(True))
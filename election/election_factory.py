@@ -0,0 +1,19 @@
+from config import ELECTION_ALGORITHM
+from election.BullyElection import BullyElection
+from election.HSElection import HSElection
+from election.LCRElection import LCRElection
+from models.Host import Host
+from services.SocketService import SocketService
+
+_algorithms = {
+    "lcr": LCRElection,
+    "hs": HSElection,
+    "bully": BullyElection,
+}
+
+
+def create_election(socket_service: SocketService, own_host: Host, ring, all_host_group,
+                    algorithm: str = ELECTION_ALGORITHM):
+    if algorithm not in _algorithms:
+        raise ValueError(f"Unknown election algorithm {algorithm}")
+    return _algorithms[algorithm](socket_service, own_host, ring, all_host_group)
@@ -3,8 +3,50 @@ class FieldTypes:
     ROCK = "ROCK"
 
 
+# Codes of the field types in Grid.field_types
+FIELD_TYPE_CODES = {FieldTypes.FIELD: 0, FieldTypes.ROCK: 1}
+FIELD_TYPES = [FieldTypes.FIELD, FieldTypes.ROCK]
+
+
 class Cell(object):
+    __slots__ = ('item', 'field_type', 'player')
+
     def __init__(self):
         self.item = 0
         self.field_type = FieldTypes.FIELD
         self.player = None
+
+
+class CellView(object):
+    # Cell interface on top of the arrays of a Grid, reads and writes go to the grid
+    __slots__ = ('grid', 'x', 'y', 'index')
+
+    def __init__(self, grid, x: int, y: int):
+        self.grid = grid
+        self.x = x
+        self.y = y
+        self.index = y * grid.width + x
+
+    @property
+    def item(self):
+        return self.grid.items[self.index]
+
+    @item.setter
+    def item(self, value):
+        self.grid.items[self.index] = value or 0
+
+    @property
+    def field_type(self):
+        return FIELD_TYPES[self.grid.field_types[self.index]]
+
+    @field_type.setter
+    def field_type(self, value):
+        self.grid.field_types[self.index] = FIELD_TYPE_CODES[value]
+
+    @property
+    def player(self):
+        return self.grid.get_player(self.x, self.y)
+
+    @player.setter
+    def player(self, value):
+        self.grid.set_player(self.x, self.y, value)
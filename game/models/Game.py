@@ -1,14 +1,21 @@
 import ast
 import json
 import pickle
+import re
 import string
 import uuid
 from typing import List, Tuple
 
-from game.models.Grid import Grid, FieldTypes
+from game.models.Cell import FieldTypes, FIELD_TYPE_CODES
+from game.models.Grid import Grid
 from game.models.Player import Player
 
 
+ROCK_CODE = FIELD_TYPE_CODES[FieldTypes.ROCK]
+_FIELD_SYMBOLS = {FIELD_TYPE_CODES[FieldTypes.FIELD]: ' .  ', ROCK_CODE: ' #  '}
+_NON_ZERO = re.compile(b'[^\\x00]')
+
+
 class Movement:
     UP = "up"
     DOWN = "down"
@@ -24,27 +31,47 @@ class Game(object):
         self.seq = 0
         self.players: List[Player] = []
         self.grid: Grid = Grid(width, height, item_number)
+        # Indexes by str(player.id): the player and its (x, y) on the grid
+        self.players_by_id = {}
+        self.positions = {}
+        # Changes since the last delta, see to_delta
+        self.changed_cells = set()
+        self.changed_players = set()
+        self.roster_changed = False
 
     def add_player(self, player):
         if len(self.players) <= min(self.grid.width, self.grid.height):
             self.players.append(player)
+            self.players_by_id[str(player.id)] = player
 
             while True:
-                random_cell = self.grid.get_random_cell()
-                if not random_cell.player and not random_cell.field_type == FieldTypes.ROCK and not random_cell.item:
-                    random_cell.player = player
+                x, y = self.grid.get_random_position()
+                if self.grid.is_free(x, y):
+                    self._place_player(player, x, y)
+                    self.mark_cell_changed(x, y)
                     break
 
+            self.roster_changed = True
+            self.changed_players.add(str(player.id))
             return True
         else:
             return False
 
     def remove_player(self, player):
         self.players.remove(player)
+        self.players_by_id.pop(str(player.id), None)
+        position = self.positions.pop(str(player.id), None)
+        if position:
+            self.grid.set_player(position[0], position[1], None)
+            self.mark_cell_changed(*position)
+        self.roster_changed = True
         return True
 
+    def mark_cell_changed(self, x, y):
+        self.changed_cells.add((x, y))
+
     def get_player(self, player_id):
-        return next((player for player in self.players if str(player.id) == str(player_id)), None)
+        return self.players_by_id.get(str(player_id))
 
     def move_player(self, player: Player, movement: Movement):
         pos_x, pos_y = self.get_player_position(player)
@@ -58,44 +85,139 @@ class Game(object):
             self.set_player_position(player, pos_x, pos_y, pos_x + 1, pos_y)
 
     def set_player_position(self, player, current_x, current_y, position_x, position_y):
-        if position_x > self.grid.width - 1 or position_x < 0:
+        grid = self.grid
+        if not grid.contains(position_x, position_y):
             return False
-        if position_y > self.grid.height - 1 or position_y < 0:
-            return False
-        # Check above already ensures array size
-        cell = self.grid.cells[position_y][position_x]
 
-        if cell.field_type == FieldTypes.ROCK:
+        if grid.is_rock(position_x, position_y):
             return False
 
-        if cell.player:
+        if grid.get_player(position_x, position_y):
             return False
 
-        if cell.item:
-            player.items.append(cell.item)
-            cell.item = None
+        item = grid.take_item(position_x, position_y)
+        if item:
+            player.items.append(item)
+            self.changed_players.add(str(player.id))
 
-        current_cell = self.grid.cells[current_y][current_x]
-        current_cell.player = None
-        cell.player = player
+        grid.set_player(current_x, current_y, None)
+        self._place_player(player, position_x, position_y)
+        self.mark_cell_changed(current_x, current_y)
+        self.mark_cell_changed(position_x, position_y)
 
         return True
 
+    def set_command_seq(self, player, seq):
+        player.command_seq = seq
+        self.changed_players.add(str(player.id))
+
     def get_player_position(self, player) -> Tuple[int, int]:
-        for index_y, row in enumerate(self.grid.cells):
-            for index_x, cell in enumerate(row):
-                if cell.player and cell.player.id == player.id:
-                    return index_x, index_y
+        return self.positions.get(str(player.id))
+
+    def _place_player(self, player, x, y):
+        self.grid.set_player(x, y, player)
+        self.positions[str(player.id)] = (x, y)
+
+    def to_delta(self):
+        # Changes since the previous seq, the caller increments seq before. Clears the tracked changes
+        delta = {
+            'g': str(self.id),
+            'seq': self.seq,
+            'cells': [],
+            'players': [],
+        }
+        grid = self.grid
+        for x, y in sorted(self.changed_cells):
+            index = grid.index(x, y)
+            player = grid.get_player(x, y)
+            delta['cells'].append([x, y, grid.field_types[index], grid.items[index],
+                                   str(player.id) if player else None])
+        for player in self.players:
+            if str(player.id) in self.changed_players:
+                delta['players'].append([str(player.id), player.name, player.items, player.command_seq])
+        if self.roster_changed:
+            delta['roster'] = [str(player.id) for player in self.players]
+        self.clear_changes()
+        return json.dumps(delta)
+
+    def apply_delta(self, delta: dict):
+        # Returns False if the delta does not follow on the current seq
+        if delta.get('seq') != self.seq + 1:
+            return False
+        for player_id, name, items, *command_seq in delta.get('players'):
+            player = self.get_player(player_id)
+            if not player:
+                player = Player(id=player_id, name=name)
+                self.players.append(player)
+                self.players_by_id[str(player_id)] = player
+            player.name = name
+            player.items = items
+            if command_seq:
+                player.command_seq = command_seq[0]
+        if 'roster' in delta:
+            players = [self.get_player(player_id) for player_id in delta.get('roster')]
+            self.players = [player for player in players if player]
+            self.players_by_id = {str(player.id): player for player in self.players}
+            self.positions = {key: position for key, position in self.positions.items() if key in self.players_by_id}
+        grid = self.grid
+        for x, y, field_type, item, player_id in delta.get('cells'):
+            index = grid.index(x, y)
+            grid.field_types[index] = field_type
+            grid.items[index] = item or 0
+            previous = grid.get_player(x, y)
+            if previous and self.positions.get(str(previous.id)) == (x, y):
+                del self.positions[str(previous.id)]
+            player = self.get_player(player_id) if player_id else None
+            if player:
+                self._place_player(player, x, y)
+            else:
+                grid.set_player(x, y, None)
+        self.seq = delta.get('seq')
+        return True
+
+    def clear_changes(self):
+        self.changed_cells = set()
+        self.changed_players = set()
+        self.roster_changed = False
 
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        # Players and cells have __slots__, the fields are listed like in to_delta
+        grid = self.grid
+        return json.dumps({
+            'id': str(self.id),
+            'name': self.name,
+            'seq': self.seq,
+            'width': grid.width,
+            'height': grid.height,
+            'item_number': grid.item_number,
+            'field_types': list(grid.field_types),
+            'items': list(grid.items),
+            'players': [[str(player.id), player.name, player.items, player.command_seq,
+                         self.get_player_position(player)] for player in self.players],
+        })
 
     def to_pickle(self):
         return pickle.dumps(self)
 
     @staticmethod
     def from_json(data: str):
-        return json.loads(data, object_hook=lambda o: Game(**o))
+        data = json.loads(data)
+        game = Game(data.get('name'), data.get('width'), data.get('height'), 0)
+        game.id = uuid.UUID(data.get('id'))
+        game.seq = data.get('seq')
+        grid = game.grid
+        grid.item_number = data.get('item_number')
+        grid.field_types = bytearray(data.get('field_types'))
+        grid.items = bytearray(data.get('items'))
+        for player_id, name, items, command_seq, position in data.get('players'):
+            player = Player(id=player_id, name=name)
+            player.items = items
+            player.command_seq = command_seq
+            game.players.append(player)
+            game.players_by_id[player_id] = player
+            if position:
+                game._place_player(player, *position)
+        return game
 
     @staticmethod
     def from_pickle(data):
@@ -108,23 +230,27 @@ class Game(object):
         print(self.to_string())
 
     def to_string(self):
-        display_string = ''
+        grid = self.grid
+        rows = []
         players = ''
-        for index_y, row in enumerate(self.grid.cells):
-            for index_x, cell in enumerate(row):
-                if cell.field_type == FieldTypes.ROCK:
-                    display_string += ' #  '
-                elif cell.player:
-                    display_string += ' [] '
-                    players += cell.player.name + ":" + f"[{index_x}, {index_y}] items: {len(cell.player.items)}\n"
-                elif cell.item:
-                    display_string += ' X  '
-                else:
-                    display_string += ' .  '
-            display_string += '\n'
-        display_string += '\n'
-        display_string += players
-        return display_string
+        for index_y in range(grid.height):
+            start = index_y * grid.width
+            end = start + grid.width
+            row = list(map(_FIELD_SYMBOLS.__getitem__, grid.field_types[start:end]))
+            # Items and players are sparse, only look at the cells that have one
+            for match in _NON_ZERO.finditer(grid.items, start, end):
+                index_x = match.start() - start
+                if grid.field_types[match.start()] != ROCK_CODE:
+                    row[index_x] = ' X  '
+            occupancy = grid.occupancy[start:end]
+            if occupancy.count(0) != grid.width:
+                for index_x, slot in enumerate(occupancy):
+                    if slot and grid.field_types[start + index_x] != ROCK_CODE:
+                        player = grid.get_player(index_x, index_y)
+                        row[index_x] = ' [] '
+                        players += player.name + ":" + f"[{index_x}, {index_y}] items: {len(player.items)}\n"
+            rows.append(''.join(row) + '\n')
+        return ''.join(rows) + '\n' + players
 
     def __eq__(self, other):
         return self.id == other.id
@@ -1,7 +1,7 @@
+from array import array
 from random import randint, choice
-from typing import List
 
-from game.models.Cell import Cell, FieldTypes
+from game.models.Cell import CellView, FieldTypes, FIELD_TYPE_CODES
 
 
 # x nach rechts
@@ -9,45 +9,142 @@ from game.models.Cell import Cell, FieldTypes
 # nullpunkt unten rechts
 # d.h. im array [X][Y]
 
+_ROCK = FIELD_TYPE_CODES[FieldTypes.ROCK]
+
+
+class _Row(object):
+    def __init__(self, grid, y):
+        self.grid = grid
+        self.y = y
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.grid.width:
+            raise IndexError(x)
+        return CellView(self.grid, x, self.y)
+
+    def __len__(self):
+        return self.grid.width
+
+    def __iter__(self):
+        return (CellView(self.grid, x, self.y) for x in range(self.grid.width))
+
+
+class _Rows(object):
+    # grid.cells[y][x] like the former list of lists
+    def __init__(self, grid):
+        self.grid = grid
+
+    def __getitem__(self, y):
+        if not 0 <= y < self.grid.height:
+            raise IndexError(y)
+        return _Row(self.grid, y)
+
+    def __len__(self):
+        return self.grid.height
+
+    def __iter__(self):
+        return (_Row(self.grid, y) for y in range(self.grid.height))
+
 
 class Grid(object):
+    # Cells are stored row by row (index = y * width + x) in flat arrays: field type codes and item
+    # counts as bytearrays, occupancy as 32 bit player slots (0 = free) with the players of the slots in a list.
+    # cells gives Cell like views for code that works on single cells
     def __init__(self, width: int, height: int, item_number: int):
         self.width: int = width
         self.height: int = height
         self.item_number: int = item_number
-        self.cells: List[List[Cell]] = []
-        self._generate_grid()
+        self.field_types = bytearray(width * height)
+        self.items = bytearray(width * height)
+        self.occupancy = array('I', bytes(array('I').itemsize * width * height))
+        self._slot_players = [None]
+        self._slots = {}
         self._generate_rocks()
         self._generate_items()
 
-    def get_random_cell(self) -> Cell:
-        return self.cells[randint(0, self.height - 1)][randint(0, self.width - 1)]
+    @property
+    def cells(self):
+        return _Rows(self)
+
+    def get_random_cell(self) -> CellView:
+        x, y = self.get_random_position()
+        return CellView(self, x, y)
+
+    def get_random_position(self):
+        return randint(0, self.width - 1), randint(0, self.height - 1)
+
+    def index(self, x, y):
+        return y * self.width + x
+
+    def contains(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def is_rock(self, x, y):
+        return self.field_types[y * self.width + x] == _ROCK
+
+    def is_free(self, x, y):
+        # Neither rock, item nor player
+        index = y * self.width + x
+        return self.field_types[index] != _ROCK and not self.items[index] and not self.occupancy[index]
+
+    def get_player(self, x, y):
+        return self._slot_players[self.occupancy[y * self.width + x]]
+
+    def set_player(self, x, y, player):
+        self.occupancy[y * self.width + x] = self._slot(player) if player else 0
+
+    def take_item(self, x, y):
+        index = y * self.width + x
+        item = self.items[index]
+        self.items[index] = 0
+        return item
+
+    def find_player(self, player):
+        slot = self._slots.get(str(player.id))
+        if not slot:
+            return None
+        # Byte search is much faster than array.index, matches have to start on an element boundary
+        data = self.occupancy.tobytes()
+        pattern = array('I', [slot]).tobytes()
+        size = self.occupancy.itemsize
+        offset = data.find(pattern)
+        while offset % size:
+            if offset < 0:
+                return None
+            offset = data.find(pattern, offset + 1)
+        index = offset // size
+        return index % self.width, index // self.width
+
+    def _slot(self, player):
+        # Slots are kept per player id, the slot always points to the latest object of that player
+        key = str(player.id)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self._slot_players)
+            self._slots[key] = slot
+            self._slot_players.append(player)
+        else:
+            self._slot_players[slot] = player
+        return slot
 
     def _generate_items(self):
         item_count = 0
         while self.item_number != item_count:
-            cell = self.get_random_cell()
-            if not cell.player and not cell.field_type == FieldTypes.ROCK:
-                cell.item = 1
+            x, y = self.get_random_position()
+            index = y * self.width + x
+            if not self.occupancy[index] and not self.field_types[index] == _ROCK:
+                self.items[index] = 1
                 item_count = item_count + 1
 
-    def _generate_grid(self):
-        for y in range(self.height):
-            self.cells.append([])
-            for x in range(self.width):
-                self.cells[y].append(Cell())
-
     def _generate_rocks(self, pct=0.3):
         for i in range(int(self.height * self.width * pct) // 2):
             x = randint(1, self.width - 1)
             y = randint(1, self.height - 1)
 
-            # This check is stupid, but works
-            if x < len(self.cells) \
-                    and x + 1 < len(self.cells) \
-                    and x - 1 < len(self.cells) \
-                    and y < len(self.cells[x]) \
-                    and y + 1 < len(self.cells[x]) \
-                    and y - 1 < len(self.cells[x]):
-                self.cells[y][x].field_type = FieldTypes.ROCK
-                self.cells[y + choice([-1, 0, 1])][x + choice([-1, 0, 1])].field_type = FieldTypes.ROCK
+            # Same bounds as the former check on the nested lists (x against the rows, y against a row)
+            if x + 1 < self.height and y + 1 < self.width:
+                self.field_types[y * self.width + x] = _ROCK
+                neighbour_y = y + choice([-1, 0, 1])
+                neighbour_x = x + choice([-1, 0, 1])
+                if self.contains(neighbour_x, neighbour_y):
+                    self.field_types[neighbour_y * self.width + neighbour_x] = _ROCK
@@ -2,11 +2,12 @@ import string
 
 
 class Player(object):
-    id = None
-    name = None
+    __slots__ = ('id', 'name', 'items', 'command_seq')
 
     def __init__(self, id, name: string):
         self.id = id
         self.name = name
         self.items = []
+        # Sequence number of the last command of the player the game contains
+        self.command_seq = 0
 
@@ -0,0 +1,19 @@
+from config import GAME_GROUP_HISTORY_MAX_BYTES
+from models.Group import Group
+from models.MessageHistory import MessageHistory
+from services.SocketService import SocketService
+from util.address_helper import get_game_multicast_address
+
+
+class GameGroup(Group):
+    # Updates of one game on their own multicast address: all servers keep a copy of the game,
+    # clients are members while they play it
+    def __init__(self, game_id, socket_service: SocketService):
+        super().__init__(f"GAME/{game_id}", socket_service, get_game_multicast_address(game_id))
+        self.game_id = str(game_id)
+        # Clients only listen, so entries rarely become stable; keep the history small
+        self.rel_message_history = MessageHistory(GAME_GROUP_HISTORY_MAX_BYTES)
+
+    def set_members(self, game, all_host_group):
+        players = [all_host_group.get_host(player.id) for player in game.players]
+        self.participants = list(all_host_group.server_ring.nodes) + [host for host in players if host]
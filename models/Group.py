@@ -1,37 +1,56 @@
 import json
-from typing import List
 
+from config import HISTORY_PRUNE_INTERVAL, SERVER_GROUP_BASE_MULTICAST_ADDRESS, SERVER_GROUP_MULTICAST_PORT, TOTAL_ORDER
+from models.HoldBackQueue import HoldBackQueue
 from models.Host import Host
+from models.MessageHistory import MessageHistory
 from models.Sequencer import Sequencer
 from services.SocketService import SocketService
 
 
 class Group:
-    def __init__(self, identifier, socket_service: SocketService):
+    def __init__(self, identifier, socket_service: SocketService, address: str = SERVER_GROUP_BASE_MULTICAST_ADDRESS,
+                 port: int = SERVER_GROUP_MULTICAST_PORT, ordering: str = TOTAL_ORDER):
         self.sequencer = Sequencer()
         self.identifier = identifier
+        self.address = address
+        self.port = port
         self.socket_service = socket_service
         self.participants = []
 
         self.group_last_message_delivered_seq = None
-        self.hold_back_queue = []
-        self.message_history = {}
+        # (seq, process id) of the last message delivered in ISIS order, numbers alone may repeat
+        self.last_delivered_order = None
+        self.hold_back_queue = HoldBackQueue()
+        self.message_history = MessageHistory()
         self.suggested_sequence_number = 0
+        # "isis" or "sequencer", see SocketService.set_sequencer
+        self.ordering = ordering
+        self.sequencer_id = None
+        self.is_sequencer = False
+        # Members whose answer a new sequencer still waits for, None outside of a handover
+        self.sequencer_handover = None
+        self.sequencer_handover_timer = None
+        # Numbers announced before their message arrived: message id -> (seq, process id, rel id)
+        self.early_orders = {}
 
         #New
         self.rel_seq = 0  # S
         self.rel_delivered_seq = {}  # R
+        # Per sender the last rel_seq taken as sent before we joined, those messages were skipped
+        self.rel_joined_seq = {}
         # TODO: remove?
         self.rel_hold_back_queue = {}
-        self.rel_message_history = {}
+        self.rel_message_history = MessageHistory()
         self.group_sent_messages = {}
+        # Last rel_delivered_seq reported by each member
+        self.rel_acknowledgements = {}
+        self._acknowledgements_since_prune = 0
+        # Highest seq per sender seen while messages were held back, requested once REL_NACK_DELAY passed
+        self.rel_nack_acknowledgements = {}
+        self.rel_nack_timer = None
 
     def on_multicast_received(self, host, method: str, message, header):
-        if method == "MAIN_GROUP/HOSTS":
-            if 'resent' not in header:
-                hosts = json.loads(message)
-                list_of_hosts = [Host.from_json(h) for h in hosts]
-                self.set_host_list(list_of_hosts)
         if method == "MAIN_GROUP/GET_HOSTS":
             self.socket_service.send_group_multicast(
                 self,
@@ -39,15 +58,39 @@ class Group:
                 json.dumps([ob.to_json() for ob in self.participants]),
             )
 
-    def set_host_list(self, hosts: List[Host]):
-        self.participants = hosts
+    def record_acknowledgements(self, member_id, delivered_seq: dict):
+        acknowledgements = self.rel_acknowledgements.setdefault(member_id, {})
+        for sender_id, seq in delivered_seq.items():
+            if seq > acknowledgements.get(sender_id, -1):
+                acknowledgements[sender_id] = seq
+        self._acknowledgements_since_prune = self._acknowledgements_since_prune + 1
+        if self._acknowledgements_since_prune >= HISTORY_PRUNE_INTERVAL:
+            self.prune_stable_history()
 
-    def announce_participants(self):
-        self.socket_service.send_group_multicast(
-            self,
-            f"MAIN_GROUP/HOSTS",
-            json.dumps([ob.to_json() for ob in self.participants])
-        )
+    def get_stable_seq(self, sender_id):
+        # Highest reliable sequence number of sender_id every member has delivered
+        stable_seq = self.rel_delivered_seq.get(sender_id, -1)
+        for participant in self.participants:
+            if participant.id == self.socket_service.own_host.id:
+                continue
+            acknowledgements = self.rel_acknowledgements.get(participant.id)
+            if acknowledgements is None or sender_id not in acknowledgements:
+                return -1
+            stable_seq = min(stable_seq, acknowledgements[sender_id])
+        return stable_seq
+
+    def is_stable(self, rel_id):
+        sender_id, seq = rel_id
+        return seq is not None and int(seq) <= self.get_stable_seq(sender_id)
+
+    def prune_stable_history(self):
+        self._acknowledgements_since_prune = 0
+        stable = {sender_id: self.get_stable_seq(sender_id) for sender_id in self.rel_message_history.streams()}
+        for sender_id, stable_seq in stable.items():
+            self.rel_message_history.prune(sender_id, lambda seq, item: seq <= stable_seq)
+        # A totally ordered message is stable once its data message and its announcement are
+        self.message_history.prune(None, lambda seq, entries: all(
+            self.is_stable(rel_id) for entry in entries for rel_id in entry.rel_ids))
 
     def add_participant(self, host: Host):
         if host not in self.participants:
@@ -0,0 +1,40 @@
+import hashlib
+from bisect import bisect
+from typing import List
+
+from config import GAME_HASH_VIRTUAL_NODES
+from models.Host import Host
+
+
+def _hash(key: str):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    # Consistent hashing of keys (game names) onto servers. Every server gets GAME_HASH_VIRTUAL_NODES points
+    # on the ring, a key belongs to the server of the first point after its hash. When a server joins or
+    # leaves only the keys next to its points move, everything else keeps its owner
+    def __init__(self, virtual_nodes: int = GAME_HASH_VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.nodes = []
+        self._points = []
+        self._owners = []
+
+    def set_nodes(self, nodes: List[Host]):
+        self.nodes = sorted(nodes, key=lambda node: node.id)
+        points = sorted((_hash(f"{node.id}#{i}"), node.id, node)
+                        for node in self.nodes for i in range(self.virtual_nodes))
+        self._points = [point for point, _, _ in points]
+        self._owners = [node for _, _, node in points]
+
+    def get_owner(self, key: str):
+        if not self._points:
+            return None
+        index = bisect(self._points, _hash(key))
+        if index == len(self._points):
+            index = 0
+        return self._owners[index]
+
+    def is_owner(self, node: Host, key: str):
+        owner = self.get_owner(key)
+        return owner is not None and owner.id == node.id
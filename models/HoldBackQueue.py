@@ -0,0 +1,148 @@
+import heapq
+import itertools
+
+
+class DeliveryState:
+    DELIVERABLE = "deliverable"
+    UNDELIVERABLE = "undeliverable"
+
+
+class HoldBackEntry:
+    # A message waiting for its agreed sequence number, kept in the history once delivered. The header is the
+    # decoded one of the datagram, shared with the reliable layer entry and not copied
+    __slots__ = ('host', 'header', 'message_id', 'method', 'message', 'resent', 'max_suggested_seq',
+                 'max_suggested_process_id', 'state', 'suggested_numbers', 'rel_ids')
+
+    def __init__(self, host, header, method, message, max_suggested_seq, max_suggested_process_id, state,
+                 resent=False):
+        self.host = host
+        self.header = header
+        self.message_id = header.get('m_id')
+        self.method = method
+        self.message = message
+        self.resent = resent
+        self.max_suggested_seq = max_suggested_seq
+        self.max_suggested_process_id = max_suggested_process_id
+        self.state = state
+        # Proposals by process id, only used by the sender
+        self.suggested_numbers = None
+        # (sender id, rel_seq) of the data message and the announcement, see Group.prune_stable_history
+        self.rel_ids = ()
+
+
+class RelHoldBackEntry:
+    # A message of the reliable layer waiting for the ones its sender sent before, kept in the history once
+    # delivered
+    __slots__ = ('seq', 'host', 'header', 'message')
+
+    def __init__(self, seq, host, header, message):
+        self.seq = seq
+        self.host = host
+        self.header = header
+        self.message = message
+
+
+class HoldBackQueue:
+    # Hold-back queue for ISIS total ordering.
+    # Every entry lives in a heap keyed by (seq, state, process id): the agreed number once it is deliverable,
+    # before that the own proposal, which the agreed number can only exceed. Undeliverable entries rank before
+    # deliverable ones with the same number. Entries that change their key are pushed again and the outdated
+    # heap node is skipped when it reaches the top. Deliverable entries are indexed by their number as well.
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._by_id = {}
+        self._heap_node = {}
+        self._deliverable_by_seq = {}
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(list(self._entries.values()))
+
+    def add(self, entry):
+        self._entries[id(entry)] = entry
+        if entry.message_id is not None:
+            self._by_id.setdefault(entry.message_id, entry)
+        self._push(entry)
+        return entry
+
+    def remove(self, entry):
+        if self._entries.pop(id(entry), None) is None:
+            return
+        if self._by_id.get(entry.message_id) is entry:
+            del self._by_id[entry.message_id]
+        self._unlink(entry)
+
+    def get_by_id(self, message_id):
+        return self._by_id.get(message_id)
+
+    def get_deliverable(self, seq):
+        entries = self._deliverable_by_seq.get(seq)
+        if entries:
+            return next(iter(entries.values()))
+        return None
+
+    def finalize(self, entry, seq, process_id):
+        self._unlink(entry)
+        entry.max_suggested_seq = seq
+        entry.max_suggested_process_id = process_id
+        entry.state = DeliveryState.DELIVERABLE
+        if id(entry) in self._entries:
+            self._push(entry)
+
+    def pop_next(self):
+        # Returns the entry with the smallest (seq, process id) if it is deliverable. No message can be ordered
+        # before it anymore: the undeliverable ones rank by a lower bound of their agreed number
+        while self._heap:
+            _, _, _, node, entry = self._heap[0]
+            if self._heap_node.get(id(entry)) != node:
+                heapq.heappop(self._heap)
+                continue
+            if entry.state != DeliveryState.DELIVERABLE:
+                return None
+            heapq.heappop(self._heap)
+            self.remove(entry)
+            return entry
+        return None
+
+    def pop_seq(self, seq):
+        # Returns the deliverable entry with number seq, for orders without gaps (sequencer)
+        entry = self.get_deliverable(seq)
+        if entry:
+            self.remove(entry)
+        return entry
+
+    def drop_until(self, seq):
+        # Removes the deliverable entries up to seq, e.g. covered by a state transfer
+        for entry in self:
+            if entry.state == DeliveryState.DELIVERABLE and entry.max_suggested_seq <= seq:
+                self.remove(entry)
+
+    def _push(self, entry):
+        node = next(self._counter)
+        seq = int(entry.max_suggested_seq)
+        process_id = entry.max_suggested_process_id
+        self._heap_node[id(entry)] = node
+        deliverable = entry.state == DeliveryState.DELIVERABLE
+        if deliverable:
+            self._deliverable_by_seq.setdefault(seq, {})[node] = entry
+        heapq.heappush(self._heap, (seq, 1 if deliverable else 0, '' if process_id is None else str(process_id),
+                                    node, entry))
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            # Outdated nodes pile up when entries leave by number (pop_seq) instead of from the top
+            self._heap = [item for item in self._heap if self._heap_node.get(id(item[4])) == item[3]]
+            heapq.heapify(self._heap)
+
+    def _unlink(self, entry):
+        node = self._heap_node.pop(id(entry), None)
+        if node is None:
+            return
+        seq = int(entry.max_suggested_seq)
+        entries = self._deliverable_by_seq.get(seq)
+        if entries is not None:
+            entries.pop(node, None)
+            if not entries:
+                del self._deliverable_by_seq[seq]
@@ -7,16 +7,13 @@ class HostType:
 
 
 class Host(object):
+    __slots__ = ('id', 'address', 'unicast_port', 'host_type')
 
     def __init__(self, id: str, address: str, unicast_port: int, host_type: HostType = HostType.SERVER):
         self.id = id
         self.address = address
         self.unicast_port = unicast_port
         self.host_type = host_type
-        self.message_history = {}
-        self.message_seq = 0
-        self.last_message_seq = 0
-        self.open_ack = False
 
     def to_json(self):
         test = {
@@ -32,4 +29,7 @@ class Host(object):
         return json.loads(data, object_hook=lambda o: Host(**o))
 
     def __eq__(self, other):
-        return self.id == other.id
+        return isinstance(other, Host) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
@@ -0,0 +1,50 @@
+from models.Host import Host
+from transport.PeerChannel import PeerChannel
+
+
+class HostRegistry:
+    # One Host object per id for a SocketService and everything using it. Hosts taken from datagrams or
+    # payloads are interned: the known object is returned with address and port updated in place, so groups,
+    # rings and callbacks share it. The reliable unicast state (PeerChannel: sequence numbers, RTT, loss) of a
+    # peer lives here as well, next to its host
+    def __init__(self, own_host: Host):
+        self.own_host = own_host
+        self.hosts = {own_host.id: own_host}
+        self.channels = {}
+        self.epoch = 0
+
+    def get(self, host_id):
+        return self.hosts.get(host_id)
+
+    def intern(self, host_id, address, unicast_port, host_type=None):
+        host = self.hosts.get(host_id)
+        if not host:
+            host = self.hosts[host_id] = Host(host_id, address, unicast_port, host_type)
+        elif host is not self.own_host:
+            # A restarted peer may come back with the same id on another address
+            if host.address != address or host.unicast_port != unicast_port:
+                host.address = address
+                host.unicast_port = unicast_port
+            if host_type and host.host_type != host_type:
+                host.host_type = host_type
+        return host
+
+    def intern_host(self, host: Host):
+        return self.intern(host.id, host.address, host.unicast_port, host.host_type)
+
+    def get_channel(self, host_id):
+        channel = self.channels.get(host_id)
+        if not channel:
+            channel = self.channels[host_id] = PeerChannel(self.next_epoch())
+        return channel
+
+    def find_channel(self, host_id):
+        return self.channels.get(host_id)
+
+    def next_epoch(self):
+        self.epoch = self.epoch + 1
+        return self.epoch
+
+    def get_stats(self, host_id):
+        channel = self.channels.get(host_id)
+        return channel.stats() if channel else None
@@ -0,0 +1,102 @@
+from collections import deque
+from typing import List
+
+from config import VIEW_SYNC_DELTAS
+from models.Host import Host
+from util.EventEmitter import EventEmitter
+
+
+class MembershipView:
+    # Known hosts with one view number, every delta increases it by one. A delta names the view it was made at
+    # (base), deltas arrive in total order. A base below our view means the delta is late (made concurrently with
+    # the delta before it, or replayed): it is ignored, on_late gets its changes that no later delta touched so
+    # its sender can announce them again. A base above our view means we missed deltas, they and the following
+    # deltas wait until set_view brings the whole view. Local joins and leaves (direct contact, failure detection)
+    # do not change the number, a delta made at the same view does not undo them. Listeners of on_joined/on_left
+    # get every actual change once
+    def __init__(self):
+        self.version = 0
+        self.hosts = {}
+        # Host id -> base of its last change, kept after a leave so a concurrent join stays ignored
+        self.versions = {}
+        # Host id -> view number of the last delta that named it
+        self.delta_versions = {}
+        # Ids of the last applied deltas, set_view skips the waiting ones the other view already contains
+        self.applied = deque(maxlen=VIEW_SYNC_DELTAS)
+        # Deltas waiting for set_view, None while the view is complete
+        self.pending = None
+        self.on_joined = EventEmitter()
+        self.on_left = EventEmitter()
+        self.on_late = EventEmitter()
+
+    def get_hosts(self):
+        return list(self.hosts.values())
+
+    def apply(self, delta_id, base: int, joined: List[Host] = (), left: List[str] = ()):
+        # Returns False if the delta has to wait for set_view
+        if self.pending is not None or base > self.version:
+            if self.pending is None:
+                self.pending = []
+            self.pending.append((delta_id, base, joined, left))
+            return False
+        self._apply(delta_id, base, joined, left)
+        return True
+
+    def wait_for_view(self):
+        # A joining member takes over the view of another one, deltas wait until then
+        if self.pending is None:
+            self.pending = []
+
+    def set_view(self, version: int, hosts: List[Host], applied_ids: List[str]):
+        # Whole view of another member, taken over if we wait for it and it is newer than ours
+        if self.pending is None:
+            return
+        pending, self.pending = self.pending, None
+        if version > self.version:
+            hosts = {host.id: host for host in hosts}
+            self.version = version
+            self.applied.clear()
+            self.applied.extend(applied_ids)
+            self._change(version, [host for host in hosts.values() if host.id not in self.hosts],
+                         [host_id for host_id in self.hosts if host_id not in hosts], force=True)
+        for delta_id, base, joined, left in pending:
+            if delta_id not in self.applied:
+                self._apply(delta_id, base, joined, left)
+
+    def join(self, host: Host):
+        # A host we talked to directly, the delta announcing it may follow
+        self._change(self.version, joined=[host])
+
+    def leave(self, host: Host):
+        self._change(self.version, left=[host.id])
+
+    def _apply(self, delta_id, base, joined, left):
+        if base < self.version:
+            self.on_late.emit(delta_id, [host for host in joined if self.delta_versions.get(host.id, 0) <= base],
+                              [host_id for host_id in left if self.delta_versions.get(host_id, 0) <= base])
+            return
+        self.version = self.version + 1
+        self.applied.append(delta_id)
+        for host_id in [host.id for host in joined] + list(left):
+            self.delta_versions[host_id] = self.version
+        self._change(base, joined, left)
+
+    def _change(self, base, joined=(), left=(), force=False):
+        changed_joined = []
+        changed_left = []
+        for host_id in left:
+            if force or base >= self.versions.get(host_id, -1):
+                self.versions[host_id] = base
+                host = self.hosts.pop(host_id, None)
+                if host:
+                    changed_left.append(host)
+        for host in joined:
+            if force or base > self.versions.get(host.id, -1):
+                self.versions[host.id] = base
+                if host.id not in self.hosts:
+                    self.hosts[host.id] = host
+                    changed_joined.append(host)
+        for host in changed_left:
+            self.on_left.emit(host)
+        for host in changed_joined:
+            self.on_joined.emit(host)
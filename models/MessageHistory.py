@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+from config import HISTORY_MAX_BYTES
+
+# Rough per entry cost of the hold-back entry and its header besides the payload itself
+ENTRY_OVERHEAD = 512
+
+
+def _entry_size(item):
+    if isinstance(item, list):
+        return sum(_entry_size(entry) for entry in item)
+    message = getattr(item, 'message', None)
+    return ENTRY_OVERHEAD + (len(message) if isinstance(message, (str, bytes)) else 0)
+
+
+class MessageHistory:
+    # Delivered messages kept to answer NACKs, grouped in streams (one per sender for the
+    # reliable layer, a single one for the total order). Entries are removed once they are
+    # stable and the oldest ones are evicted when max_bytes is exceeded.
+    def __init__(self, max_bytes: int = HISTORY_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._streams = {}
+        self._order = OrderedDict()
+        self._dropped = {}
+
+    def __len__(self):
+        return len(self._order)
+
+    def put(self, stream, seq, item):
+        entries = self._streams.setdefault(stream, OrderedDict())
+        if seq in entries:
+            # Replaced, not dropped
+            self.size = self.size - self._order.pop((stream, seq))
+        size = _entry_size(item)
+        entries[seq] = item
+        self._order[(stream, seq)] = size
+        self.size = self.size + size
+        while self.size > self.max_bytes and len(self._order) > 1:
+            (oldest_stream, oldest_seq), _ = next(iter(self._order.items()))
+            self._discard(oldest_stream, oldest_seq)
+
+    def get(self, stream, seq):
+        entries = self._streams.get(stream)
+        return entries.get(seq) if entries else None
+
+    def was_dropped(self, stream, seq):
+        return self.get(stream, seq) is None and seq <= self._dropped.get(stream, -1)
+
+    def knows(self, stream, seq):
+        return self.get(stream, seq) is not None or self.was_dropped(stream, seq)
+
+    def get_dropped_seq(self, stream):
+        return self._dropped.get(stream, -1)
+
+    def streams(self):
+        return list(self._streams.keys())
+
+    def prune(self, stream, is_stable):
+        # Streams are filled in delivery order, so pruning stops at the first unstable entry
+        entries = self._streams.get(stream)
+        while entries:
+            seq, item = next(iter(entries.items()))
+            if not is_stable(seq, item):
+                break
+            self._discard(stream, seq)
+            entries = self._streams.get(stream)
+
+    def _discard(self, stream, seq):
+        entries = self._streams[stream]
+        del entries[seq]
+        if not entries:
+            del self._streams[stream]
+        self.size = self.size - self._order.pop((stream, seq))
+        self._dropped[stream] = max(self._dropped.get(stream, -1), seq)
@@ -0,0 +1,54 @@
+import math
+from collections import deque
+
+from config import HEARTBEAT_INTERVAL, HEARTBEAT_PHI_WINDOW, HEARTBEAT_MIN_STD, HEARTBEAT_ACCEPTABLE_PAUSE
+
+
+class PhiAccrualDetector:
+    # Phi accrual failure detector (Hayashibara et al.) for one peer. Learns the distribution of the gaps between
+    # messages of the peer from local arrival times and gives phi = -log10(P(gap at least this long)), i.e. a
+    # phi of 8 means the current silence happens once in 10^8 times for a living peer.
+    # Gaps below min_interval (bursts of data traffic) update the last arrival but are not sampled, the window
+    # keeps describing the silences the sender guarantees to break with a heartbeat
+    def __init__(self, now: float, interval: float = HEARTBEAT_INTERVAL, window: int = HEARTBEAT_PHI_WINDOW,
+                 min_std: float = HEARTBEAT_MIN_STD, acceptable_pause: float = HEARTBEAT_ACCEPTABLE_PAUSE):
+        self.min_interval = interval / 2
+        self.min_std = min_std
+        self.acceptable_pause = acceptable_pause
+        # Starts as if the peer sent every interval with a deviation of a quarter interval
+        self.intervals = deque([interval - interval / 4, interval + interval / 4], maxlen=window)
+        self._sum = sum(self.intervals)
+        self._squares = sum(value * value for value in self.intervals)
+        self.last_arrival = now
+
+    def heartbeat(self, now: float):
+        interval = now - self.last_arrival
+        if interval >= self.min_interval:
+            if len(self.intervals) == self.intervals.maxlen:
+                oldest = self.intervals[0]
+                self._sum = self._sum - oldest
+                self._squares = self._squares - oldest * oldest
+            self.intervals.append(interval)
+            self._sum = self._sum + interval
+            self._squares = self._squares + interval * interval
+        if now > self.last_arrival:
+            self.last_arrival = now
+
+    def mean(self):
+        return self._sum / len(self.intervals)
+
+    def std(self):
+        mean = self.mean()
+        variance = max(self._squares / len(self.intervals) - mean * mean, 0)
+        return max(math.sqrt(variance), self.min_std)
+
+    def phi(self, now: float):
+        elapsed = now - self.last_arrival
+        mean = self.mean() + self.acceptable_pause
+        # Logistic approximation of the normal distribution, see Akka's PhiAccrualFailureDetector
+        # Beyond +-10 deviations phi is ~0 or ~38, clamped so exp and log stay finite
+        y = min(max((elapsed - mean) / self.std(), -10), 10)
+        e = math.exp(-y * (1.5976 + 0.070566 * y * y))
+        if elapsed > mean:
+            return -math.log10(e / (1 + e))
+        return -math.log10(1 - 1 / (1 + e))
@@ -1,63 +1,80 @@
+import bisect
 from typing import List
 
 from models.Host import Host
+from util.EventEmitter import EventEmitter
 
 
 class Ring:
+    # Hosts sorted by id. Adding or removing a host finds its position with a binary search (O(log n)), the list
+    # insert/delete keeps the update O(n). Our own neighbours are worked out on every change so the lookups are
+    # O(1). on_left_neighbour_changed and on_right_neighbour_changed get the new neighbour (our own host when we
+    # are alone)
     def __init__(self, own_node: Host):
         self.own_node = own_node
         self.nodes = []
+        # Sorted like nodes, searched with bisect
+        self.ids = []
+        self.by_id = {}
+        self.left_neighbour = own_node
+        self.right_neighbour = own_node
+        self.on_left_neighbour_changed = EventEmitter()
+        self.on_right_neighbour_changed = EventEmitter()
 
     def get_node(self, id):
-        if id in [node.id for node in self.nodes]:
-            return next((node for node in self.nodes if node.id == id), None)
-        else:
+        node = self.by_id.get(id)
+        if not node:
             print("[Ring] Cannot find node")
+        return node
 
     def add_node(self, node: Host):
-        if node not in self.nodes:
-            self.nodes.append(node)
-            self._form_ring()
-        else:
+        if node.id in self.by_id:
             print("[Ring]: Tried to add existing node")
+            return
+        position = bisect.bisect_left(self.ids, node.id)
+        self.ids.insert(position, node.id)
+        self.nodes.insert(position, node)
+        self.by_id[node.id] = node
+        self._update_neighbours()
 
     def set_nodes(self, nodes: List[Host]):
-        self.nodes = nodes
+        self.nodes = sorted(nodes, key=_get_id)
+        self.ids = [node.id for node in self.nodes]
+        self.by_id = {node.id: node for node in self.nodes}
+        self._update_neighbours()
 
     def remove_node(self, node: Host):
-        if node in self.nodes:
-            self.nodes.remove(node)
-            self._form_ring()
-        else:
+        if node.id not in self.by_id:
             print("[Ring]: Cannot remove node, as its non-existent")
+            return
+        position = bisect.bisect_left(self.ids, node.id)
+        del self.ids[position]
+        del self.nodes[position]
+        del self.by_id[node.id]
+        self._update_neighbours()
 
     def get_right_neighbour(self):
-        return self._get_neighbour(reverse=True)
+        return self.right_neighbour
 
     def get_left_neighbour(self):
-        return self._get_neighbour()
+        return self.left_neighbour
 
-    def _form_ring(self):
-        self.nodes = sorted(self.nodes, key=_get_id)
+    def _update_neighbours(self):
+        left, right = self._find_neighbours()
+        left_changed = left.id != self.left_neighbour.id
+        right_changed = right.id != self.right_neighbour.id
+        self.left_neighbour = left
+        self.right_neighbour = right
+        if left_changed:
+            self.on_left_neighbour_changed.emit(left)
+        if right_changed:
+            self.on_right_neighbour_changed.emit(right)
 
-    def _get_neighbour(self, reverse=False):
-        if self.own_node not in self.nodes:
-            return self.own_node
-        pos = self.nodes.index(self.own_node)
-
-        if len(self.nodes) == 1:
-            return self.own_node
-
-        if reverse:
-            if pos == 0:
-                return self.nodes[len(self.nodes) - 1]
-            else:
-                return self.nodes[pos - 1]
-        else:
-            if pos + 1 == len(self.nodes):
-                return self.nodes[0]
-            else:
-                return self.nodes[pos + 1]
+    def _find_neighbours(self):
+        if self.own_node.id not in self.by_id or len(self.nodes) == 1:
+            return self.own_node, self.own_node
+        position = bisect.bisect_left(self.ids, self.own_node.id)
+        return self.nodes[(position + 1) % len(self.nodes)], self.nodes[position - 1]
 
 
 def _get_id(node: Host):
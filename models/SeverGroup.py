@@ -1,9 +1,11 @@
 import json
 from typing import List
 
+from config import TOTAL_ORDER
 from models.Group import Group
+from models.HashRing import HashRing
 from models.Host import Host, HostType
-from models.Ring import Ring
+from models.MembershipView import MembershipView
 from services.SocketService import SocketService
 
 
@@ -14,33 +16,97 @@ class KnownHostGroup(Group):
             ring,
             server_ring,
             socket_service: SocketService,
+            ordering: str = TOTAL_ORDER,
     ):
-        super().__init__("MAIN_GROUP", socket_service)
+        super().__init__("MAIN_GROUP", socket_service, ordering=ordering)
         self.server_ring = server_ring
         self.own_node = own_node
         self.ring = ring
+        # Owner servers of the games, follows server_ring
+        self.game_ring = HashRing()
+        self.game_ring.set_nodes(self.server_ring.nodes)
+        # Participants and rings follow the view, other consumers subscribe to it as well
+        self.view = MembershipView()
+        self.view.on_joined.subscribe("group", self._on_host_joined)
+        self.view.on_left.subscribe("group", self._on_host_left)
+        self.view.on_late.subscribe("group", self._on_late_delta)
+        # Ids of the deltas we announced that did not come back yet
+        self.announced = set()
+
+    def get_game_owner(self, game_name: str):
+        return self.game_ring.get_owner(game_name)
+
+    def owns_game(self, game_name: str):
+        return self.game_ring.is_owner(self.own_node, game_name)
 
     def add_participant(self, host: Host):
+        self.view.join(host)
+
+    def remove_participant(self, host: Host):
+        self.view.leave(host)
+
+    def announce_changes(self, joined: List[Host] = (), left: List[Host] = ()):
+        self._announce(joined, [host.id for host in left])
+
+    def _announce(self, joined: List[Host], left: List[str]):
+        # The delta takes effect when it comes back in total order, on every member the same way
+        base = self.view.version
+        header = self.socket_service.send_group_multicast(self, "MAIN_GROUP/VIEW", json.dumps({
+            'b': base,
+            'v': base + 1,
+            'j': [host.to_json() for host in joined],
+            'l': list(left),
+        }))
+        self.announced.add(header['m_id'])
+
+    def sync_view(self, host: Host):
+        self.view.wait_for_view()
+        self.socket_service.send_unicast(host, "MAIN_GROUP/GET_VIEW", "")
+
+    def on_multicast_received(self, host, method: str, message, header):
+        if method == "MAIN_GROUP/VIEW":
+            delta = json.loads(message)
+            joined = [self.socket_service.hosts.intern_host(Host.from_json(h)) for h in delta.get('j')]
+            if self.view.apply(header.get('m_id'), delta.get('b'), joined, delta.get('l')):
+                self.announced.discard(header.get('m_id'))
+            elif len(self.view.pending) == 1:
+                # We missed deltas (joined later or they were evicted), the sender sends its whole view
+                self.sync_view(host)
+        if method == "MAIN_GROUP/GET_HOSTS":
+            super(KnownHostGroup, self).on_multicast_received(host, method, message, header)
+
+    def on_unicast_received(self, host, method: str, message):
+        if method == "MAIN_GROUP/GET_VIEW":
+            self.socket_service.send_unicast(host, "MAIN_GROUP/VIEW_STATE", json.dumps({
+                'v': self.view.version,
+                'h': [h.to_json() for h in self.view.get_hosts()],
+                'd': list(self.view.applied),
+            }))
+        elif method == "MAIN_GROUP/VIEW_STATE":
+            state = json.loads(message)
+            hosts = [self.socket_service.hosts.intern_host(Host.from_json(h)) for h in state.get('h')]
+            self.view.set_view(state.get('v'), hosts, state.get('d'))
+
+    def _on_late_delta(self, delta_id, joined: List[Host], left: List[str]):
+        # Our delta was made at an older view, the changes no later delta touched are announced on the current one
+        if delta_id in self.announced:
+            self.announced.discard(delta_id)
+            if joined or left:
+                self._announce(joined, left)
+
+    def _on_host_joined(self, host: Host):
         super(KnownHostGroup, self).add_participant(host)
         self.ring.add_node(host)
         if host.host_type == HostType.SERVER:
             self.server_ring.add_node(host)
+            self.game_ring.set_nodes(self.server_ring.nodes)
 
-    def remove_participant(self, host: Host):
+    def _on_host_left(self, host: Host):
         super(KnownHostGroup, self).remove_participant(host)
         self.ring.remove_node(host)
         if host.host_type == HostType.SERVER:
             self.server_ring.remove_node(host)
-
-    def set_host_list(self, hosts: List[Host]):
-        if self.own_node not in hosts:
-            hosts.append(self.own_node)
-
-        super(KnownHostGroup, self).set_host_list(hosts)
-        servers = [host for host in hosts if host.host_type == HostType.SERVER]
-        clients = [host for host in hosts if host.host_type == HostType.CLIENT]
-        self.ring.set_nodes(hosts)
-        self.server_ring.set_nodes(servers)
+            self.game_ring.set_nodes(self.server_ring.nodes)
 
     def to_json(self):
         return json.dumps([ob.to_json() for ob in self.participants])
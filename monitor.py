@@ -7,10 +7,10 @@ from types import SimpleNamespace
 import select
 import os
 
-from config import SERVER_GROUP_BASE_MULTICAST_ADDRESS, SERVER_GROUP_MULTICAST_PORT, BUFFER_SIZE, PAYLOAD_DELIMITER, \
-    HEADER_DELIMITER
+from config import SERVER_GROUP_BASE_MULTICAST_ADDRESS, SERVER_GROUP_MULTICAST_PORT, BUFFER_SIZE, PAYLOAD_DELIMITER
 from models.Host import Host
 from sockets.MulticastSocket import MulticastSocket
+from transport.codec_helper import decode_message
 from util.terminal_helper import cls
 
 
@@ -48,17 +48,13 @@ if __name__ == "__main__":
             try:
                 data, address = receiver.recvfrom(BUFFER_SIZE)
 
-                encoded_data = data.decode('utf-8')
                 hostname = address[0]
                 port = address[1]
-                chunks = encoded_data.split(HEADER_DELIMITER)
-                header = json.loads(chunks[0])
+                header, message = decode_message(data)
+                encoded_data = f"{header} {message if isinstance(message, str) else ''}"
                 method = header.get('m')
-                message = ''
-                if len(chunks) > 1:
-                    message = chunks[1]
-                message_chunks = message.split(PAYLOAD_DELIMITER)
                 if method == "LCR/LEADER_CHANGED":
+                    message_chunks = message.split(PAYLOAD_DELIMITER)
                     leader_id = message_chunks[0]
                     render()
                 elif method == "MAIN_GROUP/HOSTS":
@@ -67,6 +63,12 @@ if __name__ == "__main__":
                         hosts = json.loads(message)
                         hosts = [Host.from_json(h) for h in hosts]
                         render()
+                elif method == "MAIN_GROUP/VIEW":
+                    delta = json.loads(message)
+                    joined = [Host.from_json(h) for h in delta.get('j')]
+                    left = set(delta.get('l')) | {host.id for host in joined}
+                    hosts = [host for host in hosts if host.id not in left] + joined
+                    render()
             except Exception as e:
                 print("Exception", e)
                 traceback.print_exc()
@@ -1,22 +1,25 @@
-import time
-import uuid
 import json
 
+from models.GameGroup import GameGroup
 from models.Ring import Ring
 from models.SeverGroup import KnownHostGroup
 from services.DiscoveryService import DiscoveryService
 from services.GameService import GameService
 from services.HeartbeatService import HeartbeatService
-from services.SocketService import SocketService
-from config import MAX_BROADCAST_RETRIES
-from election.LCRElection import LCRElection
+from services.MembershipService import MembershipService
+from services.socket_service_helper import create_socket_service
+from config import MAX_BROADCAST_RETRIES, MEMBERSHIP, ELECTION_TIMEOUT, ELECTION_ALGORITHM, TOTAL_ORDER
+from election.election_factory import create_election
 from models.Host import Host, HostType
-from util.address_helper import get_local_address, get_random_unicast_port
+from transport.UdpTransport import UdpTransport
 
 
 class Server:
-    def __init__(self):
-        self.own_host = Host(str(uuid.uuid1()), get_local_address(), get_random_unicast_port(), HostType.SERVER)
+    def __init__(self, transport=None, membership: str = MEMBERSHIP, election: str = ELECTION_ALGORITHM,
+                 ordering: str = TOTAL_ORDER):
+        self.transport = transport or UdpTransport()
+        self.own_host = Host(self.transport.new_id(), self.transport.get_local_address(),
+                             self.transport.get_unicast_port(), HostType.SERVER)
 
         print(f'############################################ \n'
               f'# SERVER                                     \n'
@@ -24,20 +27,26 @@ class Server:
               f'# Address: {self.own_host.address}:{self.own_host.unicast_port}       #\n'
               f'############################################ \n')
 
-        self.socket_service = SocketService(self.own_host, self.on_host_failed)
+        self.socket_service = create_socket_service(self.own_host, self.on_host_failed, transport=self.transport)
         self.socket_service.set_on_broadcast_delivered(self.on_broadcast_received)
         self.socket_service.set_on_multicast_delivered(self.on_server_multicast_received)
         self.socket_service.set_on_unicast_delivered(self.on_unicast_received)
+        self.socket_service.set_on_state_transfer_required(self.on_state_transfer_required)
 
         self.currently_initializing = []
         self.in_init = False
         self.ring = Ring(self.own_host)
         self.server_ring = Ring(self.own_host)
 
-        self.all_host_group = KnownHostGroup(self.own_host, self.ring, self.server_ring, self.socket_service)
+        self.all_host_group = KnownHostGroup(self.own_host, self.ring, self.server_ring, self.socket_service,
+                                             ordering)
         self.all_host_group.add_participant(self.own_host)
 
-        self.election_service = LCRElection(self.socket_service, self.own_host, self.server_ring, self.all_host_group)
+        self.election_service = create_election(self.socket_service, self.own_host, self.server_ring, self.all_host_group,
+                                                election)
+        self.election_service.set_on_leader_changed(self.on_leader_changed)
+        self.all_host_group.view.on_joined.subscribe("election", self.on_view_changed)
+        self.all_host_group.view.on_left.subscribe("election", self.on_view_changed)
 
         self.discovery_service = DiscoveryService(self.own_host, self.socket_service, self.discovery_counter)
 
@@ -46,25 +55,39 @@ class Server:
         self.heartbeat_service = HeartbeatService(self.own_host, self.ring, self.socket_service)
         self.heartbeat_service.set_on_heartbeat_missing(self.on_host_missing)
 
+        # With SWIM the membership service detects failures and spreads the changes instead of MAIN_GROUP/HOSTS
+        self.membership_service = None
+        if membership == "swim":
+            self.membership_service = MembershipService(self.own_host, self.socket_service)
+            self.membership_service.set_on_member_joined(self.on_member_joined)
+            self.membership_service.set_on_member_failed(self.on_host_missing)
+
         self.discovery_service.daemon = True
         self.socket_service.daemon = True
         self.heartbeat_service.daemon = True
 
+    def start(self):
         self.discovery_service.start_broadcasting()
-        self.heartbeat_service.start_heartbeat()
+        if self.membership_service:
+            self.membership_service.start()
+        else:
+            self.heartbeat_service.start_heartbeat()
+        # An election that ran while the ring was still changing is repeated until there is a leader
+        self.socket_service.schedule_periodic(ELECTION_TIMEOUT, self.start_election_if_no_leader)
 
         self.socket_service.start()
         self.discovery_service.start()
 
+    def join(self):
         self.socket_service.join()
         self.discovery_service.join()
 
     def discovery_counter(self, counter):
         if counter > MAX_BROADCAST_RETRIES:
             self.discovery_service.stop_broadcasting()
-            self.election_service.start_election()
+            # Alone in the ring the election may announce us right away, the group has to exist by then
             self.socket_service.add_group(self.all_host_group)
-            self.all_host_group.announce_participants()
+            self.election_service.start_election()
 
     def on_broadcast_received(self, host: Host, method: str, message: str):
         if self.in_init:
@@ -103,14 +126,23 @@ class Server:
             print("Got other host, stop broadcasting")
             self.discovery_service.stop_broadcasting()
             data = json.loads(message)
-            host = Host.from_json(data.get("host"))
+            host = self.socket_service.hosts.intern_host(Host.from_json(data.get("host")))
             hosts = json.loads(data.get("hosts"))
-            list_of_hosts = [Host.from_json(h) for h in hosts]
+            list_of_hosts = [self.socket_service.hosts.intern_host(Host.from_json(h)) for h in hosts]
+            if self.membership_service:
+                # Only the contact hears from us, it spreads our join
+                for new_host in list_of_hosts:
+                    if new_host.id != host.id:
+                        self.membership_service.add_member(new_host)
+                list_of_hosts = [host]
             for new_host in list_of_hosts:
                 self.currently_initializing.append(new_host.id)
                 self.socket_service.send_unicast(new_host, "SERVER/JOIN", "")
         if method == "SERVER/JOIN":
-            self.all_host_group.add_participant(host)
+            self.on_member_joined(host)
+            if self.membership_service:
+                self.membership_service.add_member(host)
+                self.membership_service.sync(host)
             print("ANSWERED HOST!")
             current_leader = False
             if self.election_service.current_leader:
@@ -118,7 +150,9 @@ class Server:
             self.socket_service.send_unicast(host, "SERVER/JOINED", str(current_leader))
         if method == "SERVER/JOINED":
             print("Got answer from host!")
-            self.all_host_group.add_participant(host)
+            self.on_member_joined(host)
+            if self.membership_service:
+                self.membership_service.add_member(host)
             self.currently_initializing.remove(host.id)
             if message == "True":
                 print("Got leader")
@@ -127,48 +161,76 @@ class Server:
             if len(self.currently_initializing) == 0:
                 self.socket_service.add_group(self.all_host_group)
 
-                self.all_host_group.announce_participants()
+                if not self.membership_service:
+                    self.all_host_group.sync_view(host)
+                    # Hosts that only answered our broadcast may not know the others yet
+                    self.all_host_group.announce_changes(joined=self.all_host_group.view.get_hosts())
 
                 self.socket_service.send_unicast(self.election_service.current_leader, "GS/SYNC_GAMES", '')
 
-                time.sleep(3)
-                if not self.election_service.leader_elected():
-                    self.election_service.start_election()
+                self.socket_service.timers.schedule(3, self.start_election_if_no_leader)
 
         elif method == "HB":
             self.heartbeat_service.on_heartbeat_received(host, message)
+        if self.membership_service:
+            self.membership_service.on_unicast_received(host, method, message)
+        self.all_host_group.on_unicast_received(host, method, message)
         self.election_service.on_message_received(host, method, message)
         self.game_service.on_unicast_received(host, method, message)
 
+    def start_election_if_no_leader(self):
+        if not self.election_service.leader_elected() and not self.discovery_service.is_broadcasting:
+            self.election_service.start_election()
+
     def on_server_multicast_received(self, host: Host, method: str, message: str, header):
 
         self.all_host_group.on_multicast_received(host, method, message, header)
         self.election_service.on_message_received(host, method, message)
-        if method == "MAIN_GROUP/HOSTS":
-            hosts = json.loads(message)
-            list_of_hosts_id = [Host.from_json(h).id for h in hosts]
-            if self.election_service.current_leader and self.election_service.current_leader.id not in list_of_hosts_id:
-                self.election_service.start_election()
-            elif not self.election_service.current_leader:
-                self.election_service.start_election()
         self.game_service.on_multicast_received(host, method, message)
 
+    def on_state_transfer_required(self, group):
+        # Messages we missed were already evicted from the other histories, fetch the games instead
+        if isinstance(group, GameGroup):
+            self.game_service.request_game(group.game_id)
+            return
+        current_leader = self.election_service.current_leader
+        if current_leader and current_leader.id != self.own_host.id:
+            self.socket_service.send_unicast(current_leader, "GS/SYNC_GAMES", '')
+
     def on_host_failed(self):
-        self.all_host_group.remove_participant(self.all_host_group.ring.get_right_neighbour())
-        self.all_host_group.announce_participants()
+        self.on_host_missing(self.all_host_group.ring.get_right_neighbour())
+
+    def on_member_joined(self, host: Host):
+        self.all_host_group.add_participant(host)
 
     def on_host_missing(self, host: Host):
         print(f"HOST {host.id} NOT ANSWERING!")
+        if not self.all_host_group.get_host(host.id):
+            return
         self.all_host_group.remove_participant(host)
-        self.all_host_group.announce_participants()
-        if self.election_service.leader_elected() and host.id == self.election_service.get_leader().id:
-            print("NOT ANSWERING HOST IS LEADER!")
+        if not self.membership_service:
+            self.all_host_group.announce_changes(left=[host])
+
+    def on_leader_changed(self, leader: Host):
+        # With TOTAL_ORDER "sequencer" the leader numbers the messages of MAIN_GROUP
+        self.socket_service.set_sequencer(self.all_host_group, leader.id if leader else None)
+
+    def on_view_changed(self, host: Host):
+        # A changed ring gets an election until there is a leader
+        if not self.election_service.leader_elected():
+            self.election_service.start_election()
+        elif host.id == self.election_service.get_leader().id and not self.all_host_group.get_host(host.id):
+            print("LEADER LEFT!")
+            # Elections are repeated until there is a leader again, see start_election_if_no_leader
+            self.election_service.clear_leader()
             self.election_service.start_election()
 
 
 if __name__ == "__main__":
     server = None
-try:
-    server = Server()
-except KeyboardInterrupt:
-    print("Shut down because keyboard interrupted")
+    try:
+        server = Server()
+        server.start()
+        server.join()
+    except KeyboardInterrupt:
+        print("Shut down because keyboard interrupted")
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+
+from config import WIRE_CODEC, BUFFER_SIZE, RECEIVE_BURST
+from models.Host import Host
+from services.SocketService import SocketService
+
+
+class AsyncioSocketService(SocketService):
+    # Same interface as the select based SocketService, but the sockets are watched with loop.add_reader
+    # and timers, heartbeats and discovery run on the same event loop
+    runs_tasks = True
+
+    def __init__(self, own_host: Host, on_host_failed, codec: str = WIRE_CODEC, transport=None):
+        self.loop = None
+        self._timer_handle = None
+        self._readers = set()
+        super().__init__(own_host, on_host_failed, codec, transport)
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._print_listening()
+        for receiver in self.sockets:
+            self._start_receiving(receiver)
+        self._arm_timers()
+        self.loop.run_forever()
+
+    def _start_receiving(self, receiver):
+        if receiver in self.sockets and receiver not in self._readers:
+            receiver.setblocking(False)
+            self.loop.add_reader(receiver, self._on_readable, receiver)
+            self._readers.add(receiver)
+
+    def _on_readable(self, receiver):
+        # A burst is handled before the batches are flushed (call_soon) like in one select round
+        for _ in range(RECEIVE_BURST):
+            try:
+                data, address = receiver.recvfrom(BUFFER_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self._on_receive_error(e)
+                return
+            self._on_datagram(receiver, data, address)
+
+    def _add_socket(self, sock):
+        self.sockets.append(sock)
+        self.transport.add_socket(self, sock)
+        if self.loop:
+            self._call_on_loop(lambda: self._start_receiving(sock))
+
+    def _remove_socket(self, sock):
+        if sock in self.sockets:
+            self.sockets.remove(sock)
+        if not self.loop:
+            self.transport.remove_socket(self, sock)
+            return
+        self._call_on_loop(lambda: self._stop_receiving(sock))
+
+    def _stop_receiving(self, sock):
+        if sock in self._readers:
+            self._readers.discard(sock)
+            self.loop.remove_reader(sock)
+        self.transport.remove_socket(self, sock)
+
+    def _call_on_loop(self, callback):
+        if threading.get_ident() == self.ident:
+            callback()
+        else:
+            self.loop.call_soon_threadsafe(callback)
+
+    def _wakeup(self):
+        if not self.loop:
+            return
+        if threading.get_ident() == self.ident:
+            self._arm_timers()
+        else:
+            # Timers may be scheduled from other threads (e.g. keyboard input), hop onto the loop
+            self.loop.call_soon_threadsafe(self._arm_timers)
+
+    def _on_batch_pending(self):
+        # Flush once the datagrams that are ready in this loop iteration are handled
+        if not self.loop:
+            return
+        if threading.get_ident() == self.ident:
+            self.loop.call_soon(self.batcher.flush)
+        else:
+            self.loop.call_soon_threadsafe(self.batcher.flush)
+
+    def _arm_timers(self):
+        # TimerQueue and the event loop both use the monotonic clock, so deadlines can be passed on
+        deadline = self.timers.next_deadline()
+        if self._timer_handle:
+            if deadline is not None and self._timer_handle.when() <= deadline:
+                return
+            self._timer_handle.cancel()
+            self._timer_handle = None
+        if deadline is not None:
+            self._timer_handle = self.loop.call_at(deadline, self._run_timers)
+
+    def _run_timers(self):
+        self._timer_handle = None
+        self.timers.run_due()
+        self._arm_timers()
@@ -0,0 +1,59 @@
+import json
+import threading
+from collections import OrderedDict, deque
+
+from config import CLIENT_COMMAND_WINDOW, CLIENT_COMMAND_TIMEOUT, DEBUG
+from services.SocketService import SocketService
+
+
+class CommandService:
+    # Command stream of a client: every command gets the next sequence number and is sent as GS/CMD without
+    # waiting for the previous ones, at most CLIENT_COMMAND_WINDOW are unacknowledged. The servers acknowledge
+    # in batches (GS/CMD_ACK) and drop commands they already processed, so commands that are not acknowledged
+    # after CLIENT_COMMAND_TIMEOUT are sent again, e.g. to the new owner of the game after a failure
+    def __init__(self, socket_service: SocketService, get_server_for_command):
+        self.socket_service = socket_service
+        self.get_server_for_command = get_server_for_command
+        self.seq = 0
+        # seq -> (command, sent at)
+        self.unacked = OrderedDict()
+        self.queued = deque()
+        self.lock = threading.RLock()
+        self._resend_timer = None
+
+    def send(self, command):
+        # Returns the sequence number of the command
+        with self.lock:
+            self.seq = self.seq + 1
+            if len(self.unacked) < CLIENT_COMMAND_WINDOW:
+                self._send(self.seq, command)
+            else:
+                self.queued.append((self.seq, command))
+            return self.seq
+
+    def on_ack_received(self, message):
+        with self.lock:
+            for seq in json.loads(message):
+                self.unacked.pop(seq, None)
+            while self.queued and len(self.unacked) < CLIENT_COMMAND_WINDOW:
+                self._send(*self.queued.popleft())
+
+    def _send(self, seq, command):
+        server = self.get_server_for_command(command)
+        self.unacked[seq] = (command, self.socket_service.timers.clock())
+        if server:
+            self.socket_service.send_unicast(server, "GS/CMD", json.dumps({'s': seq, 'c': command}))
+        if not self._resend_timer:
+            self._resend_timer = self.socket_service.timers.schedule(CLIENT_COMMAND_TIMEOUT, self._resend)
+
+    def _resend(self):
+        with self.lock:
+            self._resend_timer = None
+            now = self.socket_service.timers.clock()
+            for seq, (command, sent_at) in list(self.unacked.items()):
+                if now - sent_at >= CLIENT_COMMAND_TIMEOUT:
+                    if DEBUG:
+                        print(f"[COMMAND] Resend {seq} {command}")
+                    self._send(seq, command)
+            if self.unacked and not self._resend_timer:
+                self._resend_timer = self.socket_service.timers.schedule(CLIENT_COMMAND_TIMEOUT, self._resend)
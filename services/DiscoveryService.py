@@ -16,20 +16,29 @@ class DiscoveryService(Thread):
         self.socket_service = socket_service
         self.counter = 0
         self.own_host = own_host
+        self.broadcast_message = BroadcastMessage(self.own_host.unicast_port)
 
     def run(self):
-        broadcast_message = BroadcastMessage(self.own_host.unicast_port)
         time.sleep(BROADCAST_INTERVAL)
         while True:
-            if self.is_broadcasting:
-                data = from_broadcast_message(broadcast_message)
-                print("Send broadcast")
-                self.socket_service.send_broadcast("BC", data)
-                self.counter = self.counter + 1
-                if self.discovery_counter:
-                    self.discovery_counter(self.counter)
+            self.tick()
             time.sleep(BROADCAST_INTERVAL)
 
+    def start(self):
+        if self.socket_service.runs_tasks:
+            self.socket_service.schedule_periodic(BROADCAST_INTERVAL, self.tick)
+        else:
+            Thread.start(self)
+
+    def tick(self):
+        if self.is_broadcasting:
+            data = from_broadcast_message(self.broadcast_message)
+            print("Send broadcast")
+            self.socket_service.send_broadcast("BC", data)
+            self.counter = self.counter + 1
+            if self.discovery_counter:
+                self.discovery_counter(self.counter)
+
     def start_broadcasting(self):
         self.counter = 0
         self.is_broadcasting = True
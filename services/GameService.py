@@ -1,8 +1,9 @@
 import json
 
-from config import PAYLOAD_DELIMITER
+from config import PAYLOAD_DELIMITER, GAME_SNAPSHOT_INTERVAL, COMMAND_ACK_DELAY, GAME_TICK_RATE
 from game.models.Game import Movement, Game
 from game.models.Player import Player
+from models.GameGroup import GameGroup
 from models.Host import Host, HostType
 from services.SocketService import SocketService
 
@@ -12,8 +13,53 @@ wrong_insert = "Wrong please type in: up, down, left, right"
 class GameService:
     def __init__(self, socket_service: SocketService, all_host_group):
         self.games = []
+        self.game_groups = {}
         self.all_host_group = all_host_group
         self.socket_service = socket_service
+        # Last command seq processed per client and the acknowledgements not sent yet
+        self.command_seqs = {}
+        self.pending_acks = {}
+        # With a tick rate moves wait in pending_moves (game id -> [(host, move, seq)]) and changed games in
+        # changed_games until the next tick
+        self.tick_rate = 0
+        self.pending_moves = {}
+        self.changed_games = {}
+        self.tick_task = None
+        if GAME_TICK_RATE:
+            self.start_ticks(GAME_TICK_RATE)
+        self.all_host_group.view.on_joined.subscribe("games", self.on_host_joined)
+        self.all_host_group.view.on_left.subscribe("games", self.on_host_left)
+
+    def start_ticks(self, tick_rate):
+        self.tick_rate = tick_rate
+        if self.tick_task:
+            self.tick_task.cancel()
+        self.tick_task = self.socket_service.schedule_periodic(1 / tick_rate, self.tick)
+
+    def get_game(self, game_id):
+        return next((game for game in self.games if str(game.id) == str(game_id)), None)
+
+    def get_game_group(self, game):
+        # Servers are members of the groups of all games they know of. The members follow the players, without
+        # them every message would count as stable right away and leave the history
+        group = self.game_groups.get(str(game.id))
+        if not group:
+            group = GameGroup(game.id, self.socket_service)
+            self.game_groups[str(game.id)] = group
+            self.socket_service.add_group(group)
+        group.set_members(game, self.all_host_group)
+        return group
+
+    def update_game_group_members(self):
+        # Servers are members of every game group
+        for game in self.games:
+            self.get_game_group(game)
+
+    def request_game(self, game_id):
+        game = self.get_game(game_id)
+        owner = self.all_host_group.get_game_owner(game.name) if game else None
+        if owner and owner.id != self.socket_service.own_host.id:
+            self.socket_service.send_unicast(owner, "GS/SYNC_GAME", game_id)
 
     def get_game_for_player_id(self, player_id):
         for game in self.games:
@@ -25,38 +71,35 @@ class GameService:
     def on_unicast_received(self, host, method, message):
         if method == "GS":
             self.on_command_received(host, message)
+        if method == "GS/CMD":
+            data = json.loads(message)
+            self.on_command_received(host, data.get('c'), seq=data.get('s'))
+        if method == "GS/FWD":
+            # Command of a client that reached us because we own its game
+            data = json.loads(message)
+            client = self.socket_service.hosts.intern_host(Host.from_json(data.get('host')))
+            self.on_command_received(client, data.get('command'), forwarded=True, seq=data.get('seq'))
         if method == "GS/SYNC_GAMES":
             for game in self.games:
                 self.socket_service.send_unicast(host, "GS/SYNC", game.to_pickle())
+        if method == "GS/SYNC_GAME":
+            game = self.get_game(message)
+            if game:
+                self.socket_service.send_unicast(host, "GS/SYNC", game.to_pickle())
         if method == "GS/SYNC":
             game = Game.from_pickle(message)
 
             if not game:
                 return
+            self.get_game_group(game)
             if game not in self.games:
                 self.games.append(game)
+            else:
+                index = self.games.index(game)
+                if self.games[index].seq < game.seq:
+                    self.games[index] = game
 
     def on_multicast_received(self, host, method, message):
-        if method == "MAIN_GROUP/HOSTS":
-            hosts = json.loads(message)
-            list_of_hosts = [Host.from_json(h) for h in hosts]
-            client_ids = [client.id for client in list_of_hosts if client.host_type == HostType.CLIENT]
-            for game in self.games:
-                removed = False
-                t_players = []
-                for player in game.players:
-                    if player.id in client_ids:
-                        p = game.get_player(player.id)
-                        t_players.append(p)
-                    else:
-                        posx, posy = game.get_player_position(player)
-                        game.grid.cells[posy][posx].player = None
-                        removed = True
-                game.players = t_players
-
-                if removed:
-                    self.send_game(game)
-
         if method == "GS/OV":
             game = Game.from_pickle(message)
             if not game:
@@ -66,19 +109,107 @@ class GameService:
                 self.games.append(game)
 
             for i, _game in enumerate(self.games):
-                if _game.id == game.id and _game.seq + 1 == game.seq:
+                if _game.id == game.id and _game.seq < game.seq:
                     self.games[i] = game
+            self.get_game_group(game)
 
-    def on_command_received(self, host, payload):
+        if method == "GS/DELTA":
+            delta = json.loads(message)
+            game = self.get_game(delta.get('g'))
+            if game and game.seq >= delta.get('seq'):
+                # Already applied, e.g. our own update
+                return
+            if not game or not game.apply_delta(delta):
+                print(f"Missed update of game {delta.get('g')}, request snapshot")
+                self.socket_service.send_unicast(host, "GS/SYNC_GAME", delta.get('g'))
+                return
+            if 'roster' in delta:
+                self.get_game_group(game)
+
+    def on_host_joined(self, host: Host):
+        if host.host_type == HostType.SERVER:
+            self.update_game_group_members()
+
+    def on_host_left(self, host: Host):
+        # A failed client leaves its game
+        if host.host_type != HostType.CLIENT:
+            self.update_game_group_members()
+            return
+        self.command_seqs.pop(host.id, None)
+        for game in self.games:
+            player = game.get_player(host.id)
+            if player and self.all_host_group.owns_game(game.name):
+                game.remove_player(player)
+                self.update_game(game)
+
+    def get_game_name_for_command(self, host, chunks):
+        mode = chunks[0].lower()
+        if mode in ["create", "join"]:
+            return chunks[1] if len(chunks) > 1 else None
+        if mode == "display":
+            return None
+        game = self.get_game_for_player_id(host.id)
+        return game.name if game else None
+
+    def forward_command(self, host, payload, owner, seq=None):
+        self.socket_service.send_unicast(owner, "GS/FWD", json.dumps({
+            'host': host.to_json(),
+            'command': payload,
+            'seq': seq,
+        }))
+
+    def get_command_seq(self, client_id):
+        # The game knows the last command of its players even if another server processed it
+        game = self.get_game_for_player_id(client_id)
+        player_seq = game.get_player(client_id).command_seq if game else 0
+        return max(self.command_seqs.get(client_id, 0), player_seq)
+
+    def acknowledge(self, host, seq):
+        if host.id in self.pending_acks:
+            self.pending_acks[host.id][1].append(seq)
+        else:
+            self.pending_acks[host.id] = (host, [seq])
+            self.socket_service.timers.schedule(COMMAND_ACK_DELAY, self.send_acknowledgements, host.id)
+
+    def send_acknowledgements(self, client_id):
+        host, seqs = self.pending_acks.pop(client_id)
+        self.socket_service.send_unicast(host, "GS/CMD_ACK", json.dumps(seqs))
+
+    def on_command_received(self, host, payload, forwarded=False, seq=None):
         try:
             chunks = payload.split(PAYLOAD_DELIMITER)
+
+            # Only the owner of a game changes it. Clients send to the owner they know of, with a different
+            # view of the servers we pass the command on once (a forwarded command is never forwarded again)
+            game_name = self.get_game_name_for_command(host, chunks)
+            if game_name and not forwarded and not self.all_host_group.owns_game(game_name):
+                owner = self.all_host_group.get_game_owner(game_name)
+                if owner:
+                    self.forward_command(host, payload, owner, seq)
+                    return
+
+            if seq is not None:
+                if seq <= self.get_command_seq(host.id):
+                    # Sent again, e.g. because the acknowledgement got lost
+                    self.acknowledge(host, seq)
+                    return
+                self.command_seqs[host.id] = seq
+                self.acknowledge(host, seq)
+
             player_id = host.id
             mode = chunks[0]
             if mode == "create" and chunks[1] != "" or mode == "Create" and chunks[1] != "":
+                if next((game for game in self.games if chunks[1] == game.name), None):
+                    self.socket_service.send_unicast(host, "GS/ERROR", f"Game {chunks[1]} already exists")
+                    return
                 game = Game(chunks[1], width=5, height=5, item_number=2)
                 self.games.append(game)
                 print(f"Created game {game.name}")
                 self.send_game(game)
+                # The other servers join the group of the game once they know it
+                for server in self.all_host_group.server_ring.nodes:
+                    if server.id != self.socket_service.own_host.id:
+                        self.socket_service.send_unicast(server, "GS/SYNC", game.to_pickle())
             elif mode == "display" or mode == "Display":
                 game_names = []
 
@@ -96,7 +227,7 @@ class GameService:
                 player = game.get_player(player_id)
                 game.remove_player(player)
                 print(f"Player {player.name} left game {game.name}")
-                self.send_game(game)
+                self.update_game(game)
             elif len(chunks) == 3 and (mode == "join" or mode == "Join"):
                 player_name = chunks[2]
                 gamename = chunks[1]
@@ -109,17 +240,27 @@ class GameService:
                 game = next((game for game in self.games if gamename == game.name), None)
                 if not game:
                     self.socket_service.send_unicast(host, "GS/ERROR", f"Could not find game with name {gamename}")
-                game.add_player(Player(id=player_id, name=player_name))
+                    return
+                player = Player(id=player_id, name=player_name)
+                game.add_player(player)
+                if seq is not None:
+                    game.set_command_seq(player, seq)
                 print(f"Player {player_name} joined game {game.name}")
-                self.send_game(game)
+                self.update_game(game)
+                # The client is not in the group of the game yet
+                self.socket_service.send_unicast(host, "GS/SYNC", game.to_pickle())
             elif mode in [Movement.UP, Movement.DOWN, Movement.LEFT, Movement.RIGHT]:
                 game = self.get_game_for_player_id(player_id)
                 if not game:
                     self.socket_service.send_unicast(host, "GS/ERROR", "You are not joined the Game")
                     return
                 player = game.get_player(player_id)
-                if player:
+                if player and self.tick_rate:
+                    self.pending_moves.setdefault(str(game.id), []).append((host, mode, seq))
+                elif player:
                     game.move_player(player, mode)
+                    if seq is not None:
+                        game.set_command_seq(player, seq)
                     print(f"Player {player.name} moved {mode}")
                     self.send_answer(host, game, player)
             else:
@@ -131,16 +272,53 @@ class GameService:
     def has_player_won(self, player: Player):
         return len(player.items) >= 3
 
+    def update_game(self, game):
+        # Sends the update now or with the next tick
+        if self.tick_rate:
+            self.changed_games[str(game.id)] = game
+        else:
+            self.send_game(game)
+
+    def tick(self):
+        # Resolves the moves since the last tick in the order they arrived, one update per changed game
+        pending_moves, self.pending_moves = self.pending_moves, {}
+        for game_id, moves in pending_moves.items():
+            game = self.get_game(game_id)
+            if not game:
+                continue
+            for host, mode, seq in moves:
+                player = game.get_player(host.id)
+                if not player:
+                    # Left the game in the meantime
+                    continue
+                game.move_player(player, mode)
+                if seq is not None:
+                    game.set_command_seq(player, seq)
+                if self.has_player_won(player):
+                    self.send_win(game, player)
+            self.changed_games[game_id] = game
+        changed_games, self.changed_games = self.changed_games, {}
+        for game in changed_games.values():
+            self.send_game(game)
+
     def send_game(self, game):
+        # Only the owner updates a game, its updates need no total order with the ones of other owners
         game.seq = game.seq + 1
-        self.socket_service.send_group_multicast(self.all_host_group, "GS/OV", game.to_pickle())
+        group = self.get_game_group(game)
+        if game.seq == 1 or game.seq % GAME_SNAPSHOT_INTERVAL == 0:
+            game.clear_changes()
+            self.socket_service.send_fifo_group_multicast(group, "GS/OV", game.to_pickle())
+        else:
+            self.socket_service.send_fifo_group_multicast(group, "GS/DELTA", game.to_delta())
+
+    def send_win(self, game: Game, player: Player):
+        self.socket_service.send_fifo_group_multicast(self.get_game_group(game), "GS/WIN", json.dumps({
+            'game_id': str(game.id),
+            'message': player.name + " has Won!!",
+        }))
 
     def send_answer(self, host: Host, game: Game, player: Player):
         if self.has_player_won(player):
-            self.socket_service.send_group_multicast(self.all_host_group, "GS/WIN",
-                                                     json.dumps({
-                                                         'game_id': game.id,
-                                                         'message': player.name + " has Won!!",
-                                                     }))
+            self.send_win(game, player)
         else:
             self.send_game(game)
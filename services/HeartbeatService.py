@@ -1,57 +1,106 @@
+import threading
 import time
 
 from services.SocketService import SocketService
-from config import HEARTBEAT_INTERVAL, PAYLOAD_DELIMITER, HEARTBEAT_MAX, DEBUG, HEARTBEAT
+from config import HEARTBEAT_INTERVAL, HEARTBEAT_CHECK_INTERVAL, HEARTBEAT_PHI_THRESHOLD, DEBUG, HEARTBEAT
 from threading import Thread
 
 from models.Host import Host
+from models.PhiAccrualDetector import PhiAccrualDetector
 from models.Ring import Ring
 
 
 class HeartbeatService(Thread):
+    # Every host watches its right neighbour and keeps its left neighbour informed. Any datagram of a peer counts
+    # as a heartbeat (see SocketService.set_on_peer_activity), HB is only sent when we sent nothing else to the
+    # left neighbour for HEARTBEAT_INTERVAL
     def __init__(self, own_host: Host, ring: Ring, socket_service: SocketService):
         Thread.__init__(self)
         self.is_sending = False
-        self.last_messages = {}
+        self.detectors = {}
+        self.lock = threading.Lock()
         self.socket_service = socket_service
+        self.socket_service.set_on_peer_activity(self.on_peer_activity)
         self.own_host = own_host
         self.on_heartbeat_missing = None
         self.ring = ring
+        self.ring.on_left_neighbour_changed.subscribe("heartbeat", self.on_left_neighbour_changed)
+        self.ring.on_right_neighbour_changed.subscribe("heartbeat", self.on_right_neighbour_changed)
+        self.task = None
 
     def __del__(self):
         self.is_sending = False
 
     def run(self):
         while True:
-            if self.is_sending and len(self.ring.nodes) > 1:
-                left_neighbour = self.ring.get_left_neighbour()
-                right_neighbour = self.ring.get_right_neighbour()
-                if left_neighbour and left_neighbour.id != self.own_host.id:
-                    current_time = time.time()
-                    self.socket_service.send_unicast(left_neighbour, "HB", current_time)
-                if right_neighbour and right_neighbour.id != self.own_host.id:
-                    if right_neighbour.id in self.last_messages \
-                            and time.time() - float(self.last_messages[right_neighbour.id]):
-                        if DEBUG and HEARTBEAT:
-                            print("TIME", right_neighbour.id, time.time() - float(self.last_messages[right_neighbour.id]))
-                    if right_neighbour.id in self.last_messages \
-                            and time.time() - float(self.last_messages[right_neighbour.id]) > HEARTBEAT_MAX:
-
-                        self.on_heartbeat_missing(right_neighbour)
-            time.sleep(HEARTBEAT_INTERVAL)
+            self.tick()
+            time.sleep(HEARTBEAT_CHECK_INTERVAL)
+
+    def tick(self):
+        if self.is_sending and len(self.ring.nodes) > 1:
+            left_neighbour = self.ring.get_left_neighbour()
+            right_neighbour = self.ring.get_right_neighbour()
+            now = self.socket_service.timers.clock()
+            if left_neighbour and left_neighbour.id != self.own_host.id \
+                    and now - self.socket_service.get_last_sent(left_neighbour) >= HEARTBEAT_INTERVAL:
+                self.socket_service.send_unicast(left_neighbour, "HB", "")
+            if right_neighbour and right_neighbour.id != self.own_host.id:
+                phi = self.get_phi(right_neighbour, now)
+                if DEBUG and HEARTBEAT:
+                    print("PHI", right_neighbour.id, round(phi, 2))
+                if phi >= HEARTBEAT_PHI_THRESHOLD:
+                    with self.lock:
+                        self.detectors.pop(right_neighbour.id, None)
+                    self.on_heartbeat_missing(right_neighbour)
+
+    def get_phi(self, host: Host, now):
+        with self.lock:
+            detector = self.detectors.get(host.id)
+            if not detector:
+                # Watched from now on, a host that never sends is suspected as well
+                detector = self.detectors[host.id] = PhiAccrualDetector(now)
+            return detector.phi(now)
+
+    def on_peer_activity(self, host: Host):
+        now = self.socket_service.timers.clock()
+        with self.lock:
+            detector = self.detectors.get(host.id)
+            if detector:
+                detector.heartbeat(now)
+            else:
+                self.detectors[host.id] = PhiAccrualDetector(now)
+
+    def on_left_neighbour_changed(self, host: Host):
+        # The new left neighbour watches us from now on, it does not have to wait for the next interval
+        if self.is_sending and host.id != self.own_host.id:
+            self.socket_service.send_unicast(host, "HB", "")
+
+    def on_right_neighbour_changed(self, host: Host):
+        # Gaps in what it sent before were not meant for us, start learning from now
+        if host.id != self.own_host.id:
+            with self.lock:
+                self.detectors[host.id] = PhiAccrualDetector(self.socket_service.timers.clock())
 
     def set_on_heartbeat_missing(self, func):
         self.on_heartbeat_missing = func
 
     def on_heartbeat_received(self, host, payload):
-        self.last_messages[host.id] = payload
+        # Counted by on_peer_activity like every other datagram
+        pass
 
     def start_heartbeat(self):
         if not self.is_sending:
             self.is_sending = True
-            self.start()
+            if self.socket_service.runs_tasks:
+                self.task = self.socket_service.schedule_periodic(HEARTBEAT_CHECK_INTERVAL, self.tick)
+            else:
+                self.start()
 
     def stop_heartbeat(self):
         if self.is_sending:
             self.is_sending = False
-            self.join()
+            if self.task:
+                self.task.cancel()
+                self.task = None
+            else:
+                self.join()
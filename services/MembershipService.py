@@ -0,0 +1,256 @@
+import json
+import math
+import random
+import threading
+
+from config import SWIM_PROTOCOL_PERIOD, SWIM_PING_TIMEOUT, SWIM_INDIRECT_PROBES, SWIM_SUSPECT_TIMEOUT, \
+    SWIM_MAX_PIGGYBACK, SWIM_RETRANSMIT_MULTIPLIER, DEBUG
+from models.Host import Host
+from services.SocketService import SocketService
+
+
+class MemberState:
+    ALIVE = "alive"
+    SUSPECT = "suspect"
+    DEAD = "dead"
+
+
+class Member:
+    def __init__(self, host: Host, state: str = MemberState.ALIVE, incarnation: int = 0):
+        self.host = host
+        self.state = state
+        self.incarnation = incarnation
+
+
+class MembershipService:
+    # SWIM membership (Das et al.): every SWIM_PROTOCOL_PERIOD one member is probed with SWIM/PING, members are
+    # probed round robin in random order. Without SWIM/ACK after SWIM_PING_TIMEOUT, SWIM_INDIRECT_PROBES other
+    # members are asked to ping it (SWIM/PING_REQ). A member without any ack in the period becomes suspect and is
+    # declared dead after SWIM_SUSPECT_TIMEOUT unless it refutes with a higher incarnation.
+    # Joins, suspicions and failures are not multicast but piggybacked on the pings and acks and on the other
+    # reliable unicasts of the host, each one SWIM_RETRANSMIT_MULTIPLIER * log(members) times. A member sends one
+    # probe per period whatever the size of the cluster
+    def __init__(self, own_host: Host, socket_service: SocketService):
+        self.own_host = own_host
+        self.socket_service = socket_service
+        self.incarnation = 0
+        self.members = {}
+        self.on_member_joined = None
+        self.on_member_failed = None
+        # Updates still to piggyback, member id -> [update, transmissions left]
+        self.updates = {}
+        self.probe_order = []
+        self.probe_nonce = 0
+        self.probe = None
+        # Pings we send on behalf of others, nonce -> (requester, nonce of the requester)
+        self.relayed = {}
+        self.lock = threading.RLock()
+        self.task = None
+        # Seeded by the id, runs in a SimulatedNetwork stay reproducible
+        self.random = random.Random(own_host.id)
+        self.socket_service.set_piggyback(self._take_piggyback, self._on_piggyback)
+
+    def set_on_member_joined(self, func):
+        self.on_member_joined = func
+
+    def set_on_member_failed(self, func):
+        self.on_member_failed = func
+
+    def start(self):
+        with self.lock:
+            self._queue_update(self._own_update())
+        if not self.task:
+            self.task = self.socket_service.schedule_periodic(SWIM_PROTOCOL_PERIOD, self.tick)
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def get_alive_members(self):
+        return [member.host for member in self.members.values() if member.state != MemberState.DEAD]
+
+    def add_member(self, host: Host):
+        # A host we learned about directly (welcome, join), the others hear of it through the piggybacked updates
+        if host.id == self.own_host.id:
+            return
+        with self.lock:
+            if host.id not in self.members:
+                self._apply_update(self._to_update(host))
+
+    def sync(self, host: Host, reply: bool = True):
+        # Full state exchange with a host that just joined through us, neither of us has to wait for the gossip
+        with self.lock:
+            updates = [self._own_update()] + [self._to_update(member.host, member.state, member.incarnation)
+                                              for member in self.members.values()]
+        self.socket_service.send_unicast(host, "SWIM/SYNC", json.dumps({'u': updates, 'r': reply}))
+
+    def tick(self):
+        with self.lock:
+            if self.probe and not self.probe['acked']:
+                self._suspect(self.probe['target'])
+            target = self._next_probe_target()
+            if not target:
+                self.probe = None
+                return
+            self.probe_nonce = self.probe_nonce + 1
+            self.probe = {'nonce': self.probe_nonce, 'target': target, 'acked': False}
+            self._send(target, "SWIM/PING", {'n': self.probe_nonce})
+            self.socket_service.timers.schedule(SWIM_PING_TIMEOUT, self._on_ping_timeout, self.probe_nonce)
+
+    def on_unicast_received(self, host: Host, method: str, message: str):
+        if not method.startswith("SWIM/"):
+            return
+        payload = json.loads(message)
+        with self.lock:
+            for update in payload.get('u', []):
+                self._apply_update(update)
+            # A sender we missed the join of is alive anyway
+            self.add_member(host)
+            if method == "SWIM/PING":
+                self._send(host, "SWIM/ACK", {'n': payload.get('n')})
+            elif method == "SWIM/PING_REQ":
+                target = self._from_update(payload.get('t'))
+                self.probe_nonce = self.probe_nonce + 1
+                self.relayed[self.probe_nonce] = (host, payload.get('n'))
+                self.socket_service.timers.schedule(SWIM_PROTOCOL_PERIOD, self.relayed.pop, self.probe_nonce, None)
+                self._send(target, "SWIM/PING", {'n': self.probe_nonce})
+            elif method == "SWIM/SYNC" and payload.get('r'):
+                self.sync(host, reply=False)
+            elif method == "SWIM/ACK":
+                nonce = payload.get('n')
+                if self.probe and self.probe['nonce'] == nonce:
+                    self.probe['acked'] = True
+                relayed = self.relayed.pop(nonce, None)
+                if relayed:
+                    requester, requester_nonce = relayed
+                    self._send(requester, "SWIM/ACK", {'n': requester_nonce})
+
+    def _on_ping_timeout(self, nonce):
+        with self.lock:
+            if not self.probe or self.probe['nonce'] != nonce or self.probe['acked']:
+                return
+            target = self.probe['target']
+            helpers = [host for host in self.get_alive_members() if host.id != target.id]
+            for helper in self.random.sample(helpers, min(SWIM_INDIRECT_PROBES, len(helpers))):
+                self._send(helper, "SWIM/PING_REQ", {'n': nonce, 't': self._to_update(target)})
+
+    def _next_probe_target(self):
+        # Round robin over a shuffled list bounds the time until a failed member is probed
+        while self.probe_order:
+            member = self.members.get(self.probe_order.pop())
+            if member and member.state != MemberState.DEAD:
+                return member.host
+        self.probe_order = [member.host.id for member in self.members.values() if member.state != MemberState.DEAD]
+        self.random.shuffle(self.probe_order)
+        return self.members[self.probe_order.pop()].host if self.probe_order else None
+
+    def _suspect(self, host: Host):
+        member = self.members.get(host.id)
+        if member and member.state == MemberState.ALIVE:
+            self._apply_update(self._to_update(host, MemberState.SUSPECT, member.incarnation))
+
+    def _on_suspect_timeout(self, host_id, incarnation):
+        with self.lock:
+            member = self.members.get(host_id)
+            if member and member.state == MemberState.SUSPECT and member.incarnation == incarnation:
+                self._apply_update(self._to_update(member.host, MemberState.DEAD, incarnation))
+
+    def _apply_update(self, update):
+        host = self._from_update(update)
+        state, incarnation = update[4], update[5]
+        if host.id == self.own_host.id:
+            if state != MemberState.ALIVE and incarnation >= self.incarnation:
+                # Refute, we are still here
+                self.incarnation = incarnation + 1
+                self._queue_update(self._own_update())
+            return
+        member = self.members.get(host.id)
+        if not member:
+            self.members[host.id] = Member(host, state, incarnation)
+            self._queue_update(update)
+            if state == MemberState.DEAD:
+                return
+            self.probe_order.insert(0, host.id)
+            if state == MemberState.SUSPECT:
+                self._schedule_suspect_timeout(host.id, incarnation)
+            if DEBUG:
+                print(f"[SWIM] {host.id} joined")
+            if self.on_member_joined:
+                self.on_member_joined(host)
+            return
+        if not _overrides(state, incarnation, member):
+            return
+        previous_state = member.state
+        member.state = state
+        member.incarnation = incarnation
+        self._queue_update(update)
+        if state == MemberState.SUSPECT:
+            if DEBUG:
+                print(f"[SWIM] Suspect {host.id}")
+            self._schedule_suspect_timeout(host.id, incarnation)
+        elif state == MemberState.DEAD:
+            if DEBUG:
+                print(f"[SWIM] {host.id} failed")
+            if self.on_member_failed:
+                self.on_member_failed(member.host)
+        elif previous_state == MemberState.DEAD:
+            # Came back with a higher incarnation
+            member.host = host
+            self.probe_order.insert(0, host.id)
+            if self.on_member_joined:
+                self.on_member_joined(host)
+
+    def _schedule_suspect_timeout(self, host_id, incarnation):
+        self.socket_service.timers.schedule(SWIM_SUSPECT_TIMEOUT, self._on_suspect_timeout, host_id, incarnation)
+
+    def _queue_update(self, update):
+        members = len(self.members) + 1
+        self.updates[update[0]] = [update, SWIM_RETRANSMIT_MULTIPLIER * math.ceil(math.log2(members + 1))]
+
+    def _take_updates(self):
+        # Newest updates (most transmissions left) first
+        pending = sorted(self.updates.values(), key=lambda item: -item[1])[:SWIM_MAX_PIGGYBACK]
+        for item in pending:
+            item[1] = item[1] - 1
+            if item[1] <= 0:
+                del self.updates[item[0][0]]
+        return [update for update, _ in pending]
+
+    def _take_piggyback(self):
+        with self.lock:
+            return self._take_updates()
+
+    def _on_piggyback(self, host: Host, updates):
+        with self.lock:
+            for update in updates:
+                self._apply_update(update)
+
+    def _send(self, host: Host, method: str, payload: dict):
+        updates = self._take_updates()
+        if updates:
+            payload['u'] = updates
+        self.socket_service.send_unreliable_unicast(host, method, json.dumps(payload))
+
+    def _own_update(self):
+        return self._to_update(self.own_host, MemberState.ALIVE, self.incarnation)
+
+    @staticmethod
+    def _to_update(host: Host, state: str = MemberState.ALIVE, incarnation: int = 0):
+        return [host.id, host.address, host.unicast_port, host.host_type, state, incarnation]
+
+    def _from_update(self, update):
+        return self.socket_service.hosts.intern(update[0], update[1], update[2], update[3])
+
+
+def _overrides(state, incarnation, member: Member):
+    # SWIM precedence: dead beats everything, suspect beats alive of the same incarnation, a higher incarnation
+    # beats alive and suspect
+    if member.state == MemberState.DEAD:
+        return state == MemberState.ALIVE and incarnation > member.incarnation
+    if state == MemberState.DEAD:
+        return True
+    if state == MemberState.SUSPECT:
+        return incarnation > member.incarnation or (incarnation == member.incarnation
+                                                   and member.state == MemberState.ALIVE)
+    return incarnation > member.incarnation
@@ -0,0 +1,225 @@
+import queue
+import threading
+
+import select
+
+from config import WIRE_CODEC, BUFFER_SIZE, RECEIVE_BURST, PIPELINE_QUEUE_SIZE, PIPELINE_APPLICATION_QUEUE_SIZE, \
+    PIPELINE_WORKERS
+from models.Host import Host
+from services.SocketService import SocketService, _RECEIVE_FLAGS
+from util.KeyedWorkerPool import KeyedWorkerPool
+from util.TimerQueue import PeriodicTimer
+
+# Keys of the application callbacks that belong to no group or sender, each runs in its own order. Timers of a
+# service run under ("timer", id(service)), TIMER_KEY is left for plain functions
+TIMER_KEY = "timers"
+FAILURE_KEY = "failures"
+
+
+class PipelinedSocketService(SocketService):
+    # Same interface as the select based SocketService, split in three stages so a slow handler does not stop the
+    # networking: a receive thread drains the sockets into a bounded queue, the protocol thread (this one) decodes
+    # them, runs the reliable and ordered layers and the own timers, handlers and timers of the application run on
+    # a KeyedWorkerPool. Messages of one group are handled in delivery order, unicasts and broadcasts of one sender
+    # in the order of the sender. Calls from the application into the service take protocol_lock, so the protocol
+    # state is only changed by one thread at a time. get_pipeline_stats shows the depth of both queues
+    def __init__(self, own_host: Host, on_host_failed, codec: str = WIRE_CODEC, transport=None):
+        self.ingress = queue.Queue(PIPELINE_QUEUE_SIZE)
+        self.ingress_max_depth = 0
+        self.received = 0
+        self.dropped = 0
+        self.pool = KeyedWorkerPool(PIPELINE_WORKERS, PIPELINE_APPLICATION_QUEUE_SIZE, "application")
+        self.protocol_lock = threading.RLock()
+        self._running = False
+        super().__init__(own_host, on_host_failed, codec, transport)
+        self.on_host_failed = self._in_pool(on_host_failed, _failure_key)
+
+    def run(self):
+        self._print_listening()
+        self.pool.start()
+        self._running = True
+        threading.Thread(target=self._receive_loop, name="receive", daemon=True).start()
+        while True:
+            timeout = self.timers.next_timeout()
+            datagrams = []
+            if self.pool.has_room():
+                datagrams = self._take_datagrams(timeout)
+            else:
+                # The application is behind, new datagrams wait in the queue (or are dropped) until it caught up
+                self.pool.wait_for_room(timeout)
+            with self.protocol_lock:
+                for datagram in datagrams:
+                    if datagram:
+                        self._on_datagram(*datagram)
+                self._run_timers()
+                # Everything sent while handling this round goes out coalesced
+                self.batcher.flush()
+
+    def _receive_loop(self):
+        while True:
+            try:
+                (read, write, exception) = select.select(self.sockets + [self._wakeup_receiver], [], [])
+            except (OSError, ValueError):
+                # A socket was closed while waiting (group left), the next round no longer has it
+                continue
+            for receiver in read:
+                if receiver == self._wakeup_receiver:
+                    self._wakeup_receiver.recv(BUFFER_SIZE)
+                    continue
+                if receiver not in self.sockets:
+                    continue
+                for _ in range(RECEIVE_BURST):
+                    try:
+                        data, address = receiver.recvfrom(BUFFER_SIZE, _RECEIVE_FLAGS)
+                    except BlockingIOError:
+                        break
+                    except Exception as e:
+                        self._on_receive_error(e)
+                        break
+                    self._enqueue((receiver, data, address))
+                    if not _RECEIVE_FLAGS:
+                        break
+
+    def _enqueue(self, datagram):
+        self.received = self.received + 1
+        try:
+            self.ingress.put_nowait(datagram)
+        except queue.Full:
+            # Like a full socket buffer: the reliable layers request or send it again
+            self.dropped = self.dropped + 1
+            return
+        depth = self.ingress.qsize()
+        if depth > self.ingress_max_depth:
+            self.ingress_max_depth = depth
+
+    def _take_datagrams(self, timeout):
+        try:
+            datagrams = [self.ingress.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        for _ in range(RECEIVE_BURST - 1):
+            try:
+                datagrams.append(self.ingress.get_nowait())
+            except queue.Empty:
+                break
+        return datagrams
+
+    def _run_timers(self):
+        for timer in self.timers.pop_due():
+            owner = _timer_owner(timer)
+            if owner is self:
+                timer.run()
+            else:
+                self.pool.submit(TIMER_KEY if owner is None else ("timer", id(owner)), timer.run)
+
+    def get_pipeline_stats(self):
+        return {
+            'protocol': {
+                'depth': self.ingress.qsize(),
+                'max_depth': self.ingress_max_depth,
+                'capacity': self.ingress.maxsize,
+                'received': self.received,
+                'dropped': self.dropped,
+            },
+            'application': self.pool.stats(),
+        }
+
+    def _in_pool(self, callback, key):
+        if not callback:
+            return callback
+
+        def submit(*args):
+            self.pool.submit(key(*args), callback, *args)
+
+        return submit
+
+    def set_on_broadcast_delivered(self, on_broadcast_received):
+        super().set_on_broadcast_delivered(self._in_pool(on_broadcast_received, _sender_key))
+
+    def set_on_unicast_delivered(self, on_unicast_received):
+        super().set_on_unicast_delivered(self._in_pool(on_unicast_received, _sender_key))
+
+    def set_on_multicast_delivered(self, on_multicast_received):
+        super().set_on_multicast_delivered(self._in_pool(on_multicast_received, _group_key))
+
+    def set_on_state_transfer_required(self, on_state_transfer_required):
+        super().set_on_state_transfer_required(self._in_pool(on_state_transfer_required, _state_transfer_key))
+
+    # on_peer_activity only notes the time of the last datagram and stays on the protocol thread
+
+    def add_group(self, group):
+        with self.protocol_lock:
+            super().add_group(group)
+
+    def remove_group(self, group):
+        with self.protocol_lock:
+            super().remove_group(group)
+
+    def send_broadcast(self, method: str, message: str = ''):
+        with self.protocol_lock:
+            super().send_broadcast(method, message)
+
+    def send_unicast(self, host: Host, method: str, message):
+        with self.protocol_lock:
+            super().send_unicast(host, method, message)
+
+    def send_unreliable_unicast(self, host: Host, method: str, message):
+        with self.protocol_lock:
+            super().send_unreliable_unicast(host, method, message)
+
+    def resend_group_multicast(self, group, seq, header, method: str, message):
+        with self.protocol_lock:
+            super().resend_group_multicast(group, seq, header, method, message)
+
+    def send_group_multicast(self, group, method: str, message: str = ''):
+        with self.protocol_lock:
+            return super().send_group_multicast(group, method, message)
+
+    def send_fifo_group_multicast(self, group, method: str, message: str = ''):
+        with self.protocol_lock:
+            return super().send_fifo_group_multicast(group, method, message)
+
+    def set_sequencer(self, group, sequencer_id):
+        with self.protocol_lock:
+            super().set_sequencer(group, sequencer_id)
+
+    def _add_socket(self, sock):
+        super()._add_socket(sock)
+        # select of the receive thread has to pick up the new socket
+        SocketService._wakeup(self)
+
+    def _remove_socket(self, sock):
+        super()._remove_socket(sock)
+        SocketService._wakeup(self)
+
+    def _wakeup(self):
+        # A new earliest timer, the protocol thread may be waiting for a datagram
+        if not self._running:
+            return
+        try:
+            self.ingress.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+def _sender_key(host: Host, *args):
+    return "host", host.id
+
+
+def _group_key(host: Host, method, message, header):
+    return "group", header.get('g_ident')
+
+
+def _state_transfer_key(group):
+    return "group", group.identifier
+
+
+def _failure_key(*args):
+    return FAILURE_KEY
+
+
+def _timer_owner(timer):
+    owner = getattr(timer.callback, '__self__', None)
+    if isinstance(owner, PeriodicTimer):
+        owner = getattr(owner.callback, '__self__', None)
+    return owner
@@ -1,5 +1,6 @@
 import datetime
 import json
+import socket
 import threading
 import uuid
 
@@ -8,36 +9,93 @@ import traceback
 from threading import Thread
 
 from config import BROADCAST_ADDRESS, BUFFER_SIZE, SERVER_GROUP_BASE_MULTICAST_ADDRESS, BROADCAST_PORT, \
-    HEADER_DELIMITER, SERVER_GROUP_MULTICAST_PORT, DEBUG, HEARTBEAT
+    SERVER_GROUP_MULTICAST_PORT, DEBUG, HEARTBEAT, WIRE_CODEC, UNICAST_MAX_RETRANSMITS, BATCH_FLUSH_DELAY, \
+    RECEIVE_BURST, REL_NACK_DELAY, SEQUENCER_HANDOVER_TIMEOUT, ISIS_PROPOSAL_TIMEOUT
+from models.HoldBackQueue import DeliveryState, HoldBackEntry, RelHoldBackEntry
 from models.Host import Host
-from sockets.BroadcastSocket import BroadcastSocket
-from sockets.MulticastSocket import MulticastSocket
-from sockets.UnicastSocket import UnicastSocket
+from models.HostRegistry import HostRegistry
+from transport.BinaryCodec import is_batch_frame, decode_batch, is_fragment_frame, decode_fragment
+from transport.DatagramBatcher import DatagramBatcher
+from transport.FragmentReassembler import FragmentReassembler
+from transport.FragmentSender import FragmentSender
+from transport.UdpTransport import UdpTransport
+from transport.codec_helper import get_codec, decode_message
+from util.TimerQueue import TimerQueue
 
+# Small control messages that are coalesced with others to the same destination
+BATCHED_METHODS = {"ACK", "HB", "SEQ/PROP", "REL_NACK", "LCR/LEADER_ELECTION", "FRAG_NACK", "HS/PROBE", "HS/REPLY",
+                   "BULLY/ELECTION", "BULLY/ANSWER"}
 
-class DeliveryState:
-    DELIVERABLE = "deliverable"
-    UNDELIVERABLE = "undeliverable"
+# Header value ('o') of group multicasts that are delivered in the order of their sender only
+FIFO_ORDER = "fifo"
+# Header value ('o') of group multicasts numbered by the sequencer of the group instead of ISIS proposals
+SEQUENCER_ORDER = "sequencer"
+
+# Read more than one datagram per readiness event where the platform allows it
+_RECEIVE_FLAGS = getattr(socket, 'MSG_DONTWAIT', 0)
 
 
 class SocketService(Thread):
-    def __init__(self, own_host: Host, on_host_failed):
+    # Whether periodic work of the services (heartbeat, discovery) runs as timers on this engine
+    # instead of on their own threads
+    runs_tasks = False
+
+    def __init__(self, own_host: Host, on_host_failed, codec: str = WIRE_CODEC, transport=None):
         Thread.__init__(self)
         self.groups = []
         self.own_host = own_host
-        self.broadcast_socket = BroadcastSocket(BROADCAST_ADDRESS, BROADCAST_PORT)
-        self.unicast_socket = UnicastSocket(own_host.address, own_host.unicast_port)
-        self.multicast_socket = MulticastSocket(SERVER_GROUP_BASE_MULTICAST_ADDRESS, SERVER_GROUP_MULTICAST_PORT)
+        self.codec = get_codec(codec)
+        # Real UDP sockets unless e.g. a SimulatedNetwork is passed
+        self.transport = transport or UdpTransport()
+        if self.transport.runs_tasks:
+            self.runs_tasks = True
+        self.broadcast_socket = self.transport.broadcast_socket(BROADCAST_ADDRESS, BROADCAST_PORT)
+        self.unicast_socket = self.transport.unicast_socket(own_host.address, own_host.unicast_port)
+        self.multicast_socket = self.transport.multicast_socket(
+            SERVER_GROUP_BASE_MULTICAST_ADDRESS, SERVER_GROUP_MULTICAST_PORT)
+        # One multicast socket per group address, groups on the same address share it
+        self.multicast_sockets = {
+            (SERVER_GROUP_BASE_MULTICAST_ADDRESS, SERVER_GROUP_MULTICAST_PORT): self.multicast_socket
+        }
 
         self.on_multicast_delivered = None
         self.on_unicast_delivered = None
         self.on_broadcast_delivered = None
+        self.on_state_transfer_required = None
+        self.on_peer_activity = None
+        # Membership updates that ride along on reliable unicasts (SWIM), see set_piggyback
+        self.take_piggyback = None
+        self.on_piggyback = None
         self.on_host_failed = on_host_failed
 
         self.lock = threading.Lock()
+        self.unicast_lock = threading.RLock()
+
+        # Every host we heard of once, with the reliable unicast state per peer
+        self.hosts = HostRegistry(own_host)
+
+        # Wakes up select when a timer is scheduled from another thread
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._wakeup_sender.setblocking(False)
+        self.timers = TimerQueue(clock=self.transport.clock, on_schedule=self._wakeup)
+
+        self.batcher = DatagramBatcher(on_pending=self._on_batch_pending)
+        self._batch_flush_timer = None
+
+        # Frames above FRAGMENT_SIZE are split, reassembly happens on the socket thread only
+        self.fragment_sender = FragmentSender(own_host.id, own_host.unicast_port)
+        self.fragment_lock = threading.Lock()
+        self.reassembler = FragmentReassembler()
+        self._fragment_check_timer = None
+
+        # Local time of the last datagram per destination address, lets the heartbeat skip busy links
+        self.last_sent = {}
 
         self.sockets = [self.unicast_socket, self.broadcast_socket, self.multicast_socket]
 
+    def start(self):
+        self.transport.start(self)
+
     def set_on_broadcast_delivered(self, on_broadcast_received):
         self.on_broadcast_delivered = on_broadcast_received
 
@@ -47,9 +105,51 @@ class SocketService(Thread):
     def set_on_multicast_delivered(self, on_multicast_received):
         self.on_multicast_delivered = on_multicast_received
 
+    def set_on_state_transfer_required(self, on_state_transfer_required):
+        self.on_state_transfer_required = on_state_transfer_required
+
+    def set_on_peer_activity(self, on_peer_activity):
+        self.on_peer_activity = on_peer_activity
+
+    def set_piggyback(self, take_piggyback, on_piggyback):
+        # take_piggyback() returns what goes along with the next reliable unicast (HB included) or None,
+        # on_piggyback(host, data) gets it at the receiver
+        self.take_piggyback = take_piggyback
+        self.on_piggyback = on_piggyback
+
     def add_group(self, group):
         if group not in self.groups:
             self.groups.append(group)
+            address = (group.address, group.port)
+            if address not in self.multicast_sockets:
+                sock = self.transport.multicast_socket(*address)
+                self.multicast_sockets[address] = sock
+                self._add_socket(sock)
+
+    def remove_group(self, group):
+        if group in self.groups:
+            self.groups.remove(group)
+        address = (group.address, group.port)
+        sock = self.multicast_sockets.get(address)
+        if sock is None or sock == self.multicast_socket:
+            return
+        if not any((other.address, other.port) == address for other in self.groups):
+            del self.multicast_sockets[address]
+            self._remove_socket(sock)
+
+    def _add_socket(self, sock):
+        self.sockets.append(sock)
+        self.transport.add_socket(self, sock)
+        # select has to pick up the new socket
+        self._wakeup()
+
+    def _remove_socket(self, sock):
+        if sock in self.sockets:
+            self.sockets.remove(sock)
+        self.transport.remove_socket(self, sock)
+
+    def _get_multicast_socket(self, group):
+        return self.multicast_sockets.get((group.address, group.port), self.multicast_socket)
 
     def _get_base_header(self, method):
         return {
@@ -61,17 +161,10 @@ class SocketService(Thread):
         }
 
     def _to_message(self, header: dict, payload):
-        json_header = json.dumps(header)
-        return HEADER_DELIMITER.join([json_header, str(payload)]).encode()
+        return self.codec.encode(header, payload)
 
     def _from_message(self, message):
-        decoded_message = message.decode('utf-8')
-        message_chunks = decoded_message.split(HEADER_DELIMITER)
-        header = json.loads(message_chunks[0])
-        payload = ''
-        if len(message_chunks) > 1:
-            payload = message_chunks[1]
-        return header, payload
+        return decode_message(message)
 
     def send_broadcast(self, method: str, message: str = ''):
 
@@ -82,7 +175,8 @@ class SocketService(Thread):
             print(
                 f"[BROADCAST:SENT:{method}] {header} {message} to {self.broadcast_socket.address}:{self.broadcast_socket.port}")
 
-        self.broadcast_socket.sendto(
+        self._send_datagram(
+            self.broadcast_socket,
             encoded_message,
             (self.broadcast_socket.address, self.broadcast_socket.port)
         )
@@ -90,7 +184,7 @@ class SocketService(Thread):
     def _on_broadcast_received(self, header, host: Host, method: str, message: str):
         # Note: Broadcast is not dynamic
         if host.id != self.own_host.id:
-            host.unicast_port = message
+            host.unicast_port = int(message)
             if DEBUG:
                 print(f"[BROADCAST:REC:{method}] {message} from {host.address}:{host.unicast_port} ({host.id})")
             self.on_broadcast_delivered(host, method, message)
@@ -100,36 +194,135 @@ class SocketService(Thread):
             return
 
         header = self._get_base_header(method)
+        address = (host.address, int(host.unicast_port))
+        piggyback = self.take_piggyback() if self.take_piggyback else None
+        if piggyback:
+            header['pb'] = piggyback
+
+        with self.unicast_lock:
+            channel = self._get_channel(host.id)
+            channel.address = address
+            header['ep'] = channel.epoch
+            header['seq'] = channel.next_seq()
+            encoded_message = self._to_message(header, message)
 
-        if method != "ACK":
-            host.message_seq = host.message_seq + 1
-            header['seq'] = host.message_seq
+            if DEBUG:
+                if method != "HB" or HEARTBEAT:
+                    print(
+                        f"[UNICAST:SENT:{method}] {header} {message} to {host.address}:{host.unicast_port} ({host.id})")
 
-        encoded_message = self._to_message(header, message)
+            if channel.can_send():
+                self._transmit_unicast(channel, header['seq'], encoded_message, method)
+            else:
+                if DEBUG:
+                    print(f"[UNICAST] Window to {host.id} full, queue message {header['seq']}")
+                channel.backlog.append((header['seq'], encoded_message, method))
 
-        if method != "ACK":
-            if host.open_ack:
-                print("Resent Message Unicast")
-                self.unicast_socket.sendto(
-                    host.last_message_sent,
-                    (host.address, int(host.unicast_port))
-                )
+    def send_unreliable_unicast(self, host: Host, method: str, message):
+        # Sent once, without sequence number and acknowledgement, for protocols that retry on their own
+        if not host:
+            return
+        if DEBUG:
+            print(f"[UNICAST:SENT:{method}] {message} to {host.address}:{host.unicast_port} ({host.id})")
+        self._send_datagram(
+            self.unicast_socket,
+            self._to_message(self._get_base_header(method), message),
+            (host.address, int(host.unicast_port)),
+            method
+        )
 
-        if DEBUG and not method == 'ACK':
-            if method != "HB" or HEARTBEAT:
-                print(
-                    f"[UNICAST:SENT:{method}] {header} {message} to {host.address}:{host.unicast_port} ({host.id})")
+    def _get_channel(self, peer_id):
+        return self.hosts.get_channel(peer_id)
 
-        host.last_message_sent = encoded_message
-        self.unicast_socket.sendto(
-            encoded_message,
-            (host.address, int(host.unicast_port))
+    def _next_epoch(self):
+        return self.hosts.next_epoch()
+
+    def _transmit_unicast(self, channel, seq, encoded_message, method):
+        channel.on_sent(seq, encoded_message, self.timers.clock())
+        self._send_datagram(self.unicast_socket, encoded_message, channel.address, method)
+        self._arm_retransmit_timer(channel)
+
+    def _arm_retransmit_timer(self, channel):
+        if channel.timer is None and channel.unacked:
+            channel.timer = self.timers.schedule(channel.rto, self._on_retransmit_timeout, channel)
+
+    def _retransmit_oldest(self, channel):
+        seq, outstanding = channel.oldest_unacked()
+        if seq is None:
+            return
+        if DEBUG:
+            print(f"[UNICAST:RESENT] seq {seq} to {channel.address[0]}:{channel.address[1]} (rto {channel.rto:.3f})")
+        channel.on_retransmitted(seq, self.timers.clock())
+        self._send_datagram(self.unicast_socket, outstanding.data, channel.address)
+
+    def _on_retransmit_timeout(self, channel):
+        with self.unicast_lock:
+            channel.timer = None
+            seq, outstanding = channel.oldest_unacked()
+            if seq is None:
+                return
+            if outstanding.transmissions > UNICAST_MAX_RETRANSMITS:
+                print(f"[UNICAST] No ack from {channel.address[0]}:{channel.address[1]}, drop {len(channel.unacked)} "
+                      f"unacknowledged and {len(channel.backlog)} queued messages")
+                channel.reset_send(self._next_epoch())
+                return
+            channel.back_off()
+            self._retransmit_oldest(channel)
+            self._arm_retransmit_timer(channel)
+
+    def _on_ack_received(self, host: Host, header):
+        with self.unicast_lock:
+            channel = self.hosts.find_channel(host.id)
+            if not channel or header.get('ep') != channel.epoch or header.get('ack') is None:
+                return
+            if channel.on_ack(header.get('ack'), self.timers.clock()):
+                self._retransmit_oldest(channel)
+            if channel.timer:
+                channel.timer.cancel()
+                channel.timer = None
+            for seq, encoded_message, method in channel.take_sendable():
+                self._transmit_unicast(channel, seq, encoded_message, method)
+            self._arm_retransmit_timer(channel)
+
+    def _send_ack(self, host: Host, epoch, ack):
+        header = self._get_base_header("ACK")
+        header['ep'] = epoch
+        header['ack'] = ack
+        self._send_datagram(
+            self.unicast_socket,
+            self._to_message(header, ack),
+            (host.address, int(host.unicast_port)),
+            "ACK"
         )
 
     def _on_unicast_received(self, header, host: Host, method: str, message: str):
         if method == 'ACK':
-            host.open_ack = False
-        elif method == "SEQ/PROP":
+            self._on_ack_received(host, header)
+            return
+        if method == 'FRAG_NACK':
+            self._on_fragment_nack(message)
+            return
+        if 'pb' in header and self.on_piggyback:
+            self.on_piggyback(host, header['pb'])
+
+        if 'ep' not in header or 'seq' not in header:
+            # Sender without a reliable channel, deliver as is
+            self._deliver_unicast(header, host, method, message)
+            return
+
+        with self.unicast_lock:
+            channel = self._get_channel(host.id)
+            ready = channel.receive(header['ep'], header['seq'], (header, host, method, message))
+            if ready is None:
+                return
+            ack = channel.cumulative_ack()
+        self._send_ack(host, header['ep'], ack)
+
+        for item in ready:
+            self._deliver_unicast(*item)
+
+    def _deliver_unicast(self, header, host: Host, method: str, message: str):
+        if method == "SEQ/PROP":
             if DEBUG:
                 print(
                     f"[UNICAST:REC:{method}] {message} from {host.address}:{host.unicast_port} ({host.id})")
@@ -145,36 +338,34 @@ class SocketService(Thread):
             if not hold_back_message:
                 print("Multicast could not get message for proposal", message_id)
                 return
-            if 'suggested_numbers' not in hold_back_message:
-                hold_back_message['suggested_numbers'] = {}
+            if hold_back_message.suggested_numbers is None:
+                hold_back_message.suggested_numbers = {}
 
-            hold_back_message['suggested_numbers'][header.get('id')] = suggested_sequence_number
+            hold_back_message.suggested_numbers[header.get('id')] = suggested_sequence_number
 
             if DEBUG:
                 print(f"Proposal {message_id} with {group.participants} participants")
 
-            if len(hold_back_message['suggested_numbers'].keys()) >= len(group.participants) and self.own_host.id in \
-                    hold_back_message['suggested_numbers'].keys():
-                # choose smallest possible value for identity if there are multiple suggesting this sequence
+            if len(hold_back_message.suggested_numbers) >= len(group.participants) and self.own_host.id in \
+                    hold_back_message.suggested_numbers:
+                # The agreed number is the largest (sequence, process id) proposal, ties are broken by process id
                 if DEBUG:
-                    print(f"Number of participants {hold_back_message['suggested_numbers']}")
-                max_value = 0
-                max_key = None
-                for [k, v] in hold_back_message['suggested_numbers'].items():
-                    if v > max_value:
-                        max_value = v
-                        if not max_key or max_key < k:
-                            max_key = k
+                    print(f"Number of participants {hold_back_message.suggested_numbers}")
+                max_value, max_key = max((v, k) for k, v in hold_back_message.suggested_numbers.items())
 
                 self.send_group_multicast(group, "SEQ/ANNOUNCEMENT", json.dumps({
                     "m_id": message_id,
                     "max_suggested_seq": max_value,
                     "max_suggested_process_id": max_key
                 }))
+        elif method == "REL/STATE" or method == "SEQ/STATE":
+            self._on_state_message_received(host, method, message)
+        elif method == "SEQ/HANDOVER" or method == "SEQ/HANDOVER_STATE":
+            self._on_handover_message_received(host, method, message)
+        elif method == "SEQ/RETRY":
+            self._on_retry_message_received(host, message)
         else:
-            self.send_unicast(host, "ACK", header.get('seq'))
-            host.last_message_seq = header.get('seq')
-            if DEBUG and not method == 'ACK':
+            if DEBUG:
                 if method != "HB" or HEARTBEAT:
                     print(f"[UNICAST:REC:{method}] {message} from {host.address}:{host.unicast_port} ({host.id})")
             self.on_unicast_delivered(host, method, message)
@@ -183,8 +374,8 @@ class SocketService(Thread):
         if DEBUG:
             print(
                 f"[MULTICAST:RESENT:{method}] {header} {message if not method == 'GS/OV' else ''} "
-                f"to {self.multicast_socket.address}:{self.multicast_socket.port}")
-        header["resent"] = seq
+                f"to {group.address}:{group.port}")
+        header = {**header.get('rel_orig_header', header), "resent": seq}
 
         self._resend_reliable_group_multicast(
             group,
@@ -193,10 +384,13 @@ class SocketService(Thread):
         )
 
     def _resend_reliable_group_multicast(self, group, original_header, original_message):
+        multicast_socket = self._get_multicast_socket(group)
         if DEBUG:
             print(
                 f"[MULTICAST:RESENT] {original_header} "
-                f"to {self.multicast_socket.address}:{self.multicast_socket.port}")
+                f"to {multicast_socket.address}:{multicast_socket.port}")
+        # A message that reached us as a resend already carries the header of its sender, do not nest it
+        original_header = original_header.get('rel_orig_header', original_header)
         header = {**original_header}
         header["id"] = self.own_host.id
         header["t"] = self.own_host.host_type
@@ -206,9 +400,10 @@ class SocketService(Thread):
 
         encoded_message = self._to_message(header, original_message)
 
-        self.multicast_socket.sendto(
+        self._send_datagram(
+            multicast_socket,
             encoded_message,
-            (self.multicast_socket.address, self.multicast_socket.port)
+            (multicast_socket.address, multicast_socket.port)
         )
 
     def _find_group(self, group_identifier):
@@ -217,46 +412,59 @@ class SocketService(Thread):
     def _find_hold_back_message_by_id(self, group, message_id):
         if not group:
             return
-        return next((item for item in group.hold_back_queue if item.get('header', {}).get('m_id') == message_id), None)
+        return group.hold_back_queue.get_by_id(message_id)
 
     def _find_hold_back_message_by_sender(self, group, sender_id):
-        return next((item for item in group.hold_back_queue if item.get('header', {}).get('id') == sender_id), None)
+        return next((item for item in group.hold_back_queue if item.header.get('id') == sender_id), None)
 
     def _find_hold_back_message_by_deliverable(self, group, seq):
-        return next(
-            (item for item in group.hold_back_queue if item.get('max_suggested_seq') == seq
-             and item.get('state') == DeliveryState.DELIVERABLE),
-            None)
+        return group.hold_back_queue.get_deliverable(seq)
+
+    def _is_in_history(self, group, seq, message_id):
+        entries = group.message_history.get(None, seq)
+        if entries:
+            return any(entry.message_id == message_id for entry in entries)
+        return group.message_history.was_dropped(None, seq)
 
     def _send_reliable_multicast(self, header, group, message):
         with self.lock:
             header["g_ident"] = group.identifier
             if header['m'] != 'REL_NACK':
-                header['rel_seq'] = str(group.rel_seq)
+                header['rel_seq'] = group.rel_seq
 
             header['rel_delivered_seq'] = group.rel_delivered_seq
 
             encoded_message = self._to_message(header, message)
+            multicast_socket = self._get_multicast_socket(group)
 
-            self.multicast_socket.sendto(
+            self._send_datagram(
+                multicast_socket,
                 encoded_message,
-                (self.multicast_socket.address, self.multicast_socket.port)
+                (multicast_socket.address, multicast_socket.port),
+                header['m']
             )
             if header['m'] != 'REL_NACK':
-                group.rel_seq = int(group.rel_seq) + 1
+                group.rel_seq = group.rel_seq + 1
 
     def send_group_multicast(self, group, method: str, message: str = ''):
+        control = method == 'SEQ/ANNOUNCEMENT' or method == 'NACK'
+        if group.ordering == SEQUENCER_ORDER and not group.sequencer_id and not control:
+            # No sequencer (no leader yet or it failed): only the order of the sender, the view deltas and leader
+            # announcements sent meanwhile converge in any order
+            return self.send_fifo_group_multicast(group, method, message)
 
         header = self._get_base_header(method)
 
         header['m_id'] = str(uuid.uuid1())  # i
         if DEBUG:
             print(
-                f"[MULTICAST:SENT:{method}] {header} {message if not method == 'GS/OV' else ''} to {self.multicast_socket.address}:{self.multicast_socket.port}")
+                f"[MULTICAST:SENT:{method}] {header} {message if not method == 'GS/OV' else ''} to {group.address}:{group.port}")
 
-        # TODO: remove
-        if not method == 'SEQ/ANNOUNCEMENT' and not method == 'NACK':
-            self._add_message_to_hold_back(
+        # The own message waits in the hold-back queue for its final number like those of the other members
+        if not control:
+            if group.ordering == SEQUENCER_ORDER:
+                header['o'] = SEQUENCER_ORDER
+            hold_back_message = self._add_message_to_hold_back(
                 group=group,
                 host=self.own_host,
                 header=header,
@@ -266,35 +474,163 @@ class SocketService(Thread):
                 sequence_suggester=self.own_host.id,
                 state=DeliveryState.UNDELIVERABLE
             )
+            if group.ordering != SEQUENCER_ORDER:
+                self.timers.schedule(ISIS_PROPOSAL_TIMEOUT, self._on_proposal_timeout, group, hold_back_message)
 
         self._send_reliable_multicast(
             header,
             group,
             message
         )
+        return header
+
+    def send_fifo_group_multicast(self, group, method: str, message: str = ''):
+        # Reliable multicast without the ISIS rounds: members deliver the messages of a sender in the order it
+        # sent them, there is no order between senders. Enough for state that only one member changes
+        header = self._get_base_header(method)
+        header['m_id'] = str(uuid.uuid1())
+        header['o'] = FIFO_ORDER
+        if DEBUG:
+            print(f"[MULTICAST:SENT:{method}] {header} to {group.address}:{group.port}")
+        self._send_reliable_multicast(header, group, message)
+        return header
+
+    def set_sequencer(self, group, sequencer_id):
+        # Fixed sequencer order: the member sequencer_id (the leader) numbers the messages of the group, every
+        # message costs one announcement independent of the group size. Messages sent while the group has no
+        # sequencer are ordered with ISIS. A new sequencer first collects the numbers the members know
+        # (SEQ/HANDOVER) and continues after the highest one, so messages keep the numbers they already got
+        if group.ordering != SEQUENCER_ORDER or group.sequencer_id == sequencer_id:
+            return
+        group.sequencer_id = sequencer_id
+        is_sequencer = sequencer_id == self.own_host.id
+        if is_sequencer == group.is_sequencer:
+            return
+        group.is_sequencer = is_sequencer
+        self._stop_sequencer_handover(group)
+        if not is_sequencer:
+            return
+        if DEBUG:
+            print(f"[SEQUENCER] Taking over {group.identifier}")
+        others = [participant for participant in group.participants if participant.id != self.own_host.id]
+        group.sequencer_handover = {participant.id for participant in others}
+        if not others:
+            self._finish_sequencer_handover(group)
+            return
+        since = group.group_last_message_delivered_seq
+        request = json.dumps({'g_id': group.identifier, 'since': group.sequencer.get_sequence() if since is None
+                              else since})
+        for participant in others:
+            self.send_unicast(participant, "SEQ/HANDOVER", request)
+        group.sequencer_handover_timer = self.timers.schedule(SEQUENCER_HANDOVER_TIMEOUT,
+                                                              self._finish_sequencer_handover, group)
+
+    def _on_handover_message_received(self, host, method, message):
+        payload = json.loads(message)
+        group = self._find_group(payload.get('g_id'))
+        if not group:
+            return
+        if method == "SEQ/HANDOVER":
+            if group.is_sequencer and self.own_host.id > host.id:
+                # Two members took over at the same time, the larger id keeps the role like in the election
+                if DEBUG:
+                    print(f"[SEQUENCER] Keep sequencing {group.identifier}, {host.id} has to yield")
+            else:
+                self._stop_sequencer_handover(group)
+                group.is_sequencer = False
+                group.sequencer_id = host.id
+            self.send_unicast(host, "SEQ/HANDOVER_STATE", json.dumps({
+                'g_id': group.identifier,
+                'seq': group.sequencer.get_sequence(),
+                'ordered': self._get_known_orders(group, payload.get('since')),
+                'sequencer': group.is_sequencer,
+            }))
+        elif group.sequencer_handover is not None:
+            for message_id, seq, process_id in payload.get('ordered'):
+                self._on_order_announced(group, message_id, seq, process_id)
+            group.sequencer.sequence = max(group.sequencer.get_sequence(), payload.get('seq'))
+            if payload.get('sequencer'):
+                self._stop_sequencer_handover(group)
+                group.is_sequencer = False
+                group.sequencer_id = host.id
+                return
+            group.sequencer_handover.discard(host.id)
+            if not group.sequencer_handover:
+                self._finish_sequencer_handover(group)
+
+    def _get_known_orders(self, group, since):
+        # Numbers above since this member delivered or holds back: [message id, seq, process id]
+        orders = [[entry.message_id, entry.max_suggested_seq, entry.max_suggested_process_id]
+                  for entry in group.hold_back_queue
+                  if entry.state == DeliveryState.DELIVERABLE and entry.max_suggested_seq > since]
+        last_delivered = group.group_last_message_delivered_seq
+        for seq in range(since + 1, (since if last_delivered is None else last_delivered) + 1):
+            for entry in group.message_history.get(None, seq) or ():
+                orders.append([entry.message_id, seq, entry.max_suggested_process_id])
+        orders.extend([message_id, seq, process_id] for message_id, (seq, process_id, _) in
+                      group.early_orders.items() if seq > since)
+        return orders
+
+    def _stop_sequencer_handover(self, group):
+        if group.sequencer_handover_timer:
+            group.sequencer_handover_timer.cancel()
+        group.sequencer_handover_timer = None
+        group.sequencer_handover = None
+
+    def _finish_sequencer_handover(self, group):
+        self._stop_sequencer_handover(group)
+        if not group.is_sequencer:
+            return
+        if DEBUG:
+            print(f"[SEQUENCER] Sequencing {group.identifier} from {group.sequencer.get_sequence() + 1}")
+        # Messages that did not get a number from the former sequencer, in the order they arrived here
+        for entry in group.hold_back_queue:
+            if entry.state == DeliveryState.UNDELIVERABLE and entry.header.get('o') == SEQUENCER_ORDER:
+                self._order_message(group, entry)
+
+    def _order_message(self, group, entry):
+        last_delivered = group.group_last_message_delivered_seq
+        seq = max(group.sequencer.get_sequence(), 0 if last_delivered is None else last_delivered) + 1
+        group.sequencer.sequence = seq
+        header = self.send_group_multicast(group, "SEQ/ANNOUNCEMENT", json.dumps({
+            "m_id": entry.message_id,
+            "max_suggested_seq": seq,
+            "max_suggested_process_id": self.own_host.id
+        }))
+        # Our own announcement comes back as well, the number is taken right away
+        self._on_order_announced(group, entry.message_id, seq, self.own_host.id, self._get_rel_id(header))
+
+    def _on_sequenced_message_received(self, host, group, header, method, message):
+        hold_back_message = self._find_hold_back_message_by_id(group, header.get('m_id'))
+        if not hold_back_message and host.id == self.own_host.id:
+            # Ours are held back since sending, it was ordered (e.g. at a handover) and delivered already
+            return
+        if not hold_back_message:
+            hold_back_message = self._add_message_to_hold_back(
+                group=group,
+                host=host,
+                header=header,
+                method=method,
+                message=message,
+                sequence=group.sequencer.get_sequence(),
+                sequence_suggester=self.own_host.id,
+                state=DeliveryState.UNDELIVERABLE
+            )
+        early_order = group.early_orders.pop(hold_back_message.message_id, None)
+        if early_order:
+            self._on_order_announced(group, hold_back_message.message_id, *early_order)
+        elif group.is_sequencer and group.sequencer_handover is None and \
+                hold_back_message.state == DeliveryState.UNDELIVERABLE:
+            self._order_message(group, hold_back_message)
 
     def _add_message_to_hold_back(self, group, host, header, method, message, sequence, sequence_suggester, state,
                                   resent=False):
-        hold_back_message = {
-            "host": host,
-            "header": header,
-            "method": method,
-            "message": message,
-            'resent': resent,
-            "max_suggested_seq": sequence,  # si
-            "max_suggested_process_id": sequence_suggester,  # si
-            "state": state
-        }
-        group.hold_back_queue.append(hold_back_message)
+        hold_back_message = HoldBackEntry(host, header, method, message, sequence, sequence_suggester, state, resent)
+        group.hold_back_queue.add(hold_back_message)
         return hold_back_message
 
     def _add_rel_message_to_hold_back(self, host, group, seq, header, message):
-        hold_back_message = {
-            "seq": seq,
-            "host": host,
-            "header": header,
-            "message": message,
-        }
+        hold_back_message = RelHoldBackEntry(seq, host, header, message)
         if not host.id in group.rel_hold_back_queue:
             group.rel_hold_back_queue[host.id] = []
 
@@ -302,30 +638,27 @@ class SocketService(Thread):
         return hold_back_message
 
     def _check_queue_for_max_number(self, group):
-
-        group.hold_back_queue = sorted(group.hold_back_queue, key=lambda t: t.get("max_suggested_process_id"))
-        group.hold_back_queue = sorted(group.hold_back_queue,
-                                       key=lambda t: 0 if t.get("state") == DeliveryState.UNDELIVERABLE else 1)
-        group.hold_back_queue = sorted(group.hold_back_queue, key=lambda t: t.get("max_suggested_seq"))
-
-        list_copy = []
-        for item in group.hold_back_queue:
-            if DEBUG:
-                print("Last", group.group_last_message_delivered_seq, item.get('max_suggested_seq'), item.get("state"))
-                if item.get('state') == DeliveryState.UNDELIVERABLE:
-                    print("MESSAGE", item.get('header'), item.get('header'), item.get('suggested_numbers'))
-            if int(item.get('max_suggested_seq')) == group.group_last_message_delivered_seq + 1 and item.get(
-                    "state") == DeliveryState.DELIVERABLE:
-                group.group_last_message_delivered_seq = group.group_last_message_delivered_seq + 1
-                if DEBUG:
-                    print("DELIVER MESSAGE WITH SEQUENCE NUMBER", item.get('max_suggested_seq'),
-                          item.get('header', {}))
-                self.on_multicast_delivered(item.get("host"), item.get("method"), item.get("message"),
-                                            item.get("header"))
-                group.message_history[item.get('max_suggested_seq')] = item
+        if group.group_last_message_delivered_seq is None:
+            return
+        while True:
+            if group.ordering == SEQUENCER_ORDER:
+                item = group.hold_back_queue.pop_seq(group.group_last_message_delivered_seq + 1)
             else:
-                list_copy.append(item)
-        group.hold_back_queue = list_copy
+                item = group.hold_back_queue.pop_next()
+            if not item:
+                break
+            group.group_last_message_delivered_seq = max(group.group_last_message_delivered_seq,
+                                                         item.max_suggested_seq)
+            group.last_delivered_order = (item.max_suggested_seq, item.max_suggested_process_id)
+            if DEBUG:
+                print("DELIVER MESSAGE WITH SEQUENCE NUMBER", item.max_suggested_seq, item.header)
+            self.on_multicast_delivered(item.host, item.method, item.message, item.header)
+            item.rel_ids = (self._get_rel_id(item.header),) + item.rel_ids
+            # Messages agreed on the same number (told apart by the process id) share one history entry
+            entries = group.message_history.get(None, item.max_suggested_seq) or []
+            group.message_history.put(None, item.max_suggested_seq, entries + [item])
+        if DEBUG and len(group.hold_back_queue) > 0:
+            print("Last", group.group_last_message_delivered_seq, "waiting in hold back", len(group.hold_back_queue))
 
     def _on_reliable_multicast_received(self, header, host, method, message):
         if 't' in header and header.get('t') == 'monitor':
@@ -339,148 +672,183 @@ class SocketService(Thread):
             print(f"Not in group {group_identifier}, discard")
             return
 
+        if 'rel_orig_header' not in header and header.get('rel_delivered_seq') is not None:
+            group.record_acknowledgements(header.get('id'), header.get('rel_delivered_seq'))
+
         if method == "REL_NACK":
             payload = json.loads(message)
             missing_sender_id = payload.get('s')
-            missing_seq = payload.get('seq')
-            if missing_sender_id in group.rel_message_history:
-                process_messages = group.rel_message_history[missing_sender_id]
-                if missing_seq in process_messages:
-                    missed_message = group.rel_message_history[missing_sender_id][missing_seq]
-                    if missed_message:
-                        self._resend_reliable_group_multicast(group,
-                                                              missed_message.get("header"),
-                                                              missed_message.get("message")
-                                                              )
+            missing_seq = int(payload.get('seq'))
+            missed_message = group.rel_message_history.get(missing_sender_id, missing_seq)
+            if missed_message:
+                self._resend_reliable_group_multicast(group, missed_message.header, missed_message.message)
+            elif group.rel_message_history.was_dropped(missing_sender_id, missing_seq):
+                self._send_state_message(host, group, "REL/STATE", {
+                    "s": missing_sender_id,
+                    "seq": group.rel_message_history.get_dropped_seq(missing_sender_id),
+                })
         else:
             host = host
             if 'rel_orig_header' in header:
                 original_header = header['rel_orig_header']
-                host = Host(
-                    id=original_header['id'],
-                    address=original_header['a'],
-                    unicast_port=original_header['p'],
-                    host_type=original_header['t']
-                )
+                host = self.hosts.intern(original_header['id'], original_header['a'], original_header['p'],
+                                         original_header['t'])
 
-            acknowledgements = header.get('rel_delivered_seq')
+            rel_seq = int(header['rel_seq'])
+            # A message held back shows that everything of its sender before it is missing as well
+            acknowledgements = {**(header.get('rel_delivered_seq') or {}), host.id: rel_seq - 1}
 
             if host.id not in group.rel_delivered_seq:
-                group.rel_delivered_seq[host.id] = int(header['rel_seq']) - 1
-
-            last_delivered_from_process = group.rel_delivered_seq[host.id]
-
-            self._add_rel_message_to_hold_back(host, group, header['rel_seq'], header, message)
-            group.rel_hold_back_queue[host.id] = sorted(group.rel_hold_back_queue[host.id],
-                                                        key=lambda t: t.get("seq"))
-            hold_back_copy = []
-            for item in group.rel_hold_back_queue[host.id]:
-                process_group_seq = item['seq']
-                if int(process_group_seq) == last_delivered_from_process + 1:
-                    if host.id not in group.rel_delivered_seq:
-                        group.rel_delivered_seq[host] = -1
-                    group.rel_delivered_seq[host.id] = group.rel_delivered_seq[host.id] + 1
-                    if host.id not in group.rel_message_history:
-                        group.rel_message_history[host.id] = {}
-                    group.rel_message_history[host.id][process_group_seq] = item
-
-                    self._on_multicast_received(host, group, item['header'], item['header']['m'], item['message'])
-                elif int(process_group_seq) <= last_delivered_from_process:
-                    if DEBUG:
-                        pass
-                        # print("already seen, drop", process_group_seq)
-                else:
-                    hold_back_copy.append(item)
-                    missing_messages = {}
-                    for ack_host, ack_seq in acknowledgements.items():
-                        if ack_host not in group.rel_delivered_seq:
-                            group.rel_delivered_seq[ack_host] = int(ack_seq) - 1
-                        if ack_seq > group.rel_delivered_seq[ack_host]:
-                            missing_messages[ack_host] = ack_seq
-
-                    if len(missing_messages.keys()) > 0:
-                        for host_id, last_acK in sorted(missing_messages.items(), key=lambda t: t[1]):
-                            for sequence_number in range(group.rel_delivered_seq[host_id] + 1, last_acK + 1):
-                                existing = [holdback for holdback in group.rel_hold_back_queue[host_id]
-                                            if holdback.get("seq") == sequence_number]
-                                if len(existing) == 0:
-                                    self._send_rel_group_multicast_nack(group, host_id, sequence_number)
-
-            group.rel_hold_back_queue[host.id] = hold_back_copy
+                # Messages the sender did not deliver to itself yet may still be on the way to us as well
+                baseline = rel_seq - 1
+                if 'rel_orig_header' not in header:
+                    baseline = min(baseline, (header.get('rel_delivered_seq') or {}).get(host.id, -1))
+                group.rel_delivered_seq[host.id] = baseline
+                group.rel_joined_seq[host.id] = baseline
+            # The acknowledgement vector is only read on receipt, the held back and kept header goes without it
+            header.pop('rel_delivered_seq', None)
+
+            if 'resent' in header and rel_seq <= group.rel_delivered_seq[host.id]:
+                # A totally ordered message we asked for with NACK, skipped by our reliable layer since it was
+                # sent before we joined. Duplicates are filtered by the message history
+                self._on_multicast_received(host, group, header, method, message)
+                return
+
+            self._add_rel_message_to_hold_back(host, group, rel_seq, header, message)
+            if self._deliver_rel_hold_back(group, host.id):
+                self._schedule_rel_nack(group, acknowledgements)
+
+    def _deliver_rel_hold_back(self, group, sender_id):
+        # Delivers everything from sender_id that is in order now, returns whether messages are still held back
+        hold_back_copy = []
+        for item in sorted(group.rel_hold_back_queue.get(sender_id, []), key=_get_seq):
+            process_group_seq = item.seq
+            if process_group_seq == group.rel_delivered_seq[sender_id] + 1:
+                group.rel_delivered_seq[sender_id] = process_group_seq
+                group.rel_message_history.put(sender_id, process_group_seq, item)
+
+                self._on_multicast_received(item.host, group, item.header, item.header['m'], item.message)
+            elif process_group_seq > group.rel_delivered_seq[sender_id]:
+                hold_back_copy.append(item)
+
+        group.rel_hold_back_queue[sender_id] = hold_back_copy
+        return len(hold_back_copy) > 0
+
+    def _schedule_rel_nack(self, group, acknowledgements):
+        pending = group.rel_nack_acknowledgements
+        for host_id, seq in acknowledgements.items():
+            if seq > pending.get(host_id, -1):
+                pending[host_id] = seq
+        if not group.rel_nack_timer:
+            group.rel_nack_timer = self.timers.schedule(REL_NACK_DELAY, self._on_rel_nack_timeout, group)
+
+    def _on_rel_nack_timeout(self, group):
+        group.rel_nack_timer = None
+        acknowledgements, group.rel_nack_acknowledgements = group.rel_nack_acknowledgements, {}
+        self._request_missing_rel_messages(group, acknowledgements)
+
+    def _request_missing_rel_messages(self, group, acknowledgements):
+        missing_messages = {}
+        for ack_host, ack_seq in acknowledgements.items():
+            if ack_host not in group.rel_delivered_seq:
+                group.rel_delivered_seq[ack_host] = int(ack_seq) - 1
+                group.rel_joined_seq[ack_host] = int(ack_seq) - 1
+            if ack_seq > group.rel_delivered_seq[ack_host]:
+                missing_messages[ack_host] = ack_seq
+
+        for host_id, last_ack in sorted(missing_messages.items(), key=lambda t: t[1]):
+            existing = {holdback.seq for holdback in group.rel_hold_back_queue.get(host_id, [])}
+            for sequence_number in range(group.rel_delivered_seq[host_id] + 1, last_ack + 1):
+                if sequence_number not in existing:
+                    self._send_rel_group_multicast_nack(group, host_id, sequence_number)
+
+    def _get_rel_id(self, header):
+        original_header = header.get('rel_orig_header', header)
+        return original_header.get('id'), original_header.get('rel_seq')
+
+    def _send_state_message(self, host, group, method, payload):
+        # The requested messages are not in our history anymore, the requester has to skip them
+        # and catch up via state transfer
+        if DEBUG:
+            print(f"[STATE] {method} {payload} to {host.id}")
+        payload['g_id'] = group.identifier
+        self.send_unicast(host, method, json.dumps(payload))
+
+    def _on_state_message_received(self, host, method, message):
+        payload = json.loads(message)
+        group = self._find_group(payload.get('g_id'))
+        if not group:
+            return
+        seq = payload.get('seq')
+        if method == "REL/STATE":
+            sender_id = payload.get('s')
+            if seq <= group.rel_delivered_seq.get(sender_id, -1):
+                return
+            group.rel_delivered_seq[sender_id] = seq
+            self._deliver_rel_hold_back(group, sender_id)
+        else:
+            if group.group_last_message_delivered_seq is not None and seq <= group.group_last_message_delivered_seq:
+                return
+            group.group_last_message_delivered_seq = seq
+            group.hold_back_queue.drop_until(seq)
+            self._check_queue_for_max_number(group)
+        if DEBUG:
+            print(f"[STATE] Skipped evicted messages of {group.identifier} up to {seq}, state transfer required")
+        if self.on_state_transfer_required:
+            self.on_state_transfer_required(group)
 
     def _on_multicast_received(self, host: Host, group, header, method, message: str):
 
-        if method == "NACK":
+        if header.get('o') == FIFO_ORDER:
+            self.on_multicast_delivered(host, method, message, header)
+
+        elif method == "NACK":
             payload = json.loads(message)
             missing_sequences = json.loads(payload.get('seq'))
+            dropped_sequences = []
             for missing_seq in missing_sequences:
-                if missing_seq in group.message_history:
-                    missed_message = group.message_history[missing_seq]
-                    if missed_message:
-                        if DEBUG:
-                            print("RESENT MESSAGE", missing_seq)
+                missed_messages = group.message_history.get(None, missing_seq)
+                if not missed_messages:
+                    # A message may have its number here but wait for an earlier one
+                    hold_back_message = self._find_hold_back_message_by_deliverable(group, missing_seq)
+                    missed_messages = [hold_back_message] if hold_back_message else []
+                if missed_messages:
+                    if DEBUG:
+                        print("RESENT MESSAGE", missing_seq)
+                    for missed_message in missed_messages:
                         self.resend_group_multicast(
                             group,
                             missing_seq,
-                            missed_message.get("header"),
-                            missed_message.get("method"),
-                            missed_message.get("message"),
+                            missed_message.header,
+                            missed_message.method,
+                            missed_message.message,
                         )
+                elif group.message_history.was_dropped(None, missing_seq):
+                    dropped_sequences.append(missing_seq)
+            if len(dropped_sequences) > 0:
+                self._send_state_message(host, group, "SEQ/STATE", {"seq": max(dropped_sequences)})
 
         elif method == "SEQ/ANNOUNCEMENT":
             message_payload = json.loads(message)
             message_id = message_payload.get("m_id")
             max_suggested_seq = message_payload.get("max_suggested_seq")
             max_suggested_process_id = message_payload.get("max_suggested_process_id")
-            group.sequencer.sequence = max(group.sequencer.get_sequence(), max_suggested_seq)
-            hold_back_message = self._find_hold_back_message_by_id(group, message_id)
-
             if DEBUG:
                 print("Received announcement for ", max_suggested_seq, message_id)
-
-            if not hold_back_message:
-                if DEBUG:
-                    print("Multicast could not get message for announcement, probably already delivered", message_id)
-                return
-
-            hold_back_message['max_suggested_seq'] = max_suggested_seq
-            hold_back_message['max_suggested_process_id'] = max_suggested_process_id
-            hold_back_message['state'] = DeliveryState.DELIVERABLE
-
-            if not group.group_last_message_delivered_seq:
-                group.group_last_message_delivered_seq = max_suggested_seq - 1
-
-            if max_suggested_seq <= group.group_last_message_delivered_seq:
-                if DEBUG:
-                    print(
-                        f"Got lower sequence number then expected: current: {group.group_last_message_delivered_seq}, "
-                        f"got {max_suggested_seq}; discard message")
-                group.hold_back_queue.remove(hold_back_message)
-                return
-            elif max_suggested_seq > group.group_last_message_delivered_seq + 1:
-                # TODO: Dont request the messages we already have!
-                sequences = list(range(group.group_last_message_delivered_seq + 1, max_suggested_seq))
-                seq_copy = []
-                for sq in sequences:
-                    if not self._find_hold_back_message_by_deliverable(group, sq):
-                        seq_copy.append(sq)
-                sequences = seq_copy
-                if DEBUG:
-                    print(f"MISSING MESSAGE; GOT {max_suggested_seq},  SENDING NACK FOR ", sequences)
-                self._send_group_multicast_nack(group, json.dumps(sequences))
-
-            self._check_queue_for_max_number(group)
+            self._on_order_announced(group, message_id, max_suggested_seq, max_suggested_process_id,
+                                     self._get_rel_id(header))
 
         else:
             # https://studylib.net/doc/7830646/isis-algorithm-for-total-ordering-of-messages
             if 'resent' in header:
                 resent_number = int(header.get('resent'))
-                if resent_number not in group.message_history:
+                if not self._is_in_history(group, resent_number, header.get('m_id')):
                     if DEBUG:
                         print("RECEIVED RESENT MESSAGE!", resent_number, method)
                     hold_back_message = self._find_hold_back_message_by_id(group, header.get('m_id'))
                     if hold_back_message:
                         group.hold_back_queue.remove(hold_back_message)
+                    group.early_orders.pop(header.get('m_id'), None)
                     self._add_message_to_hold_back(
                         group=group,
                         host=host,
@@ -500,31 +868,111 @@ class SocketService(Thread):
                         f"[MULTICAST:REC:{method}] {header}  {message if not method == 'GS/OV' else ''}"
                         f" from {host.address}:{host.unicast_port} ({host.id})")
 
-                group.sequencer.increment_sequence()
-                sequence = group.sequencer.get_sequence()
+                if header.get('o') == SEQUENCER_ORDER:
+                    self._on_sequenced_message_received(host, group, header, method, message)
+                    return
+                self._propose(host, group, header, method, message)
 
-                hold_back_message = self._find_hold_back_message_by_id(group, header.get('m_id'))
-                if not hold_back_message:
-                    self._add_message_to_hold_back(
-                        group=group,
-                        host=host,
-                        header=header,
-                        method=method,
-                        message=message,
-                        sequence=sequence,
-                        sequence_suggester=self.own_host.id,
-                        state=DeliveryState.UNDELIVERABLE
-                    )
+    def _propose(self, host, group, header, method, message):
+        group.sequencer.increment_sequence()
+        sequence = group.sequencer.get_sequence()
+
+        hold_back_message = self._find_hold_back_message_by_id(group, header.get('m_id'))
+        if not hold_back_message:
+            self._add_message_to_hold_back(
+                group=group,
+                host=host,
+                header=header,
+                method=method,
+                message=message,
+                sequence=sequence,
+                sequence_suggester=self.own_host.id,
+                state=DeliveryState.UNDELIVERABLE
+            )
+
+        self.send_unicast(
+            host,
+            "SEQ/PROP",
+            json.dumps({
+                'm_id': header.get('m_id'),
+                's_seq': sequence,
+                'g_id': group.identifier,
+            }),
+        )
+
+    def _on_proposal_timeout(self, group, entry):
+        # Members that did not propose may have taken our message for one sent before they joined and skipped it.
+        # Once is enough, the unicast is reliable
+        if group.hold_back_queue.get_by_id(entry.message_id) is not entry or \
+                entry.state != DeliveryState.UNDELIVERABLE or group not in self.groups:
+            return
+        proposed = entry.suggested_numbers or {}
+        header = {key: value for key, value in entry.header.items() if key != 'rel_delivered_seq'}
+        for participant in group.participants:
+            if participant.id not in proposed:
+                if DEBUG:
+                    print(f"[ISIS] No proposal of {participant.id} for {entry.message_id}, send it again")
+                self.send_unicast(participant, "SEQ/RETRY", json.dumps({
+                    'g_id': group.identifier, 'h': header, 'm': entry.message}))
+
+    def _on_retry_message_received(self, host, message):
+        payload = json.loads(message)
+        group = self._find_group(payload.get('g_id'))
+        header = payload.get('h')
+        if not group or header.get('rel_seq', -1) > group.rel_joined_seq.get(host.id, -1):
+            # Our reliable layer has it, the proposal is on its way
+            return
+        if not self._find_hold_back_message_by_id(group, header.get('m_id')):
+            self._propose(host, group, header, header.get('m'), payload.get('m'))
+
+    def _on_order_announced(self, group, message_id, max_suggested_seq, max_suggested_process_id, rel_id=None):
+        # Agreed number of a message, from ISIS or the sequencer. rel_id is the one of the announcement
+        group.sequencer.sequence = max(group.sequencer.get_sequence(), max_suggested_seq)
+        if group.group_last_message_delivered_seq is None:
+            group.group_last_message_delivered_seq = max_suggested_seq - 1
+        hold_back_message = self._find_hold_back_message_by_id(group, message_id)
+
+        if not hold_back_message:
+            if max_suggested_seq > group.group_last_message_delivered_seq:
+                # The sequencer was faster than the sender of the message
+                group.early_orders[message_id] = (max_suggested_seq, max_suggested_process_id, rel_id)
+            elif DEBUG:
+                print("Multicast could not get message for announcement, probably already delivered", message_id)
+            return
+
+        hold_back_message.rel_ids = (rel_id,) if rel_id else ()
+        group.hold_back_queue.finalize(hold_back_message, max_suggested_seq, max_suggested_process_id)
+
+        if group.ordering != SEQUENCER_ORDER:
+            # ISIS numbers have gaps and repeat with other process ids, the queue delivers by (seq, process id).
+            # An order below the last delivered one is of a message from before we joined, it is left out
+            order = (max_suggested_seq, str(max_suggested_process_id))
+            last_order = group.last_delivered_order
+            if last_order and order < (last_order[0], str(last_order[1])):
+                if DEBUG:
+                    print(f"Got order {order} below the last delivered {last_order}; discard message")
+                group.hold_back_queue.remove(hold_back_message)
+                return
+        elif max_suggested_seq <= group.group_last_message_delivered_seq:
+            if DEBUG:
+                print(
+                    f"Got lower sequence number then expected: current: {group.group_last_message_delivered_seq}, "
+                    f"got {max_suggested_seq}; discard message")
+            group.hold_back_queue.remove(hold_back_message)
+            return
+        elif max_suggested_seq > group.group_last_message_delivered_seq + 1:
+            # TODO: Dont request the messages we already have!
+            sequences = list(range(group.group_last_message_delivered_seq + 1, max_suggested_seq))
+            seq_copy = []
+            for sq in sequences:
+                if not self._find_hold_back_message_by_deliverable(group, sq):
+                    seq_copy.append(sq)
+            sequences = seq_copy
+            if DEBUG:
+                print(f"MISSING MESSAGE; GOT {max_suggested_seq},  SENDING NACK FOR ", sequences)
+            self._send_group_multicast_nack(group, json.dumps(sequences))
 
-                self.send_unicast(
-                    host,
-                    "SEQ/PROP",
-                    json.dumps({
-                        'm_id': header.get('m_id'),
-                        's_seq': sequence,
-                        'g_id': group.identifier,
-                    }),
-                )
+        self._check_queue_for_max_number(group)
 
     def _send_group_multicast_nack(self, group, seq):
         method = 'NACK'
@@ -546,41 +994,159 @@ class SocketService(Thread):
         )
 
     def run(self):
-        print(f"[BROADCAST] Start listening {self.broadcast_socket.address}:{self.broadcast_socket.port}")
-        print(f"[UNICAST] Start listening {self.unicast_socket.address}:{self.unicast_socket.port}")
-        print(f"[MULTICAST] Start listening {self.multicast_socket.address}:{self.multicast_socket.port}")
+        self._print_listening()
         while True:
             # Await an event on a readable socket descriptor
-            (read, write, exception) = select.select(self.sockets, [], [])
+            (read, write, exception) = select.select(self.sockets + [self._wakeup_receiver], [], [],
+                                                     self.timers.next_timeout())
             # Iterate through the tagged read descriptors
             for error in exception:
                 print("GOT ERROR IN ", error)
             for wr in write:
                 print("GOT WRITE IN ", wr)
             for receiver in read:
-                try:
-                    data, address = receiver.recvfrom(BUFFER_SIZE)
-
-                    hostname = address[0]
-                    port = address[1]
-
-                    header, payload = self._from_message(data)
-
-                    host = Host(header.get('id'), hostname, header.get('p'), header.get('t'))
-
-                    method = header.get('m')
-
-                    if receiver == self.broadcast_socket:
-                        self._on_broadcast_received(header, host, method, payload)
-                    elif receiver == self.unicast_socket:
-                        self._on_unicast_received(header, host, method, payload)
-                    elif receiver == self.multicast_socket:
-                        self._on_reliable_multicast_received(header, host, method, payload)
-                except Exception as e:
-                    if e and hasattr(e, 'errno') and e.errno == 10054:
-                        self.on_host_failed()
-                        print("Host failed! We dont know which one :(")
-                    else:
-                        print("Exception", e)
-                        traceback.print_exc()
+                if receiver == self._wakeup_receiver:
+                    self._wakeup_receiver.recv(BUFFER_SIZE)
+                    continue
+                if receiver not in self.sockets:
+                    # Closed while handling this round (group left)
                     continue
+                for _ in range(RECEIVE_BURST):
+                    try:
+                        data, address = receiver.recvfrom(BUFFER_SIZE, _RECEIVE_FLAGS)
+                    except BlockingIOError:
+                        break
+                    except Exception as e:
+                        self._on_receive_error(e)
+                        break
+                    self._on_datagram(receiver, data, address)
+                    if not _RECEIVE_FLAGS:
+                        break
+            self.timers.run_due()
+            # Everything sent while handling this round goes out coalesced
+            self.batcher.flush()
+
+    def _print_listening(self):
+        print(f"[BROADCAST] Start listening {self.broadcast_socket.address}:{self.broadcast_socket.port}")
+        print(f"[UNICAST] Start listening {self.unicast_socket.address}:{self.unicast_socket.port}")
+        print(f"[MULTICAST] Start listening {self.multicast_socket.address}:{self.multicast_socket.port}")
+
+    def _on_datagram(self, receiver, data, address):
+        if is_fragment_frame(data):
+            try:
+                data = self._on_fragment_received(data, address)
+            except Exception as e:
+                self._on_receive_error(e)
+                return
+            if data is None:
+                return
+        if is_batch_frame(data):
+            try:
+                frames = decode_batch(data)
+            except Exception as e:
+                self._on_receive_error(e)
+                return
+            for frame in frames:
+                self._on_datagram(receiver, frame, address)
+            return
+        try:
+            hostname = address[0]
+
+            header, payload = self._from_message(data)
+
+            host = self.hosts.intern(header.get('id'), hostname, header.get('p'), header.get('t'))
+
+            method = header.get('m')
+
+            if self.on_peer_activity and host.id != self.own_host.id:
+                self.on_peer_activity(host)
+
+            if receiver == self.broadcast_socket:
+                self._on_broadcast_received(header, host, method, payload)
+            elif receiver == self.unicast_socket:
+                self._on_unicast_received(header, host, method, payload)
+            elif receiver == self.multicast_socket or receiver in self.multicast_sockets.values():
+                self._on_reliable_multicast_received(header, host, method, payload)
+        except Exception as e:
+            self._on_receive_error(e)
+
+    def _on_receive_error(self, e):
+        if e and hasattr(e, 'errno') and e.errno == 10054:
+            self.on_host_failed()
+            print("Host failed! We dont know which one :(")
+        else:
+            print("Exception", e)
+            traceback.print_exc()
+
+    def get_last_sent(self, host: Host):
+        # Multicasts to the server group reach every host as well
+        return max(self.last_sent.get((host.address, int(host.unicast_port)), 0),
+                   self.last_sent.get((self.multicast_socket.address, self.multicast_socket.port), 0))
+
+    def _send_datagram(self, sock, data, address, method=None):
+        self.last_sent[address] = self.timers.clock()
+        if self.fragment_sender.needs_fragmentation(data):
+            with self.fragment_lock:
+                fragments = self.fragment_sender.fragment(sock, address, data)
+            if DEBUG:
+                print(f"[FRAGMENT:SENT] {method} in {len(fragments)} fragments to {address[0]}:{address[1]}")
+            for fragment in fragments:
+                self.batcher.send(sock, address, fragment)
+        elif method in BATCHED_METHODS:
+            self.batcher.add(sock, address, data)
+        else:
+            self.batcher.send(sock, address, data)
+
+    def _on_fragment_received(self, data, address):
+        sender_id, fragment_id, index, count, port, chunk = decode_fragment(data)
+        data = self.reassembler.add(sender_id, fragment_id, index, count, chunk, (address[0], port),
+                                    self.timers.clock())
+        if len(self.reassembler) and not self._fragment_check_timer:
+            self._fragment_check_timer = self.timers.schedule(self.reassembler.nack_delay, self._check_fragments)
+        return data
+
+    def _check_fragments(self):
+        self._fragment_check_timer = None
+        for sender_id, fragment_id, address, indexes in self.reassembler.get_missing(self.timers.clock()):
+            if DEBUG:
+                print(f"[FRAGMENT] Missing {len(indexes)} fragments of {fragment_id} from {sender_id}")
+            header = self._get_base_header("FRAG_NACK")
+            self._send_datagram(
+                self.unicast_socket,
+                self._to_message(header, json.dumps({"f": fragment_id, "i": indexes})),
+                address,
+                "FRAG_NACK"
+            )
+        if len(self.reassembler):
+            self._fragment_check_timer = self.timers.schedule(self.reassembler.nack_delay, self._check_fragments)
+
+    def _on_fragment_nack(self, message):
+        payload = json.loads(message)
+        with self.fragment_lock:
+            sock, address, fragments = self.fragment_sender.get_fragments(payload.get("f"), payload.get("i"))
+        if DEBUG:
+            print(f"[FRAGMENT:RESENT] {len(fragments)} fragments of {payload.get('f')}")
+        for fragment in fragments:
+            self.batcher.send(sock, address, fragment)
+
+    def _on_batch_pending(self):
+        # Batches filled on the socket thread are flushed after each round, this covers other threads
+        if threading.get_ident() != self.ident and not self._batch_flush_timer:
+            self._batch_flush_timer = self.timers.schedule(BATCH_FLUSH_DELAY, self._flush_batches)
+
+    def _flush_batches(self):
+        self._batch_flush_timer = None
+        self.batcher.flush()
+
+    def schedule_periodic(self, interval, callback, delay=None):
+        return self.timers.schedule_periodic(interval, callback, delay=delay)
+
+    def _wakeup(self):
+        try:
+            self._wakeup_sender.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+
+def _get_seq(entry: RelHoldBackEntry):
+    return entry.seq
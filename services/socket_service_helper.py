@@ -0,0 +1,18 @@
+from config import TRANSPORT_ENGINE, WIRE_CODEC
+from models.Host import Host
+from services.AsyncioSocketService import AsyncioSocketService
+from services.PipelinedSocketService import PipelinedSocketService
+from services.SocketService import SocketService
+
+_engines = {
+    "thread": SocketService,
+    "asyncio": AsyncioSocketService,
+    "pipeline": PipelinedSocketService,
+}
+
+
+def create_socket_service(own_host: Host, on_host_failed, engine: str = TRANSPORT_ENGINE, codec: str = WIRE_CODEC,
+                          transport=None):
+    if engine not in _engines:
+        raise ValueError(f"Unknown transport engine {engine}")
+    return _engines[engine](own_host, on_host_failed, codec, transport)
@@ -1,8 +1,12 @@
 import os
 import struct
+import sys
 
 from socket import socket, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_REUSEADDR, IPPROTO_IP, IP_MULTICAST_TTL, inet_aton, INADDR_ANY, IP_ADD_MEMBERSHIP
 
+# Not exported by the socket module
+_IP_MULTICAST_ALL = 49
+
 
 class MulticastSocket(socket):
     # TODO: can have own id?
@@ -19,6 +23,9 @@ class MulticastSocket(socket):
         group = inet_aton(address)
         mreq = struct.pack('4sL', group, INADDR_ANY)
         self.setsockopt(IPPROTO_IP, IP_ADD_MEMBERSHIP, mreq)
+        if sys.platform.startswith('linux'):
+            # All sockets share the port, without this Linux delivers the groups joined by the others as well
+            self.setsockopt(IPPROTO_IP, _IP_MULTICAST_ALL, 0)
         self.bind(('', port))
 
     def __del__(self):
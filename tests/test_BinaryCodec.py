@@ -0,0 +1,65 @@
+import uuid
+from unittest import TestCase
+
+from transport.BinaryCodec import BinaryCodec, BinaryCodecError
+from transport.JsonCodec import JsonCodec
+from transport.codec_helper import decode_message
+
+
+def _header(method="SEQ/PROP"):
+    return {
+        'id': str(uuid.uuid1()),
+        't': "server",
+        'a': "192.168.0.12",
+        'p': 50123,
+        'm': method,
+    }
+
+
+class TestBinaryCodec(TestCase):
+
+    def test_round_trip_unicast(self):
+        codec = BinaryCodec()
+        header = _header()
+        header['seq'] = 17
+
+        decoded_header, payload = codec.decode(codec.encode(header, '{"m_id": "x"}'))
+
+        assert decoded_header == header
+        assert payload == '{"m_id": "x"}'
+
+    def test_round_trip_resent_multicast(self):
+        codec = BinaryCodec()
+        original = _header("GS/OV")
+        original['m_id'] = str(uuid.uuid1())
+        original['g_ident'] = "MAIN_GROUP"
+        original['rel_seq'] = 4
+        original['rel_delivered_seq'] = {original['id']: 3, str(uuid.uuid1()): 0}
+        header = {**original, 'resent': 9, 'rel_orig_header': original}
+
+        decoded_header, payload = codec.decode(codec.encode(header, b'\x80\x04|pickled'))
+
+        assert decoded_header == header
+        assert payload == b'\x80\x04|pickled'
+
+    def test_unknown_fields_and_values_fall_back_to_extension(self):
+        codec = BinaryCodec()
+        header = {'id': "0000000", 't': "monitor", 'm': "SOMETHING/NEW", 'p': "5001", 'custom': [1, 2]}
+
+        decoded_header, _ = codec.decode(codec.encode(header, ''))
+
+        assert decoded_header == header
+
+    def test_payload_with_delimiter_is_kept(self):
+        header = _header("GS")
+        for codec in [BinaryCodec(), JsonCodec()]:
+            _, payload = decode_message(codec.encode(header, "join:a|b:c"))
+            assert payload == "join:a|b:c"
+
+    def test_rejects_unknown_version(self):
+        codec = BinaryCodec()
+        data = bytearray(codec.encode(_header(), ''))
+        data[1] = 99
+
+        with self.assertRaises(BinaryCodecError):
+            codec.decode(bytes(data))
@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+from transport.BinaryCodec import BinaryCodec, is_batch_frame, decode_batch
+from transport.DatagramBatcher import DatagramBatcher
+from transport.JsonCodec import JsonCodec
+
+
+class _Socket:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, address):
+        self.sent.append((data, address))
+
+
+class TestDatagramBatcher(TestCase):
+
+    def test_coalesces_per_destination(self):
+        sock = _Socket()
+        batcher = DatagramBatcher(max_bytes=1400)
+        ack = BinaryCodec().encode({'m': "ACK", 'ack': 3}, 3)
+        legacy = JsonCodec().encode({'m': "HB"}, "1.5")
+
+        batcher.add(sock, ("a", 1), ack)
+        batcher.add(sock, ("a", 1), legacy)
+        batcher.add(sock, ("b", 1), ack)
+        assert sock.sent == []
+
+        batcher.flush()
+        batches = dict((address, data) for data, address in sock.sent)
+        assert is_batch_frame(batches[("a", 1)])
+        assert decode_batch(batches[("a", 1)]) == [ack, legacy]
+        # A single frame is not wrapped
+        assert batches[("b", 1)] == ack
+        assert batcher.datagrams_sent == 2
+        assert batcher.frames_sent == 3
+
+    def test_size_limit_and_order(self):
+        sock = _Socket()
+        batcher = DatagramBatcher(max_bytes=64)
+        frames = [bytes([i]) * 20 for i in range(4)]
+
+        batcher.add(sock, ("a", 1), frames[0])
+        batcher.add(sock, ("a", 1), frames[1])
+        batcher.add(sock, ("a", 1), frames[2])
+        assert decode_batch(sock.sent[0][0]) == frames[:2]
+
+        # Unbatched frames flush what is pending for their destination first
+        batcher.send(sock, ("a", 1), frames[3])
+        assert [data for data, _ in sock.sent[1:]] == [frames[2], frames[3]]
@@ -0,0 +1,50 @@
+import os
+import random
+from unittest import TestCase
+
+from transport.BinaryCodec import encode_fragments, decode_fragment
+from transport.FragmentReassembler import FragmentReassembler
+
+
+def _add(reassembler, fragment, now=0.0):
+    sender_id, fragment_id, index, count, port, chunk = decode_fragment(fragment)
+    return reassembler.add(sender_id, fragment_id, index, count, chunk, ("10.0.0.1", port), now)
+
+
+class TestFragmentReassembler(TestCase):
+
+    def test_reassembles_out_of_order_and_reports_missing(self):
+        data = os.urandom(10000)
+        fragments = encode_fragments(data, "sender", 7, 5001, 1400)
+        assert all(len(fragment) <= 1400 for fragment in fragments)
+        reassembler = FragmentReassembler(nack_delay=0.05)
+
+        lost = fragments[3]
+        rest = fragments[:3] + fragments[4:]
+        random.Random(1).shuffle(rest)
+        for fragment in rest:
+            assert _add(reassembler, fragment) is None
+
+        assert reassembler.get_missing(0.01) == []
+        assert reassembler.get_missing(0.1) == [("sender", 7, ("10.0.0.1", 5001), [3])]
+
+        assert _add(reassembler, lost, 0.2) == data
+        assert len(reassembler) == 0 and reassembler.size == 0
+        # Late duplicates of a completed message are ignored
+        assert _add(reassembler, fragments[0], 0.3) is None
+        assert len(reassembler) == 0
+
+    def test_timeout_and_memory_limit(self):
+        reassembler = FragmentReassembler(max_bytes=3000, timeout=1)
+        first = encode_fragments(os.urandom(5000), "a", 1, 5001, 1400)
+        second = encode_fragments(os.urandom(5000), "b", 1, 5001, 1400)
+
+        _add(reassembler, first[0])
+        _add(reassembler, first[1])
+        _add(reassembler, second[0])
+        # The oldest message was dropped to stay below max_bytes
+        assert len(reassembler) == 1
+        assert reassembler.size <= 3000
+
+        reassembler.get_missing(2)
+        assert len(reassembler) == 0
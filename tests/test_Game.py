@@ -0,0 +1,86 @@
+import json
+import random
+from unittest import TestCase
+
+from game.models.Game import Game, Movement
+from game.models.Player import Player
+
+
+def _state(game):
+    cells = [[(cell.field_type, cell.item, str(cell.player.id) if cell.player else None) for cell in row]
+             for row in game.grid.cells]
+    players = [(str(player.id), player.name, list(player.items)) for player in game.players]
+    return game.seq, cells, players
+
+
+class TestGame(TestCase):
+
+    def test_deltas_reproduce_the_game(self):
+        random.seed(3)
+        game = Game("test", width=6, height=6, item_number=4)
+        replica = Game.from_pickle(game.to_pickle())
+
+        moves = [Movement.UP, Movement.DOWN, Movement.LEFT, Movement.RIGHT]
+        players = [Player(id=f"p{i}", name=f"player{i}") for i in range(3)]
+        for step in range(40):
+            if step < len(players):
+                game.add_player(players[step])
+            elif step == 30:
+                game.remove_player(players[0])
+            else:
+                game.move_player(random.choice(game.players), random.choice(moves))
+            game.seq = game.seq + 1
+            assert replica.apply_delta(json.loads(game.to_delta()))
+            assert _state(replica) == _state(game)
+
+    def test_delta_with_gap_is_rejected(self):
+        game = Game("test", width=4, height=4, item_number=1)
+        replica = Game.from_pickle(game.to_pickle())
+
+        game.add_player(Player(id="p1", name="one"))
+        game.seq = game.seq + 1
+        game.to_delta()
+        game.move_player(game.players[0], Movement.UP)
+        game.seq = game.seq + 1
+
+        assert not replica.apply_delta(json.loads(game.to_delta()))
+        assert replica.seq == 0
+
+    def test_indexes_follow_moves_and_removal(self):
+        random.seed(4)
+        game = Game("test", width=8, height=8, item_number=3)
+        replica = Game.from_pickle(game.to_pickle())
+        players = [Player(id=f"p{i}", name=f"player{i}") for i in range(3)]
+        for player in players:
+            game.add_player(player)
+        for _ in range(30):
+            game.move_player(random.choice(players), random.choice([Movement.UP, Movement.DOWN, Movement.LEFT]))
+        game.remove_player(players[1])
+        game.seq = game.seq + 1
+        assert replica.apply_delta(json.loads(game.to_delta()))
+
+        for current in [game, replica]:
+            assert current.get_player("p1") is None
+            assert current.get_player_position(players[1]) is None
+            for player in [players[0], players[2]]:
+                x, y = current.get_player_position(player)
+                assert current.grid.get_player(x, y).id == player.id
+            assert sum(1 for row in current.grid.cells for cell in row if cell.player) == 2
+
+    def test_json_round_trip(self):
+        random.seed(5)
+        game = Game("test", width=8, height=6, item_number=5)
+        players = [Player(id=f"p{i}", name=f"player{i}") for i in range(3)]
+        for player in players:
+            game.add_player(player)
+        for _ in range(20):
+            game.move_player(random.choice(players), random.choice([Movement.UP, Movement.DOWN, Movement.RIGHT]))
+        game.set_command_seq(players[2], 7)
+        game.seq = 12
+
+        copy = Game.from_json(game.to_json())
+        assert copy.id == game.id and copy.name == game.name
+        assert _state(copy) == _state(game)
+        assert copy.positions == game.positions
+        assert copy.get_player("p2").command_seq == 7
+        assert copy.to_json() == game.to_json()
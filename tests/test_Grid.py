@@ -0,0 +1,56 @@
+import pickle
+from unittest import TestCase
+
+from game.models.Cell import FieldTypes
+from game.models.Grid import Grid
+from game.models.Player import Player
+
+
+class TestGrid(TestCase):
+
+    def test_cell_views_write_through(self):
+        grid = Grid(6, 4, 0)
+        player = Player(id="p1", name="one")
+
+        cell = grid.cells[3][5]
+        cell.field_type = FieldTypes.ROCK
+        cell.item = 1
+        grid.cells[2][1].player = player
+
+        assert grid.is_rock(5, 3)
+        assert grid.items[grid.index(5, 3)] == 1
+        assert grid.get_player(1, 2) is player
+        assert grid.find_player(player) == (1, 2)
+        assert len(grid.cells) == 4 and len(grid.cells[0]) == 6
+
+    def test_pickle_keeps_players_and_arrays(self):
+        grid = Grid(5, 5, 2)
+        grid.set_player(4, 0, Player(id="p1", name="one"))
+
+        copy = pickle.loads(pickle.dumps(grid))
+
+        assert copy.field_types == grid.field_types
+        assert copy.items == grid.items
+        assert copy.get_player(4, 0).name == "one"
+        assert copy.find_player(Player(id="p1", name="one")) == (4, 0)
+
+    def test_more_slots_than_16_bit(self):
+        grid = Grid(300, 300, 0)
+        players = [Player(id=f"p{i}", name=str(i)) for i in range(70000)]
+        for i, player in enumerate(players):
+            grid.set_player(i % 300, i // 300, player)
+
+        assert grid.get_player(0, 0) is players[0]
+        assert grid.get_player(65536 % 300, 65536 // 300) is players[65536]
+        assert grid.find_player(players[69999]) == (69999 % 300, 69999 // 300)
+
+    def test_find_player_ignores_unaligned_matches(self):
+        grid = Grid(4, 1, 0)
+        players = [Player(id=f"p{i}", name=str(i)) for i in range(257)]
+        for player in players:
+            grid._slot(player)
+        # Slot 1 next to an empty cell contains the bytes of slot 256 one byte off the element boundary
+        grid.set_player(3, 0, players[0])
+
+        assert grid.find_player(players[255]) is None
+        assert grid.find_player(players[0]) == (3, 0)
@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+from models.HashRing import HashRing
+from models.Host import Host
+
+
+def _hosts(count):
+    return [Host(f"server-{i}", "127.0.0.1", 5001 + i) for i in range(count)]
+
+
+class TestHashRing(TestCase):
+
+    def test_owner_independent_of_node_order(self):
+        hosts = _hosts(5)
+        ring = HashRing()
+        ring.set_nodes(hosts)
+        other = HashRing()
+        other.set_nodes(list(reversed(hosts)))
+        for i in range(100):
+            assert ring.get_owner(f"game-{i}").id == other.get_owner(f"game-{i}").id
+
+    def test_games_spread_over_servers(self):
+        ring = HashRing()
+        ring.set_nodes(_hosts(4))
+        owners = [ring.get_owner(f"game-{i}").id for i in range(1000)]
+        assert all(150 < owners.count(host.id) < 350 for host in _hosts(4))
+
+    def test_only_games_of_changed_server_move(self):
+        hosts = _hosts(5)
+        ring = HashRing()
+        ring.set_nodes(hosts)
+        before = {f"game-{i}": ring.get_owner(f"game-{i}").id for i in range(1000)}
+
+        ring.set_nodes(hosts[:4])
+        after = {name: ring.get_owner(name).id for name in before}
+        moved = [name for name in before if before[name] != after[name]]
+        assert all(before[name] == hosts[4].id for name in moved)
+
+        ring.set_nodes(hosts)
+        assert {name: ring.get_owner(name).id for name in before} == before
+
+    def test_empty_ring_has_no_owner(self):
+        ring = HashRing()
+        assert ring.get_owner("game") is None
+        assert not ring.is_owner(_hosts(1)[0], "game")
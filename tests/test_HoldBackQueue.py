@@ -0,0 +1,97 @@
+import random
+from unittest import TestCase
+
+from models.HoldBackQueue import HoldBackQueue, DeliveryState, HoldBackEntry
+
+
+def _entry(message_id, seq, process_id, state=DeliveryState.UNDELIVERABLE):
+    return HoldBackEntry(None, {"m_id": message_id}, "TEST", "", seq, process_id, state)
+
+
+def _deliver(queue):
+    delivered = []
+    while True:
+        item = queue.pop_next()
+        if not item:
+            return delivered
+        delivered.append(item.message_id)
+
+
+def _deliver_sorted_list(items):
+    # ISIS delivery rule on a sorted list: the head is delivered as long as it is deliverable
+    items = sorted(items, key=lambda t: (t.max_suggested_seq, 0 if t.state == DeliveryState.UNDELIVERABLE else 1,
+                                         t.max_suggested_process_id))
+    delivered = []
+    while items and items[0].state == DeliveryState.DELIVERABLE:
+        delivered.append(items.pop(0).message_id)
+    return delivered, items
+
+
+class TestHoldBackQueue(TestCase):
+
+    def test_delivers_in_sequence_order(self):
+        queue = HoldBackQueue()
+        first = queue.add(_entry("a", 1, "p1"))
+        second = queue.add(_entry("b", 2, "p1"))
+
+        queue.finalize(second, 2, "p2")
+        assert _deliver(queue) == []
+
+        queue.finalize(first, 1, "p2")
+        assert _deliver(queue) == ["a", "b"]
+        assert len(queue) == 0
+
+    def test_delivers_equal_numbers_by_process_id(self):
+        queue = HoldBackQueue()
+        first = queue.add(_entry("a", 3, "p1"))
+        second = queue.add(_entry("b", 3, "p1"))
+        third = queue.add(_entry("c", 3, "p1"))
+
+        queue.finalize(second, 5, "p1")
+        queue.finalize(first, 5, "p3")
+        # "c" may still be agreed on 5 with any process id
+        assert _deliver(queue) == []
+
+        queue.finalize(third, 6, "p2")
+        assert _deliver(queue) == ["b", "a", "c"]
+
+    def test_pop_seq_and_drop_until(self):
+        queue = HoldBackQueue()
+        entries = [queue.add(_entry(f"m{seq}", seq, "p1")) for seq in range(1, 5)]
+        for seq, entry in enumerate(entries, 1):
+            queue.finalize(entry, seq, "s")
+
+        assert queue.pop_seq(2) is entries[1]
+        assert queue.pop_seq(2) is None
+        queue.drop_until(3)
+        assert [entry.message_id for entry in queue] == ["m4"]
+
+    def test_lookup_by_id_and_deliverable_seq(self):
+        queue = HoldBackQueue()
+        entry = queue.add(_entry("a", 4, "p1"))
+
+        assert queue.get_by_id("a") is entry
+        assert queue.get_deliverable(7) is None
+
+        queue.finalize(entry, 7, "p3")
+        assert queue.get_deliverable(7) is entry
+
+        queue.remove(entry)
+        assert queue.get_by_id("a") is None
+        assert queue.get_deliverable(7) is None
+
+    def test_matches_sorted_list_delivery(self):
+        rng = random.Random(5)
+        for _ in range(200):
+            queue = HoldBackQueue()
+            items = []
+            for index in range(rng.randint(1, 12)):
+                # Proposals are lower bounds of the agreed numbers, which may repeat with other process ids
+                entry = _entry(f"m{index}", rng.randint(1, 4), f"p{rng.randint(1, 3)}")
+                items.append(entry)
+                queue.add(entry)
+            # Agreed (seq, process id) pairs are unique per message
+            for process_id, entry in enumerate(rng.sample(items, len(items))):
+                queue.finalize(entry, entry.max_suggested_seq + rng.randint(0, 3), f"q{process_id}")
+                expected, items = _deliver_sorted_list(items)
+                assert _deliver(queue) == expected
@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from models.Host import Host, HostType
+from models.HostRegistry import HostRegistry
+
+
+class TestHostRegistry(TestCase):
+
+    def test_intern_returns_same_host(self):
+        registry = HostRegistry(Host("0000000", "127.0.0.1", 1000))
+
+        first = registry.intern("1111111", "127.0.0.1", 1111, HostType.SERVER)
+        second = registry.intern_host(Host("1111111", "127.0.0.2", 2222))
+
+        assert first is second
+        assert first.address == "127.0.0.2"
+        assert first.unicast_port == 2222
+        assert first.host_type == HostType.SERVER
+
+    def test_own_host_unchanged(self):
+        own_host = Host("0000000", "127.0.0.1", 1000)
+        registry = HostRegistry(own_host)
+
+        assert registry.intern("0000000", "10.0.0.1", 9999) is own_host
+        assert own_host.address == "127.0.0.1"
+        assert own_host.unicast_port == 1000
+
+    def test_hosts_hash_by_id(self):
+        hosts = {Host("1111111", "127.0.0.1", 1111), Host("1111111", "127.0.0.2", 2222)}
+
+        assert len(hosts) == 1
+
+    def test_channel_stats(self):
+        registry = HostRegistry(Host("0000000", "127.0.0.1", 1000))
+
+        assert registry.get_stats("1111111") is None
+        channel = registry.get_channel("1111111")
+        assert registry.get_channel("1111111") is channel
+        assert registry.get_channel("2222222").epoch != channel.epoch
+        assert registry.get_stats("1111111")['sent'] == 0
@@ -0,0 +1,58 @@
+import threading
+from unittest import TestCase
+
+from util.KeyedWorkerPool import KeyedWorkerPool
+
+TIMEOUT = 5
+
+
+class TestKeyedWorkerPool(TestCase):
+
+    def test_runs_inline_before_start(self):
+        pool = KeyedWorkerPool(2, 10)
+        handled = []
+        pool.submit("a", handled.append, 1)
+        assert handled == [1]
+        assert pool.stats()['depth'] == 0
+
+    def test_keeps_order_per_key(self):
+        pool = KeyedWorkerPool(4, 1000)
+        pool.start()
+        handled = {key: [] for key in "abc"}
+        done = {key: threading.Event() for key in "abc"}
+        for i in range(300):
+            pool.submit("abc"[i % 3], handled["abc"[i % 3]].append, i)
+        for key in "abc":
+            pool.submit(key, done[key].set)
+        assert all(event.wait(TIMEOUT) for event in done.values())
+        for key, values in handled.items():
+            assert values == sorted(values)
+        assert sum(len(values) for values in handled.values()) == 300
+
+    def test_blocked_key_does_not_stop_others(self):
+        pool = KeyedWorkerPool(2, 10)
+        pool.start()
+        release = threading.Event()
+        other = threading.Event()
+        pool.submit("slow", release.wait, TIMEOUT)
+        pool.submit("slow", lambda: None)
+        pool.submit("fast", other.set)
+        assert other.wait(TIMEOUT)
+        assert pool.stats()['keys'] == {"slow": 1}
+        release.set()
+
+    def test_waits_for_room(self):
+        pool = KeyedWorkerPool(1, 2)
+        pool.start()
+        started = threading.Event()
+        release = threading.Event()
+        pool.submit("a", lambda: started.set() or release.wait(TIMEOUT))
+        assert started.wait(TIMEOUT)
+        pool.submit("a", release.wait, TIMEOUT)
+        pool.submit("b", release.wait, TIMEOUT)
+        assert not pool.has_room()
+        assert not pool.wait_for_room(0.01)
+        assert pool.stats()['keys'] == {"a": 1, "b": 1}
+        release.set()
+        assert pool.wait_for_room(TIMEOUT)
+        assert pool.stats()['max_depth'] == 2
@@ -0,0 +1,87 @@
+from unittest import TestCase
+
+from models.Host import Host
+from models.MembershipView import MembershipView
+
+
+def _host(index):
+    return Host(f"host-{index}", "127.0.0.1", 5001 + index)
+
+
+class TestMembershipView(TestCase):
+
+    def _view(self):
+        view = MembershipView()
+        events = []
+        view.on_joined.subscribe("test", lambda host: events.append(("joined", host.id)))
+        view.on_left.subscribe("test", lambda host: events.append(("left", host.id)))
+        return view, events
+
+    def test_deltas_increase_the_view_number(self):
+        view, events = self._view()
+        assert view.apply("d1", 0, joined=[_host(1), _host(2)])
+        assert view.apply("d2", 1, joined=[_host(1)])
+        assert events == [("joined", "host-1"), ("joined", "host-2")]
+        assert view.version == 2
+
+    def test_replayed_delta_is_ignored(self):
+        view, events = self._view()
+        view.apply("d1", 0, joined=[_host(1)])
+        view.apply("d2", 1, left=["host-1"])
+        assert view.apply("d1", 0, joined=[_host(1)])
+        assert view.version == 2
+        assert view.hosts == {}
+        assert events == [("joined", "host-1"), ("left", "host-1")]
+
+    def test_late_delta_reports_the_changes_no_later_delta_touched(self):
+        # Two members announce a change at view 1, the second delta arrives (in total order) as a late one
+        view, events = self._view()
+        late = []
+        view.on_late.subscribe("test", lambda delta_id, joined, left: late.append(
+            (delta_id, [host.id for host in joined], left)))
+        view.apply("d1", 0, joined=[_host(1), _host(2), _host(3)])
+        view.apply("d2", 1, joined=[_host(4)], left=["host-1"])
+        view.apply("d3", 1, joined=[_host(5)], left=["host-1", "host-2"])
+        assert view.version == 2
+        assert sorted(view.hosts) == ["host-2", "host-3", "host-4"]
+        assert late == [("d3", ["host-5"], ["host-2"])]
+        # Announced again on the current view
+        view.apply("d4", 2, joined=[_host(5)], left=["host-2"])
+        assert view.version == 3
+        assert sorted(view.hosts) == ["host-3", "host-4", "host-5"]
+
+    def test_gap_waits_for_the_whole_view(self):
+        view, events = self._view()
+        view.apply("d1", 0, joined=[_host(1)])
+        assert not view.apply("d3", 2, joined=[_host(3)])
+        assert not view.apply("d4", 3, left=["host-2"])
+        assert view.version == 1 and sorted(view.hosts) == ["host-1"]
+        # The other view contains d3 already, not d4
+        view.set_view(3, [_host(2), _host(3)], ["d1", "d2", "d3"])
+        assert view.pending is None
+        assert view.version == 4
+        assert sorted(view.hosts) == ["host-3"]
+        assert events == [("joined", "host-1"), ("left", "host-1"), ("joined", "host-2"), ("joined", "host-3"),
+                          ("left", "host-2")]
+
+    def test_local_changes_keep_the_view_number(self):
+        view, _ = self._view()
+        view.apply("d1", 0, joined=[_host(1)])
+        view.join(_host(2))
+        view.leave(_host(1))
+        assert sorted(view.hosts) == ["host-2"]
+        assert view.version == 1
+        # A delta made at the same view does not bring back the host we saw failing
+        view.apply("d2", 1, joined=[_host(1)])
+        assert "host-1" not in view.hosts
+
+    def test_joining_member_keeps_its_view_if_the_other_is_not_newer(self):
+        view, _ = self._view()
+        view.join(_host(1))
+        view.join(_host(2))
+        view.wait_for_view()
+        assert not view.apply("d1", 0, joined=[_host(1), _host(2), _host(3)])
+        # The member we asked was joining as well
+        view.set_view(0, [_host(1)], [])
+        assert view.version == 1
+        assert sorted(view.hosts) == ["host-1", "host-2", "host-3"]
@@ -0,0 +1,53 @@
+from unittest import TestCase
+
+from models.HoldBackQueue import RelHoldBackEntry
+from models.MessageHistory import MessageHistory, ENTRY_OVERHEAD
+
+
+def _entry(message):
+    return RelHoldBackEntry(0, None, {}, message)
+
+
+class TestMessageHistory(TestCase):
+
+    def test_prune_stops_at_first_unstable(self):
+        history = MessageHistory()
+        for seq in range(5):
+            history.put("a", seq, _entry("x"))
+
+        history.prune("a", lambda seq, item: seq <= 2)
+
+        assert history.get("a", 2) is None
+        assert history.get("a", 3) is not None
+        assert history.was_dropped("a", 1)
+        assert not history.was_dropped("a", 3)
+        assert len(history) == 2
+
+    def test_evicts_oldest_over_cap(self):
+        history = MessageHistory(max_bytes=3 * (ENTRY_OVERHEAD + 10))
+        history.put("a", 0, _entry("0123456789"))
+        history.put("b", 0, _entry("0123456789"))
+        history.put("a", 1, _entry("0123456789"))
+        history.put("b", 1, _entry("0123456789"))
+
+        assert history.get("a", 0) is None
+        assert history.was_dropped("a", 0)
+        assert history.get("b", 0) is not None
+        assert history.size <= history.max_bytes
+
+    def test_replaced_entry_is_not_dropped(self):
+        history = MessageHistory()
+        history.put("a", 3, [_entry("x")])
+        history.put("a", 3, [_entry("x"), _entry("y")])
+
+        assert len(history.get("a", 3)) == 2
+        assert not history.was_dropped("a", 2)
+        assert history.size == 2 * (ENTRY_OVERHEAD + 1)
+
+    def test_unknown_sequence_is_not_dropped(self):
+        history = MessageHistory()
+        history.put("a", 3, _entry(""))
+
+        assert not history.was_dropped("a", 7)
+        assert not history.was_dropped("b", 0)
+        assert history.knows("a", 3)
@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+from transport.PeerChannel import PeerChannel
+
+
+class TestPeerChannel(TestCase):
+
+    def test_reorders_and_suppresses_duplicates(self):
+        channel = PeerChannel(1)
+
+        assert channel.receive(1, 2, "b") == []
+        assert channel.receive(1, 3, "c") == []
+        assert channel.receive(1, 1, "a") == ["a", "b", "c"]
+        assert channel.receive(1, 2, "b") == []
+        assert channel.cumulative_ack() == 3
+
+        assert channel.receive(2, 1, "x") == ["x"]
+        assert channel.receive(1, 4, "d") is None
+
+    def test_window_and_cumulative_ack(self):
+        channel = PeerChannel(1, window=2)
+        for _ in range(3):
+            seq = channel.next_seq()
+            if channel.can_send():
+                channel.on_sent(seq, b"", 0.0)
+            else:
+                channel.backlog.append((seq, b""))
+
+        assert list(channel.unacked.keys()) == [1, 2]
+        assert channel.take_sendable() == []
+
+        assert not channel.on_ack(1, 0.1)
+        assert channel.take_sendable() == [(3, b"")]
+        assert channel.srtt is not None
+
+    def test_duplicate_acks_trigger_fast_retransmit(self):
+        channel = PeerChannel(1)
+        for _ in range(3):
+            channel.on_sent(channel.next_seq(), b"", 0.0)
+
+        channel.on_ack(1, 0.1)
+        assert not channel.on_ack(1, 0.2)
+        assert channel.on_ack(1, 0.3)
+
+    def test_ack_covering_retransmission_gives_no_sample(self):
+        channel = PeerChannel(1)
+        channel.on_sent(channel.next_seq(), b"", 0.0)
+        channel.on_ack(1, 0.1)
+        rto = channel.rto
+
+        for _ in range(2):
+            channel.on_sent(channel.next_seq(), b"", 1.0)
+        channel.back_off()
+        channel.on_retransmitted(2, 2.0)
+        channel.on_ack(3, 5.0)
+
+        assert channel.rto == rto
@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+from models.PhiAccrualDetector import PhiAccrualDetector
+
+
+class TestPhiAccrualDetector(TestCase):
+
+    def test_phi_grows_with_silence(self):
+        detector = PhiAccrualDetector(0, interval=1)
+        for now in range(1, 20):
+            detector.heartbeat(now)
+        assert detector.phi(19.5) < 1
+        assert detector.phi(21) < detector.phi(22) < detector.phi(23)
+        assert detector.phi(23) > 8
+
+    def test_bursts_do_not_shrink_expected_interval(self):
+        detector = PhiAccrualDetector(0, interval=1)
+        now = 0
+        for _ in range(10):
+            now = now + 1
+            for _ in range(10):
+                now = now + 0.01
+                detector.heartbeat(now)
+        assert 0.9 < detector.mean() < 1.2
+        assert detector.phi(now + 1) < 1
+
+    def test_irregular_peer_is_suspected_later(self):
+        regular = PhiAccrualDetector(0, interval=1)
+        irregular = PhiAccrualDetector(0, interval=1)
+        now = 0
+        for _ in range(40):
+            now = now + 1
+            regular.heartbeat(now)
+        now = 0
+        for index in range(40):
+            now = now + (0.5 if index % 2 else 1.5)
+            irregular.heartbeat(now)
+        assert irregular.phi(now + 2.5) < regular.phi(now + 2.5)
@@ -7,10 +7,11 @@ from models.Ring import Ring
 class TestRing(TestCase):
 
     def test_ordering(self):
-        own_node = Host("0000000", 0000)
-        node_one = Host("1111111", 1111)
-        node_two = Host("2222222", 2222)
+        own_node = Host("0000000", "127.0.0.1", 0000)
+        node_one = Host("1111111", "127.0.0.1", 1111)
+        node_two = Host("2222222", "127.0.0.1", 2222)
         ring = Ring(own_node)
+        ring.add_node(own_node)
 
         ring.add_node(node_one)
         ring.add_node(node_two)
@@ -21,10 +22,11 @@ class TestRing(TestCase):
 
 
     def test_multiple_add(self):
-        own_node = Host("0000000", 0000)
-        node_one = Host("1111111", 1111)
-        node_two = Host("2222222", 2222)
+        own_node = Host("0000000", "127.0.0.1", 0000)
+        node_one = Host("1111111", "127.0.0.1", 1111)
+        node_two = Host("2222222", "127.0.0.1", 2222)
         ring = Ring(own_node)
+        ring.add_node(own_node)
 
         ring.add_node(node_one)
         ring.add_node(node_two)
@@ -35,10 +37,11 @@ class TestRing(TestCase):
         assert len(ring.nodes) == 3
 
     def test_ordering_wrong(self):
-        own_node = Host("0000000", 0000)
-        node_one = Host("1111111", 1111)
-        node_two = Host("2222222", 2222)
+        own_node = Host("0000000", "127.0.0.1", 0000)
+        node_one = Host("1111111", "127.0.0.1", 1111)
+        node_two = Host("2222222", "127.0.0.1", 2222)
         ring = Ring(own_node)
+        ring.add_node(own_node)
 
         ring.add_node(node_two)
         ring.add_node(node_one)
@@ -48,10 +51,11 @@ class TestRing(TestCase):
         assert ring.nodes[2].id == node_two.id
 
     def test_ordering_delete(self):
-        own_node = Host("0000000", 0000)
-        node_one = Host("1111111", 1111)
-        node_two = Host("2222222", 2222)
+        own_node = Host("0000000", "127.0.0.1", 0000)
+        node_one = Host("1111111", "127.0.0.1", 1111)
+        node_two = Host("2222222", "127.0.0.1", 2222)
         ring = Ring(own_node)
+        ring.add_node(own_node)
 
         ring.add_node(node_one)
         ring.remove_node(node_one)
@@ -63,10 +67,11 @@ class TestRing(TestCase):
 
 
     def test_get_right_neighbour(self):
-        own_node = Host("0000000", 0000)
-        node_one = Host("1111111", 1111)
-        node_two = Host("2222222", 2222)
+        own_node = Host("0000000", "127.0.0.1", 0000)
+        node_one = Host("1111111", "127.0.0.1", 1111)
+        node_two = Host("2222222", "127.0.0.1", 2222)
         ring = Ring(own_node)
+        ring.add_node(own_node)
 
         ring.add_node(node_one)
         ring.remove_node(node_one)
@@ -75,3 +80,34 @@ class TestRing(TestCase):
         neighbour = ring.get_right_neighbour()
 
         assert neighbour.id == node_two.id
+
+    def test_neighbours_wrap_around(self):
+        own_node = Host("1111111", "127.0.0.1", 1111)
+        ring = Ring(own_node)
+        assert ring.get_left_neighbour().id == own_node.id
+
+        ring.set_nodes([Host("2222222", "127.0.0.1", 2222), own_node, Host("0000000", "127.0.0.1", 0)])
+        assert ring.get_left_neighbour().id == "2222222"
+        assert ring.get_right_neighbour().id == "0000000"
+        assert ring.get_node("2222222").unicast_port == 2222
+
+        ring.remove_node(ring.get_node("2222222"))
+        assert ring.get_left_neighbour().id == "0000000"
+        assert ring.get_right_neighbour().id == "0000000"
+
+    def test_neighbour_changed_events(self):
+        own_node = Host("1111111", "127.0.0.1", 1111)
+        ring = Ring(own_node)
+        ring.add_node(own_node)
+        left = []
+        right = []
+        ring.on_left_neighbour_changed.subscribe("test", lambda host: left.append(host.id))
+        ring.on_right_neighbour_changed.subscribe("test", lambda host: right.append(host.id))
+
+        ring.add_node(Host("3333333", "127.0.0.1", 3333))
+        ring.add_node(Host("2222222", "127.0.0.1", 2222))
+        ring.add_node(Host("4444444", "127.0.0.1", 4444))
+        ring.remove_node(Host("2222222", "127.0.0.1", 2222))
+
+        assert left == ["3333333", "2222222", "3333333"]
+        assert right == ["3333333", "4444444"]
@@ -0,0 +1,248 @@
+import json
+from unittest import TestCase
+
+from client import Client
+from models.GameGroup import GameGroup
+from models.Group import Group
+from models.Host import Host, HostType
+from server import Server
+from services.MembershipService import MembershipService
+from services.SocketService import SocketService
+from transport.SimulatedNetwork import SimulatedNetwork
+
+
+class TestSimulatedNetwork(TestCase):
+
+    def _start_servers(self, network, count, membership="group", election="lcr", ordering="isis"):
+        servers = []
+        for _ in range(count):
+            server = Server(network, membership=membership, election=election, ordering=ordering)
+            server.start()
+            servers.append(server)
+            network.run(0.5)
+        return servers
+
+    def test_servers_agree_on_leader(self):
+        network = SimulatedNetwork(seed=1, jitter=0.001)
+        servers = self._start_servers(network, 3)
+        network.run(10)
+
+        leaders = {server.election_service.current_leader.id for server in servers}
+        assert len(leaders) == 1
+        assert leaders == {max(server.own_host.id for server in servers)}
+        assert all(len(server.all_host_group.participants) == 3 for server in servers)
+
+    def test_swim_membership(self):
+        network = SimulatedNetwork(seed=1, jitter=0.001)
+        servers = self._start_servers(network, 5, membership="swim")
+        network.run(15)
+        assert all(len(server.all_host_group.participants) == 5 for server in servers)
+        assert len({server.election_service.current_leader.id for server in servers}) == 1
+
+        leader = next(server for server in servers if server.election_service.current_leader.id == server.own_host.id)
+        others = [server for server in servers if server is not leader]
+        network.partition([leader.own_host.address], [server.own_host.address for server in others])
+        network.run(10)
+        assert all(len(server.all_host_group.participants) == 4 for server in others)
+        leaders = {server.election_service.current_leader.id for server in others}
+        assert leaders == {max(server.own_host.id for server in others)}
+
+    def test_swim_updates_ride_on_unicasts(self):
+        network = SimulatedNetwork(seed=1)
+        members = []
+        for _ in range(2):
+            host = Host(network.new_id(), network.get_local_address(), network.get_unicast_port(), HostType.SERVER)
+            socket_service = SocketService(host, None, transport=network)
+            socket_service.set_on_unicast_delivered(lambda *args: None)
+            members.append(MembershipService(host, socket_service))
+            socket_service.start()
+        other = Host(network.new_id(), network.get_local_address(), network.get_unicast_port(), HostType.SERVER)
+        members[0].add_member(other)
+
+        # No probe runs, the join of other goes along with the next unicast
+        members[0].socket_service.send_unicast(members[1].own_host, "TEST/PIGGYBACK", "")
+        network.run(0.1)
+        assert other.id in members[1].members
+
+    def test_election_algorithms(self):
+        for election in ["hs", "bully"]:
+            network = SimulatedNetwork(seed=1, jitter=0.001)
+            servers = self._start_servers(network, 4, election=election)
+            network.run(10)
+            assert len({server.election_service.current_leader.id for server in servers}) == 1
+
+            leader = next(server for server in servers
+                          if server.election_service.current_leader.id == server.own_host.id)
+            others = [server for server in servers if server is not leader]
+            network.partition([leader.own_host.address], [server.own_host.address for server in others])
+            network.run(10)
+            leaders = {server.election_service.current_leader.id for server in others}
+            assert leaders == {max(server.own_host.id for server in others)}
+
+    def test_sequencer_order(self):
+        network = SimulatedNetwork(seed=1, jitter=0.001, reorder=0.1)
+        servers = self._start_servers(network, 4, ordering="sequencer")
+        network.run(10)
+        leader_id = servers[0].election_service.current_leader.id
+        assert {server.all_host_group.sequencer_id for server in servers} == {leader_id}
+
+        delivered = {server.own_host.id: [] for server in servers}
+        for server in servers:
+            def record(host, method, message, header, server=server):
+                if method == "TEST/ORDER":
+                    delivered[server.own_host.id].append(message)
+                server.on_server_multicast_received(host, method, message, header)
+            server.socket_service.set_on_multicast_delivered(record)
+        for i in range(20):
+            for server in servers[:3]:
+                server.socket_service.send_group_multicast(server.all_host_group, "TEST/ORDER", f"{server.own_host.id}:{i}")
+            network.run(0.001)
+        network.run(5)
+        orders = list(delivered.values())
+        assert len(orders[0]) == 60
+        assert all(order == orders[0] for order in orders)
+
+    def test_isis_concurrent_senders_with_equal_numbers(self):
+        # With this seed the members receive the two messages in different orders
+        network = SimulatedNetwork(seed=1, jitter=0.001)
+        members = []
+        for _ in range(3):
+            host = Host(network.new_id(), network.get_local_address(), network.get_unicast_port(), HostType.SERVER)
+            socket_service = SocketService(host, None, transport=network)
+            group = Group("MAIN_GROUP", socket_service)
+            socket_service.add_group(group)
+            members.append((socket_service, group, []))
+        for socket_service, group, delivered in members:
+            group.participants = [member[0].own_host for member in members]
+            socket_service.set_on_multicast_delivered(
+                lambda host, method, message, header, group=group, delivered=delivered:
+                delivered.append((message, group.last_delivered_order)))
+            socket_service.start()
+
+        for socket_service, group, _ in members[:2]:
+            socket_service.send_group_multicast(group, "TEST/ORDER", socket_service.own_host.id)
+        network.run(1)
+
+        orders = [delivered for _, _, delivered in members]
+        assert len(orders[0]) == 2
+        assert all(order == orders[0] for order in orders)
+        # Both agreed on 2, told apart by the process id
+        assert orders[0][0][1][0] == orders[0][1][1][0] == 2
+        # and both stay in the history to answer a NACK for 2
+        assert all(len(group.message_history.get(None, 2)) == 2 for _, group, _ in members)
+
+    def test_same_seed_same_run(self):
+        counts = []
+        for _ in range(2):
+            network = SimulatedNetwork(seed=7, jitter=0.002, reorder=0.1)
+            self._start_servers(network, 3)
+            network.run(5)
+            counts.append((network.datagrams_sent, network.datagrams_delivered, network.bytes_sent))
+        assert counts[0] == counts[1]
+
+    def test_partition_drops_datagrams(self):
+        network = SimulatedNetwork(seed=1)
+        servers = self._start_servers(network, 2)
+        network.run(5)
+        network.partition([servers[0].own_host.address], [servers[1].own_host.address])
+        dropped = network.datagrams_dropped
+        network.run(3)
+        assert network.datagrams_dropped > dropped
+
+    def test_clients_only_receive_their_game(self):
+        network = SimulatedNetwork(seed=1, jitter=0.001)
+        servers = self._start_servers(network, 3)
+        network.run(10)
+        clients = []
+        for _ in range(2):
+            client = Client(network)
+            client.start(with_keyboard=False)
+            clients.append(client)
+            network.run(0.5)
+        network.run(5)
+
+        for index, client in enumerate(clients):
+            client.take_input(f"create:game{index}")
+            network.run(0.5)
+            client.take_input(f"join:game{index}:player{index}")
+            network.run(0.5)
+        for client in clients:
+            client.take_input("up")
+        network.run(2)
+
+        for index, client in enumerate(clients):
+            game_groups = [group for group in client.socket_service.groups if isinstance(group, GameGroup)]
+            assert [group.game_id for group in game_groups] == [str(client.current_game.id)]
+            assert client.current_game.name == f"game{index}"
+        for server in servers:
+            games = {game.name: game.seq for game in server.game_service.games}
+            assert games == {client.current_game.name: client.current_game.seq for client in clients}
+            assert len(server.game_service.game_groups) == 2
+
+        clients[0].take_input("leave")
+        network.run(2)
+        assert clients[0].current_game is None
+        assert not any(isinstance(group, GameGroup) for group in clients[0].socket_service.groups)
+
+    def test_pipelined_commands(self):
+        network = SimulatedNetwork(seed=2, jitter=0.001)
+        servers = self._start_servers(network, 2)
+        network.run(10)
+        client = Client(network)
+        client.start(with_keyboard=False)
+        network.run(5)
+        client.take_input("create:game")
+        client.take_input("join:game:player")
+        network.run(1)
+
+        moves = ["up", "left", "down", "right", "up", "up"]
+        for move in moves:
+            client.take_input(move)
+        # Shown right away, before any server answered
+        assert client.predicted_game is not None
+        predicted = client.predicted_game.get_player_position(client.predicted_game.get_player(client.own_host.id))
+        network.run(2)
+
+        game = client.current_game
+        assert game.get_player(client.own_host.id).command_seq == 2 + len(moves)
+        assert game.get_player_position(game.get_player(client.own_host.id)) == predicted
+        assert client.predicted_game is None
+        assert not client.command_service.unacked
+
+        # A command that is sent again is acknowledged but not processed twice
+        seq = game.seq
+        owner = client.get_server_for_command("up")
+        client.socket_service.send_unicast(owner, "GS/CMD", json.dumps({'s': 3, 'c': "up"}))
+        network.run(2)
+        assert client.current_game.seq == seq
+
+    def test_tick_sends_one_update_per_tick(self):
+        network = SimulatedNetwork(seed=3, jitter=0.001)
+        servers = self._start_servers(network, 2)
+        network.run(10)
+        for server in servers:
+            server.game_service.start_ticks(5)
+        clients = []
+        for index in range(2):
+            client = Client(network)
+            client.start(with_keyboard=False)
+            clients.append(client)
+            network.run(0.5)
+        network.run(5)
+        clients[0].take_input("create:game")
+        network.run(0.5)
+        for index, client in enumerate(clients):
+            client.take_input(f"join:game:player{index}")
+            network.run(0.5)
+
+        seq = clients[0].current_game.seq
+        for _ in range(10):
+            for client in clients:
+                client.take_input("up")
+                client.take_input("down")
+        network.run(1)
+
+        for client in clients:
+            game = client.current_game
+            assert game.get_player(client.own_host.id).command_seq == client.command_service.seq
+            assert game.seq - seq <= 2
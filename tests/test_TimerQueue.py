@@ -0,0 +1,61 @@
+from unittest import TestCase
+
+from util.TimerQueue import TimerQueue
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTimerQueue(TestCase):
+
+    def test_runs_due_timers_in_deadline_order(self):
+        clock = _Clock()
+        timers = TimerQueue(clock=clock)
+        fired = []
+        timers.schedule(2, fired.append, "b")
+        timers.schedule(1, fired.append, "a")
+        timers.schedule(1.5, fired.append, "cancelled").cancel()
+
+        assert timers.next_timeout() == 1
+        clock.now = 3
+        timers.run_due()
+        assert fired == ["a", "b"]
+        assert timers.next_deadline() is None
+
+    def test_pop_due_leaves_running_to_the_caller(self):
+        clock = _Clock()
+        timers = TimerQueue(clock=clock)
+        fired = []
+        timers.schedule(1, fired.append, "a")
+        timers.schedule(1, fired.append, "cancelled")
+        timers.schedule(2, fired.append, "later")
+
+        clock.now = 1
+        due = timers.pop_due()
+        assert fired == []
+        due[1].cancel()
+        for timer in due:
+            timer.run()
+        assert fired == ["a"]
+        assert timers.next_deadline() == 2
+
+    def test_periodic_timer_reschedules_until_cancelled(self):
+        clock = _Clock()
+        timers = TimerQueue(clock=clock)
+        fired = []
+        periodic = timers.schedule_periodic(1, lambda: fired.append(clock.now))
+
+        for now in [1, 2, 3]:
+            clock.now = now
+            timers.run_due()
+        periodic.cancel()
+        clock.now = 4
+        timers.run_due()
+
+        assert fired == [1, 2, 3]
+        assert timers.next_deadline() is None
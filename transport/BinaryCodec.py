@@ -0,0 +1,490 @@
+import json
+import struct
+from socket import inet_aton, inet_ntoa
+
+# Frame layout (network byte order):
+#   u8 magic | u8 version | u8 frame kind | header section | payload section
+# Header section:
+#   u8 field count | u8 field id * count | fixed width fields | variable fields | [u16 len + json extension]
+# Payload section:
+#   u8 payload kind | u32 len | payload bytes
+#
+# The field id list doubles as the layout key, so the struct used for the fixed width
+# part is compiled once per distinct header shape and cached on both sides.
+#
+# Batch frames carry several complete frames (of either codec) for the same destination:
+#   u8 magic | u8 version | u8 frame kind | u8 count | (u16 len + frame) * count
+#
+# Fragment frames carry a slice of a frame that is too large for one datagram:
+#   u8 magic | u8 version | u8 frame kind | u32 fragment id | u16 index | u16 count | u16 sender unicast port
+#   | u8 len + sender id | slice
+
+MAGIC = 0xD5
+VERSION = 1
+
+INTERN_LIMIT = 4096
+
+
+class FrameKind:
+    MESSAGE = 0
+    BATCH = 1
+    FRAGMENT = 2
+
+
+class PayloadKind:
+    TEXT = 0
+    BYTES = 1
+
+
+# Codes are part of the wire format: only ever append to these lists
+METHODS = [
+    None, "ACK", "HB", "BC", "NACK", "REL_NACK", "SEQ/PROP", "SEQ/ANNOUNCEMENT",
+    "SERVER/WELCOME", "SERVER/JOIN", "SERVER/JOINED", "LCR/LEADER_ELECTION", "LCR/LEADER_CHANGED",
+    "MAIN_GROUP/HOSTS", "MAIN_GROUP/GET_HOSTS", "GS", "GS/OV", "GS/WIN", "GS/LS", "GS/MS", "GS/ERROR",
+    "GS/SYNC", "GS/SYNC_GAMES", "REL/STATE", "SEQ/STATE", "GS/DELTA", "GS/SYNC_GAME", "FRAG_NACK",
+    "GS/FWD", "GS/CMD", "GS/CMD_ACK", "SWIM/PING", "SWIM/PING_REQ", "SWIM/ACK",
+    "SWIM/SYNC", "MAIN_GROUP/VIEW", "HS/PROBE", "HS/REPLY", "BULLY/ELECTION", "BULLY/ANSWER",
+    "SEQ/HANDOVER", "SEQ/HANDOVER_STATE", "SEQ/RETRY", "MAIN_GROUP/GET_VIEW", "MAIN_GROUP/VIEW_STATE",
+]
+HOST_TYPES = [None, "server", "client", "monitor"]
+ORDERINGS = [None, "fifo", "sequencer"]
+
+_METHOD_CODES = {method: code for code, method in enumerate(METHODS) if method}
+_HOST_TYPE_CODES = {host_type: code for code, host_type in enumerate(HOST_TYPES) if host_type}
+_ORDERING_CODES = {ordering: code for code, ordering in enumerate(ORDERINGS) if ordering}
+
+_PREFIX = struct.Struct('!BBB')
+_BATCH_PREFIX = struct.Struct('!BBBB')
+_FRAGMENT_PREFIX = struct.Struct('!BBBIHHHB')
+_U16 = struct.Struct('!H')
+_PAYLOAD = struct.Struct('!BI')
+
+_U16_MAX = 0xFFFF
+_U32_MAX = 0xFFFFFFFF
+
+_id_to_bytes = {}
+_bytes_to_id = {}
+_address_to_bytes = {}
+_bytes_to_address = {}
+_str_to_bytes = {}
+_bytes_to_str = {}
+_id_blocks = {}
+_id_keys = {}
+_seq_structs = {}
+
+
+class BinaryCodecError(ValueError):
+    pass
+
+
+def _uuid_to_bytes(value):
+    # Only canonical (lowercase, dashed) uuids survive a round trip unchanged
+    if type(value) is not str or len(value) != 36 or value[8] != '-' or value[13] != '-' \
+            or value[18] != '-' or value[23] != '-' or value != value.lower():
+        return None
+    try:
+        return bytes.fromhex(value[0:8] + value[9:13] + value[14:18] + value[19:23] + value[24:])
+    except ValueError:
+        return None
+
+
+def _bytes_to_uuid(data):
+    h = data.hex()
+    return f"{h[0:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _remember(cache, key, value):
+    if len(cache) >= INTERN_LIMIT:
+        cache.clear()
+    cache[key] = value
+    return value
+
+
+def _intern_id(value):
+    packed = _id_to_bytes.get(value)
+    if packed is None:
+        packed = _uuid_to_bytes(value)
+        if packed is not None:
+            _remember(_id_to_bytes, value, packed)
+    return packed
+
+
+def _lookup_id(data):
+    value = _bytes_to_id.get(data)
+    if value is None:
+        value = _remember(_bytes_to_id, data, _bytes_to_uuid(data))
+    return value
+
+
+def _pack_address(value):
+    packed = _address_to_bytes.get(value)
+    if packed is None and type(value) is str:
+        try:
+            packed = inet_aton(value)
+        except OSError:
+            return None
+        if inet_ntoa(packed) != value:
+            return None
+        _remember(_address_to_bytes, value, packed)
+    return packed
+
+
+def _unpack_address(data):
+    value = _bytes_to_address.get(data)
+    if value is None:
+        value = _remember(_bytes_to_address, data, inet_ntoa(data))
+    return value
+
+
+def _u16(value):
+    return value if type(value) is int and 0 <= value <= _U16_MAX else None
+
+
+def _u32(value):
+    return value if type(value) is int and 0 <= value <= _U32_MAX else None
+
+
+# Variable width fields return None if the value can not be represented exactly,
+# the key is then carried in the json extension instead
+
+def _pack_str8(value):
+    packed = _str_to_bytes.get(value) if type(value) is str else None
+    if packed is None and type(value) is str:
+        encoded = value.encode()
+        if len(encoded) > 0xFF:
+            return None
+        packed = _remember(_str_to_bytes, value, bytes([len(encoded)]) + encoded)
+    return packed
+
+
+def _unpack_str8(data, offset):
+    end = offset + 1 + data[offset]
+    packed = data[offset:end]
+    value = _bytes_to_str.get(packed)
+    if value is None:
+        value = _remember(_bytes_to_str, packed, packed[1:].decode())
+    return value, end
+
+
+def _seq_map_struct(count):
+    seq_struct = _seq_structs.get(count)
+    if seq_struct is None:
+        seq_struct = _remember(_seq_structs, count, struct.Struct(f'!H{count * 16}s{count}I'))
+    return seq_struct
+
+
+def _pack_seq_map(value):
+    # Host ids and sequence numbers are packed as two blocks, the id block of a group rarely
+    # changes and is interned as a whole
+    if type(value) is not dict or len(value) > _U16_MAX:
+        return None
+    keys = tuple(value)
+    id_block = _id_blocks.get(keys)
+    if id_block is None:
+        packed_ids = [_intern_id(host_id) for host_id in keys]
+        if None in packed_ids:
+            return None
+        id_block = _remember(_id_blocks, keys, b''.join(packed_ids))
+    values = list(value.values())
+    for seq in values:
+        if type(seq) is not int or not 0 <= seq <= _U32_MAX:
+            return None
+    return _seq_map_struct(len(keys)).pack(len(keys), id_block, *values)
+
+
+def _unpack_seq_map(data, offset):
+    count = _U16.unpack_from(data, offset)[0]
+    seq_struct = _seq_map_struct(count)
+    _, id_block, *values = seq_struct.unpack_from(data, offset)
+    keys = _id_keys.get(id_block)
+    if keys is None:
+        keys = _remember(_id_keys, id_block, [_lookup_id(id_block[i:i + 16]) for i in range(0, count * 16, 16)])
+    return dict(zip(keys, values)), offset + seq_struct.size
+
+
+def _pack_header(value):
+    if type(value) is not dict:
+        return None
+    section = _encode_header(value)
+    return _U16.pack(len(section)) + section if len(section) <= _U16_MAX else None
+
+
+def _unpack_header(data, offset):
+    length = _U16.unpack_from(data, offset)[0]
+    offset = offset + 2
+    header, _ = _decode_header(data, offset)
+    return header, offset + length
+
+
+class _Fixed:
+    def __init__(self, code, to_wire, from_wire=None):
+        self.code = code
+        self.to_wire = to_wire
+        self.from_wire = from_wire
+
+
+class _Variable:
+    def __init__(self, pack, unpack):
+        self.pack = pack
+        self.unpack = unpack
+
+
+# The list index is the field id on the wire: only ever append
+_FIELDS = [
+    ('id', _Fixed('16s', _intern_id, _lookup_id)),
+    ('t', _Fixed('B', _HOST_TYPE_CODES.get, HOST_TYPES.__getitem__)),
+    ('a', _Fixed('4s', _pack_address, _unpack_address)),
+    ('p', _Fixed('H', _u16)),
+    ('m', _Fixed('B', _METHOD_CODES.get, METHODS.__getitem__)),
+    ('seq', _Fixed('I', _u32)),
+    ('m_id', _Fixed('16s', _uuid_to_bytes, _bytes_to_uuid)),
+    ('g_ident', _Variable(_pack_str8, _unpack_str8)),
+    ('rel_seq', _Fixed('I', _u32)),
+    ('rel_delivered_seq', _Variable(_pack_seq_map, _unpack_seq_map)),
+    ('resent', _Fixed('I', _u32)),
+    ('rel_orig_header', _Variable(_pack_header, _unpack_header)),
+    ('ep', _Fixed('I', _u32)),
+    ('ack', _Fixed('I', _u32)),
+    ('o', _Fixed('B', _ORDERING_CODES.get, ORDERINGS.__getitem__)),
+]
+_EXT_FIELD_ID = 0xFF
+
+_FIELD_IDS = {key: field_id for field_id, (key, _) in enumerate(_FIELDS)}
+
+
+class _Layout:
+    def __init__(self, field_ids):
+        self.field_ids = bytes(field_ids)
+        self.prefix = bytes([len(field_ids)]) + self.field_ids
+        self.fixed = []
+        self.variable = []
+        self.from_wire = []
+        self.has_ext = False
+        codes = []
+        for field_id in field_ids:
+            if field_id == _EXT_FIELD_ID:
+                self.has_ext = True
+                continue
+            key, field = _FIELDS[field_id]
+            if isinstance(field, _Fixed):
+                self.fixed.append((key, field.to_wire))
+                codes.append(field.code)
+                if field.from_wire:
+                    self.from_wire.append((key, field.from_wire))
+            else:
+                self.variable.append((key, field.pack, field.unpack))
+        self.fixed_keys = [key for key, _ in self.fixed]
+        self.struct = struct.Struct('!' + ''.join(codes))
+
+
+_encode_layouts = {}
+_decode_layouts = {}
+
+
+def _compile_encode_layout(keys):
+    # Known fixed fields first, then variable ones, unknown keys go to the extension
+    fixed = [_FIELD_IDS[key] for key in keys if key in _FIELD_IDS and isinstance(_FIELDS[_FIELD_IDS[key]][1], _Fixed)]
+    variable = [_FIELD_IDS[key] for key in keys if key in _FIELD_IDS and isinstance(_FIELDS[_FIELD_IDS[key]][1], _Variable)]
+    ext_keys = [key for key in keys if key not in _FIELD_IDS]
+    layout = _Layout(fixed + variable + ([_EXT_FIELD_ID] if ext_keys else []))
+    layout.ext_keys = ext_keys
+    return _remember(_encode_layouts, keys, layout)
+
+
+def _get_decode_layout(field_ids):
+    layout = _decode_layouts.get(field_ids)
+    if layout is None:
+        for field_id in field_ids:
+            if field_id != _EXT_FIELD_ID and field_id >= len(_FIELDS):
+                raise BinaryCodecError(f"Unknown field id {field_id}")
+        layout = _remember(_decode_layouts, field_ids, _Layout(field_ids))
+    return layout
+
+
+def _encode_with_layout(header, layout):
+    try:
+        values = [to_wire(header[key]) for key, to_wire in layout.fixed]
+    except TypeError:
+        return None
+    if None in values:
+        return None
+    chunks = [layout.prefix, layout.struct.pack(*values)]
+    for key, pack, _ in layout.variable:
+        packed = pack(header[key])
+        if packed is None:
+            return None
+        chunks.append(packed)
+    if layout.has_ext:
+        encoded_ext = json.dumps({key: header[key] for key in layout.ext_keys}, separators=(',', ':')).encode()
+        if len(encoded_ext) > _U16_MAX:
+            raise BinaryCodecError("Header extension too large")
+        chunks.append(_U16.pack(len(encoded_ext)))
+        chunks.append(encoded_ext)
+    return b''.join(chunks)
+
+
+def _encode_header(header: dict):
+    keys = tuple(header)
+    layout = _encode_layouts.get(keys)
+    if layout is None:
+        layout = _compile_encode_layout(keys)
+    section = _encode_with_layout(header, layout)
+    if section is None:
+        section = _encode_header_slow(header)
+    return section
+
+
+def _encode_header_slow(header: dict):
+    # Some value does not fit its fixed width field, move exactly those keys to the extension
+    representable = {}
+    extension = {}
+    for key, value in header.items():
+        field_id = _FIELD_IDS.get(key)
+        if field_id is not None:
+            field = _FIELDS[field_id][1]
+            try:
+                fits = (field.to_wire if isinstance(field, _Fixed) else field.pack)(value) is not None
+            except TypeError:
+                fits = False
+            if fits:
+                representable[key] = value
+                continue
+        extension[key] = value
+    layout = _compile_encode_layout(tuple(representable))
+    layout = _Layout(list(layout.field_ids.rstrip(bytes([_EXT_FIELD_ID]))) + [_EXT_FIELD_ID])
+    layout.ext_keys = list(extension)
+    return _encode_with_layout({**representable, **extension}, layout)
+
+
+def _decode_header(data, offset):
+    count = data[offset]
+    offset = offset + 1
+    layout = _get_decode_layout(data[offset:offset + count])
+    offset = offset + count
+    header = dict(zip(layout.fixed_keys, layout.struct.unpack_from(data, offset)))
+    offset = offset + layout.struct.size
+    for key, from_wire in layout.from_wire:
+        header[key] = from_wire(header[key])
+    for key, _, unpack in layout.variable:
+        header[key], offset = unpack(data, offset)
+    if layout.has_ext:
+        length = _U16.unpack_from(data, offset)[0]
+        offset = offset + 2
+        header.update(json.loads(data[offset:offset + length]))
+        offset = offset + length
+    return header, offset
+
+
+def is_binary_frame(data):
+    return len(data) > 0 and data[0] == MAGIC
+
+
+def is_batch_frame(data):
+    return len(data) > 2 and data[0] == MAGIC and data[2] == FrameKind.BATCH
+
+
+# Bytes a frame adds to a batch besides its own length
+BATCH_FRAME_OVERHEAD = _U16.size
+BATCH_HEADER_SIZE = _BATCH_PREFIX.size
+BATCH_MAX_FRAMES = 0xFF
+
+
+def is_fragment_frame(data):
+    return len(data) > 2 and data[0] == MAGIC and data[2] == FrameKind.FRAGMENT
+
+
+def encode_fragments(data, sender_id: str, fragment_id: int, port: int, max_bytes: int):
+    # Splits data into fragment frames of at most max_bytes each
+    sender = sender_id.encode()
+    slice_size = max_bytes - _FRAGMENT_PREFIX.size - len(sender)
+    if slice_size <= 0:
+        raise BinaryCodecError("Fragment size too small")
+    count = (len(data) + slice_size - 1) // slice_size
+    if count > _U16_MAX:
+        raise BinaryCodecError("Too many fragments")
+    return [b''.join([
+        _FRAGMENT_PREFIX.pack(MAGIC, VERSION, FrameKind.FRAGMENT, fragment_id, index, count, port, len(sender)),
+        sender,
+        data[index * slice_size:(index + 1) * slice_size],
+    ]) for index in range(count)]
+
+
+def decode_fragment(data):
+    # Returns sender id, fragment id, index, count, sender unicast port and the slice
+    try:
+        magic, version, kind, fragment_id, index, count, port, sender_length = _FRAGMENT_PREFIX.unpack_from(data, 0)
+        if version != VERSION:
+            raise BinaryCodecError(f"Unsupported wire version {version}")
+        offset = _FRAGMENT_PREFIX.size
+        sender_id = bytes(data[offset:offset + sender_length]).decode()
+        if index >= count:
+            raise BinaryCodecError("Fragment index out of range")
+    except (struct.error, UnicodeDecodeError) as e:
+        raise BinaryCodecError(f"Malformed fragment: {e}")
+    return sender_id, fragment_id, index, count, port, bytes(data[offset + sender_length:])
+
+
+def encode_batch(frames):
+    parts = [_BATCH_PREFIX.pack(MAGIC, VERSION, FrameKind.BATCH, len(frames))]
+    for frame in frames:
+        parts.append(_U16.pack(len(frame)))
+        parts.append(frame)
+    return b''.join(parts)
+
+
+def decode_batch(data):
+    try:
+        magic, version, kind, count = _BATCH_PREFIX.unpack_from(data, 0)
+        if version != VERSION:
+            raise BinaryCodecError(f"Unsupported wire version {version}")
+        offset = _BATCH_PREFIX.size
+        frames = []
+        for _ in range(count):
+            length = _U16.unpack_from(data, offset)[0]
+            offset = offset + _U16.size
+            frame = data[offset:offset + length]
+            if len(frame) != length:
+                raise BinaryCodecError("Truncated batch")
+            frames.append(frame)
+            offset = offset + length
+    except struct.error as e:
+        raise BinaryCodecError(f"Malformed batch: {e}")
+    return frames
+
+
+class BinaryCodec:
+    name = "binary"
+
+    def encode(self, header: dict, payload):
+        if type(payload) is bytes:
+            payload_kind = PayloadKind.BYTES
+        else:
+            payload_kind = PayloadKind.TEXT
+            payload = str(payload).encode()
+        return b''.join([
+            _PREFIX.pack(MAGIC, VERSION, FrameKind.MESSAGE),
+            _encode_header(header),
+            _PAYLOAD.pack(payload_kind, len(payload)),
+            payload,
+        ])
+
+    def decode(self, message):
+        try:
+            magic, version, kind = _PREFIX.unpack_from(message, 0)
+            if magic != MAGIC:
+                raise BinaryCodecError("Not a binary frame")
+            if version != VERSION:
+                raise BinaryCodecError(f"Unsupported wire version {version}")
+            if kind != FrameKind.MESSAGE:
+                raise BinaryCodecError(f"Unexpected frame kind {kind}")
+            header, offset = _decode_header(message, _PREFIX.size)
+            payload_kind, length = _PAYLOAD.unpack_from(message, offset)
+            offset = offset + _PAYLOAD.size
+            payload = bytes(message[offset:offset + length])
+            if len(payload) != length:
+                raise BinaryCodecError("Truncated payload")
+            if payload_kind == PayloadKind.TEXT:
+                payload = payload.decode('utf-8')
+        except (struct.error, IndexError, TypeError, UnicodeDecodeError) as e:
+            raise BinaryCodecError(f"Malformed frame: {e}")
+        return header, payload
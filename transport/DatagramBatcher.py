@@ -0,0 +1,62 @@
+import threading
+
+from config import BATCH_MAX_BYTES
+from transport.BinaryCodec import encode_batch, BATCH_FRAME_OVERHEAD, BATCH_HEADER_SIZE, BATCH_MAX_FRAMES
+
+
+class DatagramBatcher:
+    # Coalesces small frames for the same (socket, address) into one batch datagram.
+    # A batch is sent when the next frame would exceed max_bytes or on flush, on_pending is
+    # called when the first frame is waiting so the owner can arrange a flush.
+    # Frames sent unbatched to a destination flush its pending batch first to keep the order.
+    def __init__(self, max_bytes: int = BATCH_MAX_BYTES, on_pending=None):
+        self.max_bytes = max_bytes
+        self.on_pending = on_pending
+        self.datagrams_sent = 0
+        self.frames_sent = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, sock, address, data):
+        if not self.max_bytes or len(data) + BATCH_HEADER_SIZE + BATCH_FRAME_OVERHEAD > self.max_bytes:
+            self.send(sock, address, data)
+            return
+        with self._lock:
+            was_idle = not self._pending
+            key = (sock, address)
+            batch = self._pending.get(key)
+            if batch and (batch[1] + len(data) + BATCH_FRAME_OVERHEAD > self.max_bytes
+                          or len(batch[0]) >= BATCH_MAX_FRAMES):
+                self._send_batch(key, batch[0])
+                batch = None
+            if batch:
+                batch[0].append(data)
+                batch[1] = batch[1] + len(data) + BATCH_FRAME_OVERHEAD
+            else:
+                self._pending[key] = [[data], BATCH_HEADER_SIZE + len(data) + BATCH_FRAME_OVERHEAD]
+        if was_idle and self.on_pending:
+            self.on_pending()
+
+    def send(self, sock, address, data):
+        with self._lock:
+            key = (sock, address)
+            batch = self._pending.pop(key, None)
+            if batch:
+                self._send_batch(key, batch[0])
+            self.datagrams_sent = self.datagrams_sent + 1
+            self.frames_sent = self.frames_sent + 1
+            sock.sendto(data, address)
+
+    def flush(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            for key, batch in pending.items():
+                self._send_batch(key, batch[0])
+
+    def _send_batch(self, key, frames):
+        sock, address = key
+        self.datagrams_sent = self.datagrams_sent + 1
+        self.frames_sent = self.frames_sent + len(frames)
+        # A single frame goes out as is, receivers do not have to unpack it
+        sock.sendto(frames[0] if len(frames) == 1 else encode_batch(frames), address)
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+from config import FRAGMENT_BUFFER_MAX_BYTES, FRAGMENT_TIMEOUT, FRAGMENT_NACK_DELAY
+
+# Fragment ids of completed messages remembered to ignore late duplicates
+COMPLETED_LIMIT = 1024
+
+
+class _PartialMessage:
+    def __init__(self, count, address, now):
+        self.count = count
+        self.address = address
+        self.chunks = {}
+        self.size = 0
+        self.first_seen = now
+        self.last_progress = now
+
+
+class FragmentReassembler:
+    # Collects fragments per (sender id, fragment id) until the message is complete.
+    # Incomplete messages are given up after timeout, the oldest ones are dropped when more than
+    # max_bytes are buffered. get_missing reports the fragments to ask for again.
+    def __init__(self, max_bytes: int = FRAGMENT_BUFFER_MAX_BYTES, timeout: float = FRAGMENT_TIMEOUT,
+                 nack_delay: float = FRAGMENT_NACK_DELAY):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.nack_delay = nack_delay
+        self.size = 0
+        self._partial = OrderedDict()
+        self._completed = OrderedDict()
+
+    def __len__(self):
+        return len(self._partial)
+
+    def add(self, sender_id, fragment_id, index, count, chunk, address, now):
+        # Returns the reassembled data once the last missing fragment arrived
+        key = (sender_id, fragment_id)
+        if key in self._completed:
+            return None
+        partial = self._partial.get(key)
+        if not partial:
+            partial = _PartialMessage(count, address, now)
+            self._partial[key] = partial
+        if index in partial.chunks or count != partial.count:
+            return None
+        partial.chunks[index] = chunk
+        partial.size = partial.size + len(chunk)
+        partial.last_progress = now
+        self.size = self.size + len(chunk)
+
+        if len(partial.chunks) == partial.count:
+            self._drop(key)
+            self._completed[key] = True
+            if len(self._completed) > COMPLETED_LIMIT:
+                self._completed.popitem(last=False)
+            return b''.join(partial.chunks[i] for i in range(partial.count))
+
+        while self.size > self.max_bytes and self._partial:
+            oldest = next(iter(self._partial))
+            print(f"[FRAGMENT] Reassembly buffer full, drop message {oldest[1]} of {oldest[0]}")
+            self._drop(oldest)
+        return None
+
+    def get_missing(self, now):
+        # Returns (sender id, fragment id, address, missing indexes) for messages without progress
+        # for nack_delay and drops the ones that timed out
+        missing = []
+        for key, partial in list(self._partial.items()):
+            if now - partial.first_seen > self.timeout:
+                print(f"[FRAGMENT] Timeout, drop message {key[1]} of {key[0]}")
+                self._drop(key)
+            elif now - partial.last_progress >= self.nack_delay:
+                partial.last_progress = now
+                indexes = [i for i in range(partial.count) if i not in partial.chunks]
+                missing.append((key[0], key[1], partial.address, indexes))
+        return missing
+
+    def _drop(self, key):
+        partial = self._partial.pop(key)
+        self.size = self.size - partial.size
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+
+from config import FRAGMENT_SIZE, FRAGMENT_SEND_CACHE_BYTES
+from transport.BinaryCodec import encode_fragments
+
+
+class FragmentSender:
+    # Splits oversized frames into fragments and keeps the latest ones for selective retransmission
+    def __init__(self, sender_id: str, port: int, max_bytes: int = FRAGMENT_SIZE,
+                 cache_bytes: int = FRAGMENT_SEND_CACHE_BYTES):
+        self.sender_id = sender_id
+        self.port = port
+        self.max_bytes = max_bytes
+        self.cache_bytes = cache_bytes
+        self.size = 0
+        self._fragment_id = 0
+        self._sent = OrderedDict()
+
+    def needs_fragmentation(self, data):
+        return len(data) > self.max_bytes
+
+    def fragment(self, sock, address, data):
+        self._fragment_id = (self._fragment_id + 1) & 0xFFFFFFFF
+        fragments = encode_fragments(data, self.sender_id, self._fragment_id, int(self.port), self.max_bytes)
+        self._sent[self._fragment_id] = (sock, address, fragments)
+        self.size = self.size + sum(len(f) for f in fragments)
+        while self.size > self.cache_bytes and len(self._sent) > 1:
+            _, (_, _, dropped) = self._sent.popitem(last=False)
+            self.size = self.size - sum(len(f) for f in dropped)
+        return fragments
+
+    def get_fragments(self, fragment_id, indexes):
+        # Returns socket, address and the requested fragments if they are still cached
+        sent = self._sent.get(fragment_id)
+        if not sent:
+            return None, None, []
+        sock, address, fragments = sent
+        return sock, address, [fragments[i] for i in indexes if i < len(fragments)]
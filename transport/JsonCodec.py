@@ -0,0 +1,22 @@
+import json
+
+from config import HEADER_DELIMITER
+
+
+class JsonCodec:
+    # Legacy framing: json header and str(payload) joined by HEADER_DELIMITER
+    name = "json"
+
+    def encode(self, header: dict, payload):
+        json_header = json.dumps(header)
+        return HEADER_DELIMITER.join([json_header, str(payload)]).encode()
+
+    def decode(self, message):
+        decoded_message = message.decode('utf-8')
+        # Only split once, the payload itself may contain the delimiter
+        message_chunks = decoded_message.split(HEADER_DELIMITER, 1)
+        header = json.loads(message_chunks[0])
+        payload = ''
+        if len(message_chunks) > 1:
+            payload = message_chunks[1]
+        return header, payload
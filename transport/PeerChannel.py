@@ -0,0 +1,159 @@
+from collections import OrderedDict, deque
+
+from config import UNICAST_WINDOW, UNICAST_INITIAL_RTO, UNICAST_MIN_RTO, UNICAST_MAX_RTO, \
+    UNICAST_DUP_ACK_THRESHOLD
+
+
+class _Outstanding:
+    def __init__(self, data, sent_at):
+        self.data = data
+        self.sent_at = sent_at
+        self.transmissions = 1
+
+
+class PeerChannel:
+    # Reliable unicast state for one peer.
+    # Sending: sequence numbers per epoch, a window of unacknowledged datagrams, a backlog for
+    # everything beyond the window and an RTT based retransmission timeout (RFC 6298).
+    # Receiving: in order delivery per epoch with duplicate suppression and a reorder buffer.
+    # A new epoch (e.g. after the sender gave up on old datagrams) restarts at seq 1.
+    def __init__(self, epoch: int, window: int = UNICAST_WINDOW):
+        self.window = window
+        self.address = None
+        self.timer = None
+
+        self.epoch = epoch
+        self.seq = 0
+        self.unacked = OrderedDict()
+        self.backlog = deque()
+        self.last_ack = 0
+        self.duplicate_acks = 0
+        self.srtt = None
+        self.rttvar = None
+        self.rto = UNICAST_INITIAL_RTO
+        # Datagrams sent for the first time and again, over all epochs
+        self.sent = 0
+        self.retransmitted = 0
+
+        self.receive_epoch = None
+        self.expected_seq = 1
+        self.reorder_buffer = {}
+
+    # Sending
+
+    def next_seq(self):
+        self.seq = self.seq + 1
+        return self.seq
+
+    def can_send(self):
+        return len(self.unacked) < self.window and not self.backlog
+
+    def on_sent(self, seq, data, now):
+        self.unacked[seq] = _Outstanding(data, now)
+        self.sent = self.sent + 1
+
+    def on_retransmitted(self, seq, now):
+        self.retransmitted = self.retransmitted + 1
+        outstanding = self.unacked[seq]
+        outstanding.transmissions = outstanding.transmissions + 1
+        outstanding.sent_at = now
+
+    def oldest_unacked(self):
+        return next(iter(self.unacked.items()), (None, None))
+
+    def on_ack(self, ack, now):
+        # Returns True if the ack is a duplicate that should trigger a fast retransmit
+        if ack <= self.last_ack:
+            if ack == self.last_ack and self.unacked:
+                self.duplicate_acks = self.duplicate_acks + 1
+                return self.duplicate_acks == UNICAST_DUP_ACK_THRESHOLD
+            return False
+        self.last_ack = ack
+        self.duplicate_acks = 0
+        sample = None
+        retransmitted = False
+        while self.unacked:
+            seq, outstanding = next(iter(self.unacked.items()))
+            if seq > ack:
+                break
+            del self.unacked[seq]
+            retransmitted = retransmitted or outstanding.transmissions > 1
+            sample = now - outstanding.sent_at
+        # Karn: only datagrams sent once give a meaningful sample. If the ack also covers a retransmitted
+        # one, the others waited behind it at the receiver and would inflate the estimate
+        if sample is not None and not retransmitted:
+            self._update_rto(sample)
+        elif self.srtt is not None:
+            # New data got through, undo the back off like TCP does
+            self.rto = self._rto_from_estimate()
+        return False
+
+    def take_sendable(self):
+        sendable = []
+        while self.backlog and len(self.unacked) + len(sendable) < self.window:
+            sendable.append(self.backlog.popleft())
+        return sendable
+
+    def back_off(self):
+        self.rto = min(self.rto * 2, UNICAST_MAX_RTO)
+
+    def reset_send(self, epoch):
+        self.epoch = epoch
+        self.seq = 0
+        self.unacked.clear()
+        self.backlog.clear()
+        self.last_ack = 0
+        self.duplicate_acks = 0
+
+    def stats(self):
+        # The share of retransmissions in all transmissions estimates the loss towards the peer (spurious
+        # timeouts count as well)
+        return {
+            'srtt': self.srtt,
+            'rto': self.rto,
+            'sent': self.sent,
+            'retransmitted': self.retransmitted,
+            'loss': self.retransmitted / (self.sent + self.retransmitted) if self.sent else 0.0,
+            'unacked': len(self.unacked),
+            'backlog': len(self.backlog),
+        }
+
+    def _update_rto(self, sample):
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+            self.srtt = 0.875 * self.srtt + 0.125 * sample
+        self.rto = self._rto_from_estimate()
+
+    def _rto_from_estimate(self):
+        return min(max(self.srtt + 4 * self.rttvar, UNICAST_MIN_RTO), UNICAST_MAX_RTO)
+
+    # Receiving
+
+    def receive(self, epoch, seq, item):
+        # Returns the items that are deliverable now, or None if the datagram belongs to an old epoch
+        if self.receive_epoch is None or epoch > self.receive_epoch:
+            self.receive_epoch = epoch
+            self.expected_seq = 1
+            self.reorder_buffer = {}
+        elif epoch < self.receive_epoch:
+            return None
+
+        if seq < self.expected_seq or seq in self.reorder_buffer:
+            return []
+        if seq != self.expected_seq:
+            if seq < self.expected_seq + self.window:
+                self.reorder_buffer[seq] = item
+            return []
+
+        ready = [item]
+        self.expected_seq = self.expected_seq + 1
+        while self.expected_seq in self.reorder_buffer:
+            ready.append(self.reorder_buffer.pop(self.expected_seq))
+            self.expected_seq = self.expected_seq + 1
+        return ready
+
+    def cumulative_ack(self):
+        return self.expected_seq - 1
@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import random
+import uuid
+
+from config import BUFFER_SIZE
+
+_KIND_BROADCAST = "broadcast"
+_KIND_UNICAST = "unicast"
+_KIND_MULTICAST = "multicast"
+
+
+def _is_multicast_address(address):
+    first = int(address.split('.')[0]) if address and address[0].isdigit() else 0
+    return 224 <= first <= 239
+
+
+class SimulatedSocket:
+    # Stands in for the sockets of one SocketService, datagrams go through the network
+    def __init__(self, network, kind, address, port):
+        self.network = network
+        self.kind = kind
+        self.address = address
+        self.port = port
+        self.service = None
+
+    def sendto(self, data, address):
+        self.network.send(self, data, address)
+
+    def close(self):
+        pass
+
+
+class SimulatedNetwork:
+    # In process network for many SocketServices (servers and clients) with a virtual clock.
+    # Nothing runs on threads: run / run_until deliver datagrams and fire the timers of all nodes
+    # in time order, so a run is reproducible for a given seed. Latency, jitter, loss, reordering
+    # and partitions apply per delivered datagram.
+    runs_tasks = True
+
+    def __init__(self, seed: int = 0, latency: float = 0.001, jitter: float = 0.0, loss: float = 0.0,
+                 reorder: float = 0.0, reorder_delay: float = 0.005):
+        self.random = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay
+        self.now = 0.0
+        self.services = []
+        self._sockets = []
+        self._unicast = {}
+        self._events = []
+        # (deadline, counter, service), may contain outdated entries that are checked on pop
+        self._timers = []
+        self._counter = itertools.count()
+        self._partition = {}
+        self._next_address = 0
+
+        self.datagrams_sent = 0
+        self.datagrams_delivered = 0
+        self.datagrams_dropped = 0
+        self.bytes_sent = 0
+
+    # Transport interface used by SocketService and the hosts
+
+    def clock(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def broadcast_socket(self, address, port):
+        return self._add_socket(SimulatedSocket(self, _KIND_BROADCAST, address, port))
+
+    def unicast_socket(self, address, port):
+        sock = self._add_socket(SimulatedSocket(self, _KIND_UNICAST, address, port))
+        self._unicast[(address, int(port))] = sock
+        return sock
+
+    def multicast_socket(self, address, port):
+        return self._add_socket(SimulatedSocket(self, _KIND_MULTICAST, address, port))
+
+    def get_local_address(self):
+        self._next_address = self._next_address + 1
+        return f"10.0.{self._next_address // 250}.{self._next_address % 250 + 1}"
+
+    def get_unicast_port(self):
+        return 5001
+
+    def new_id(self):
+        return str(uuid.UUID(int=self.random.getrandbits(128)))
+
+    def add_socket(self, socket_service, sock):
+        sock.service = socket_service
+
+    def remove_socket(self, socket_service, sock):
+        if sock in self._sockets:
+            self._sockets.remove(sock)
+
+    def start(self, socket_service):
+        # The broadcast socket of a client only sends and is not in its sockets
+        for sock in [socket_service.broadcast_socket] + socket_service.sockets:
+            sock.service = socket_service
+        if socket_service not in self.services:
+            self.services.append(socket_service)
+            # No select loop to wake up, the network runs the timers
+            socket_service.timers.on_schedule = lambda: self._push_timer(socket_service)
+            self._push_timer(socket_service)
+
+    # Faults
+
+    def partition(self, *groups):
+        # Addresses in different groups can not reach each other, unlisted ones form a group of their own
+        self._partition = {}
+        for index, group in enumerate(groups):
+            for address in group:
+                self._partition[address] = index
+
+    def heal(self):
+        self._partition = {}
+
+    # Running
+
+    def run(self, duration):
+        self.run_until(self.now + duration)
+
+    def run_until(self, end_time, condition=None):
+        # Runs until end_time or until condition() holds, returns whether the condition was met
+        while True:
+            if condition and condition():
+                return True
+            event_time = self._events[0][0] if self._events else None
+            timer_time = self._timers[0][0] if self._timers else None
+            if timer_time is not None and (event_time is None or timer_time < event_time):
+                if timer_time > end_time:
+                    break
+                _, _, service = heapq.heappop(self._timers)
+                deadline = service.timers.next_deadline()
+                if deadline is None or deadline > timer_time:
+                    # The timer was cancelled, continue with the next one of this service
+                    self._push_timer(service)
+                    continue
+                self.now = max(self.now, timer_time)
+                service.timers.run_due()
+                service.batcher.flush()
+                self._push_timer(service)
+            elif event_time is not None:
+                if event_time > end_time:
+                    break
+                self.now = max(self.now, event_time)
+                _, _, target, data, source = heapq.heappop(self._events)
+                self.datagrams_delivered = self.datagrams_delivered + 1
+                target.service._on_datagram(target, data, source)
+                target.service.batcher.flush()
+            else:
+                break
+        self.now = max(self.now, end_time)
+        return bool(condition and condition())
+
+    def _push_timer(self, service):
+        deadline = service.timers.next_deadline()
+        if deadline is not None:
+            heapq.heappush(self._timers, (deadline, next(self._counter), service))
+
+    def _add_socket(self, sock):
+        self._sockets.append(sock)
+        return sock
+
+    def send(self, sock, data, address):
+        if not sock.service:
+            return
+        self.datagrams_sent = self.datagrams_sent + 1
+        self.bytes_sent = self.bytes_sent + len(data)
+        source_address = sock.service.own_host.address
+        source = (source_address, sock.port)
+        for target in self._targets(sock, address):
+            if not self._reachable(source_address, target.service.own_host.address) \
+                    or self.random.random() < self.loss:
+                self.datagrams_dropped = self.datagrams_dropped + 1
+                continue
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            if self.random.random() < self.reorder:
+                delay = delay + self.random.uniform(0, self.reorder_delay)
+            # Like recvfrom(BUFFER_SIZE), larger datagrams arrive truncated
+            heapq.heappush(self._events, (self.now + delay, next(self._counter), target, data[:BUFFER_SIZE], source))
+
+    def _targets(self, sock, address):
+        host, port = address[0], int(address[1])
+        if _is_multicast_address(host):
+            candidates = [s for s in self._sockets if s.kind == _KIND_MULTICAST and s.address == host and s.port == port]
+        elif (host, port) in self._unicast:
+            candidates = [self._unicast[(host, port)]]
+        elif sock.kind == _KIND_BROADCAST:
+            candidates = [s for s in self._sockets if s.kind == _KIND_BROADCAST and s.port == port]
+        else:
+            candidates = []
+        return [s for s in candidates if s.service and s in s.service.sockets]
+
+    def _reachable(self, source_address, target_address):
+        if not self._partition:
+            return True
+        return self._partition.get(source_address, -1) == self._partition.get(target_address, -1)
@@ -0,0 +1,43 @@
+import time
+import uuid
+from threading import Thread
+
+from sockets.BroadcastSocket import BroadcastSocket
+from sockets.MulticastSocket import MulticastSocket
+from sockets.UnicastSocket import UnicastSocket
+from util.address_helper import get_local_address, get_random_unicast_port
+
+
+class UdpTransport:
+    # Real sockets, SocketService serves them on its own thread
+    runs_tasks = False
+
+    clock = staticmethod(time.monotonic)
+    time = staticmethod(time.time)
+
+    def broadcast_socket(self, address, port):
+        return BroadcastSocket(address, port)
+
+    def unicast_socket(self, address, port):
+        return UnicastSocket(address, port)
+
+    def multicast_socket(self, address, port):
+        return MulticastSocket(address, port)
+
+    def get_local_address(self):
+        return get_local_address()
+
+    def get_unicast_port(self):
+        return get_random_unicast_port()
+
+    def new_id(self):
+        return str(uuid.uuid1())
+
+    def add_socket(self, socket_service, sock):
+        pass
+
+    def remove_socket(self, socket_service, sock):
+        sock.close()
+
+    def start(self, socket_service):
+        Thread.start(socket_service)
@@ -0,0 +1,21 @@
+from config import WIRE_CODEC
+from transport.BinaryCodec import BinaryCodec, is_binary_frame
+from transport.JsonCodec import JsonCodec
+
+_codecs = {
+    JsonCodec.name: JsonCodec(),
+    BinaryCodec.name: BinaryCodec(),
+}
+
+
+def get_codec(name: str = WIRE_CODEC):
+    if name not in _codecs:
+        raise ValueError(f"Unknown wire codec {name}")
+    return _codecs[name]
+
+
+def decode_message(data):
+    # Receivers always understand both framings, WIRE_CODEC only selects what we send
+    if is_binary_frame(data):
+        return _codecs[BinaryCodec.name].decode(data)
+    return _codecs[JsonCodec.name].decode(data)
@@ -0,0 +1,99 @@
+import threading
+import traceback
+from collections import deque
+
+
+class KeyedWorkerPool:
+    # Runs callbacks on a few threads: the callbacks of one key one after the other in the order they were
+    # submitted, those of different keys in parallel. submit never blocks, a producer that must not run ahead
+    # waits with wait_for_room until fewer than capacity callbacks are waiting. Before start (e.g. in a
+    # simulation) callbacks run right away on the submitting thread
+    def __init__(self, workers: int, capacity: int, name: str = "worker"):
+        self.workers = workers
+        self.capacity = capacity
+        self.name = name
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._room = threading.Condition(self._lock)
+        # Callbacks per key, a key is in here as long as it has waiting or running callbacks
+        self._queues = {}
+        # Keys with waiting callbacks that no worker runs at the moment
+        self._ready = deque()
+        self._threads = []
+        self.depth = 0
+        self.max_depth = 0
+        self.busy = 0
+        self.completed = 0
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work_loop, name=f"{self.name}-{i}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def submit(self, key, callback, *args):
+        if not self._threads:
+            _run(callback, args)
+            return
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                self._ready.append(key)
+                self._work.notify()
+            queue.append((callback, args))
+            self.depth = self.depth + 1
+            if self.depth > self.max_depth:
+                self.max_depth = self.depth
+
+    def has_room(self):
+        with self._lock:
+            return self._has_room()
+
+    def wait_for_room(self, timeout=None):
+        with self._lock:
+            return self._room.wait_for(self._has_room, timeout)
+
+    def _has_room(self):
+        return self.depth < self.capacity
+
+    def stats(self):
+        with self._lock:
+            return {
+                'depth': self.depth,
+                'max_depth': self.max_depth,
+                'capacity': self.capacity,
+                'workers': self.workers,
+                'busy': self.busy,
+                'completed': self.completed,
+                # Where the backlog builds up: waiting callbacks per key
+                'keys': {key: len(queue) for key, queue in self._queues.items() if queue},
+            }
+
+    def _work_loop(self):
+        while True:
+            with self._lock:
+                self._work.wait_for(lambda: self._ready)
+                key = self._ready.popleft()
+                callback, args = self._queues[key].popleft()
+                self.depth = self.depth - 1
+                self.busy = self.busy + 1
+                self._room.notify_all()
+            _run(callback, args)
+            with self._lock:
+                self.busy = self.busy - 1
+                self.completed = self.completed + 1
+                if self._queues[key]:
+                    # Other keys get their turn first
+                    self._ready.append(key)
+                    self._work.notify()
+                else:
+                    del self._queues[key]
+
+
+def _run(callback, args):
+    try:
+        callback(*args)
+    except Exception as e:
+        print("Exception in worker", e)
+        traceback.print_exc()
@@ -0,0 +1,98 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
+
+
+class Timer:
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            self.callback(*self.args)
+        except Exception as e:
+            print("Exception in timer", e)
+            traceback.print_exc()
+
+
+class PeriodicTimer:
+    def __init__(self, queue, interval, callback, args):
+        self.queue = queue
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self.timer = None
+
+    def _run(self):
+        if self.cancelled:
+            return
+        self.timer = self.queue.schedule(self.interval, self._run)
+        self.callback(*self.args)
+
+    def cancel(self):
+        self.cancelled = True
+        if self.timer:
+            self.timer.cancel()
+
+
+class TimerQueue:
+    # Timers for the socket thread. Callbacks run on whoever calls run_due, on_schedule is
+    # called when a new timer became the earliest one so a blocking loop can wake up.
+    def __init__(self, clock=time.monotonic, on_schedule=None):
+        self.clock = clock
+        self.on_schedule = on_schedule
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def schedule(self, delay, callback, *args):
+        timer = Timer(self.clock() + delay, callback, args)
+        with self._lock:
+            heapq.heappush(self._heap, (timer.deadline, next(self._counter), timer))
+            is_earliest = self._heap[0][2] is timer
+        if is_earliest and self.on_schedule:
+            self.on_schedule()
+        return timer
+
+    def schedule_periodic(self, interval, callback, *args, delay=None):
+        periodic = PeriodicTimer(self, interval, callback, args)
+        periodic.timer = self.schedule(interval if delay is None else delay, periodic._run)
+        return periodic
+
+    def next_deadline(self):
+        with self._lock:
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def next_timeout(self):
+        deadline = self.next_deadline()
+        if deadline is None:
+            return None
+        return max(0.0, deadline - self.clock())
+
+    def pop_due(self):
+        # Takes the timers that are due, the caller runs them (Timer.run) where it wants
+        now = self.clock()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, timer = heapq.heappop(self._heap)
+                if not timer.cancelled:
+                    due.append(timer)
+        return due
+
+    def run_due(self):
+        for timer in self.pop_due():
+            timer.run()
@@ -1,7 +1,8 @@
 import random
 import socket
+import zlib
 
-from config import SERVER_GROUP_BASE_MULTICAST_ADDRESS
+from config import SERVER_GROUP_BASE_MULTICAST_ADDRESS, GAME_GROUP_MULTICAST_ADDRESSES
 
 
 def get_local_address():
@@ -18,3 +19,11 @@ def get_local_address():
 
 def get_random_unicast_port():
     return random.randint(49152, 55000)
+
+
+def get_game_multicast_address(game_id):
+    # One of the GAME_GROUP_MULTICAST_ADDRESSES addresses after the server group, the same on every host.
+    # Games that share an address are told apart by the group identifier
+    base = int.from_bytes(socket.inet_aton(SERVER_GROUP_BASE_MULTICAST_ADDRESS), 'big')
+    offset = 1 + zlib.crc32(str(game_id).encode()) % GAME_GROUP_MULTICAST_ADDRESSES
+    return socket.inet_ntoa((base + offset).to_bytes(4, 'big'))